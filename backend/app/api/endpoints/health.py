@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.models.registry import models
+
+router = APIRouter()
+
+@router.get('/ready')
+async def ready():
+    """Readiness probe: 503 until every required preload model is loaded, with per-model state and load times"""
+    return JSONResponse(
+        status_code=200 if models.ready else 503,
+        content={'ready': models.ready, 'models': models.status()}
+    )
@@ -1,59 +1,388 @@
 import io
-import torch
+import os
 import traceback
 import numpy as np
-import soundfile as sf
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from core.enums.lang import Lang
-from services.tts.kokoro import KokoroTTSService, KokoroVoice
-from services.pronunciation.pronunciation_evaluator import PronunciationEvaluator
+from config import TTS_BACKEND, GOP_BACKEND, TTS_BATCHING, TTS_BATCH_WINDOW_MS, TTS_BATCH_MAX_SIZE, GOP_BATCH_MAX_ITEMS
+from config import MAX_UPLOAD_MB, MAX_AUDIO_SECONDS, KOKORO_PRELOAD_LANGS, KOKORO_PRELOAD_VOICES, G2P_CACHE_DISK
+from config import ASR_BACKEND, ASR_MODEL, ASR_DEVICE, ASR_COMPUTE_TYPE, ASR_CPU_THREADS, ASR_WORKERS, ASR_BATCH_MAX_ITEMS, ASR_BATCH_SIZE, ASR_REQUIRED
+from core.interfaces.itts_service import ITTSService
+from services.tts.voices import KokoroVoice
+from services.tts.batching import BatchingTTSService
+from services.tts.cache import TTSCacheService, TTSCacheKey, EncodedAudioCacheService
+from services.pronunciation.pronunciation_evaluator import PronunciationEvaluator, reference_cache_key, load_reference_audio
+from services.pronunciation.pronunciation_service import PronunciationService
+from services.pronunciation.cache import ReferencePhonesCacheService, EvaluationCacheService, IdempotencyKey, IdempotencyKeyReusedError
+from services.pronunciation.workspace import WorkspaceBudgetError
+from services.asr.cache import ASRCacheService
+from services.asr.transcription import TranscriptionService, transcription_response
+from services.scheduling.stage_scheduler import scheduler, SchedulerBusyError
+from services.models.registry import models
+from services.metrics.tracing import span
+from utils.audio_utils import WAV, wav_header, to_pcm16, iter_chunks, encode_audio, negotiate_audio_format
+from utils.audio_ingest import decode_upload, upload_fingerprint, to_mono, AudioTooLargeError, InvalidAudioError
 
 router = APIRouter()
 
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-print('Using:', device)
+tts_cache = TTSCacheService()
+encoded_audio_cache = EncodedAudioCacheService()
+# Shared with the evaluator, so their lookups never wait for it to be built
+ref_phones_cache = ReferencePhonesCacheService()
+evaluation_cache = EvaluationCacheService()
 
-tts_service = KokoroTTSService(device)
-pronunciation_evaluator = PronunciationEvaluator()
+# Models are built by the registry (in the background after startup, or on first use), so
+# importing this module does not import torch, kokoro or whisper
+def build_kokoro() -> ITTSService:
+    import torch
+    from services.tts.kokoro import KokoroTTSService
+    from services.tts.g2p_cache import G2PCacheService
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print('Using:', device)
+    return KokoroTTSService(device, G2PCacheService() if G2P_CACHE_DISK else None)
+
+def build_tts_service() -> ITTSService:
+    if TTS_BACKEND == 'fake':
+        from bench.fakes import FakeTTSService
+        tts_service = FakeTTSService()
+    else:
+        tts_service = models.get('kokoro')
+    
+    if TTS_BATCHING:
+        tts_service = BatchingTTSService(tts_service, TTS_BATCH_WINDOW_MS, TTS_BATCH_MAX_SIZE)
+    return tts_service
+
+def build_pronunciation_service() -> PronunciationService:
+    if GOP_BACKEND == 'fake':
+        from bench.fakes import FakeKaldiShellInterface
+        pronunciation_service = PronunciationService(ksi=FakeKaldiShellInterface())
+    else:
+        pronunciation_service = PronunciationService()
+    
+    # Phone table of the GOP post-processing
+    pronunciation_service.ksi.postprocessor
+    return pronunciation_service
+
+def build_transcription_service() -> TranscriptionService:
+    if ASR_BACKEND == 'fake':
+        from bench.fakes import FakeASRService
+        asr_service = FakeASRService()
+    elif ASR_BACKEND == 'whisper':
+        from services.asr.whisper import WhisperASRService
+        asr_service = WhisperASRService(ASR_MODEL, None if ASR_DEVICE == 'auto' else ASR_DEVICE)
+    else:
+        from services.asr.faster_whisper import FasterWhisperASRService
+        asr_service = FasterWhisperASRService(
+            ASR_MODEL, ASR_DEVICE, ASR_COMPUTE_TYPE or None, ASR_CPU_THREADS, ASR_WORKERS, batch_size=ASR_BATCH_SIZE
+        )
+    return TranscriptionService(asr_service, ASRCacheService())
+
+# fork_safe models hold torch weights only: serve.py loads them once, before forking its
+# workers. The GOP workers (subprocesses), the TTS batcher (thread) and CTranslate2 (thread
+# pools) are built in every worker instead
+if TTS_BACKEND != 'fake':
+    models.register('kokoro', build_kokoro, fork_safe=True)
+    for kokoro_lang in KOKORO_PRELOAD_LANGS:
+        # Pipelines are otherwise loaded by the first request in their language
+        models.register(f'kokoro.{kokoro_lang}', lambda kokoro_lang=kokoro_lang: models.get('kokoro').load_model(kokoro_lang), fork_safe=True)
+    # Voice packs are otherwise loaded by the first request using them. They do not need the
+    # pipeline of their language, so every voice is preloaded whatever KOKORO_PRELOAD_LANGS is
+    models.register(
+        'kokoro.voices',
+        lambda: models.get('kokoro').load_voices(KOKORO_PRELOAD_VOICES or list(KokoroVoice)),
+        fork_safe=True
+    )
+models.register('tts', build_tts_service)
+models.register('gop', build_pronunciation_service)
+models.register('evaluator', lambda: PronunciationEvaluator(models.get('tts'), tts_cache, models.get('gop'), evaluation_cache, ref_phones_cache))
+models.register('asr', build_transcription_service, fork_safe=ASR_BACKEND == 'whisper', required=ASR_REQUIRED)
+
+def decode_audio(file: BinaryIO) -> Tuple[np.ndarray, int]:
+    """Decode an uploaded audio file (read from its spooled file, no bytes copy) into mono float32 samples"""
+    with span('decode'):
+        audio_array, sample_rate = decode_upload(file, MAX_UPLOAD_MB * 1024 * 1024, MAX_AUDIO_SECONDS)
+        return to_mono(audio_array), sample_rate
+
+def synthesize_chunks(tts_cache_key: TTSCacheKey) -> Iterator[np.ndarray]:
+    """Yield Kokoro audio chunks as they are produced, caching the full audio once complete"""
+    chunks, sr = models.get('tts').tts_stream(
+        tts_cache_key.text, tts_cache_key.lang, tts_cache_key.speaker,
+        speed=tts_cache_key.speed, sample_rate=tts_cache_key.sample_rate
+    )
+    
+    collected = []
+    for chunk in chunks:
+        collected.append(chunk)
+        yield chunk
+    
+    if collected:
+        tts_cache.set(tts_cache_key, (np.concatenate(collected), sr))
+
+async def reference_audio(target_texts: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Reference audio of the target texts whose reference phones are not cached yet, produced
+    on the TTS stage (so the GOP stage never runs Kokoro outside of the TTS concurrency limit)
+    """
+    audio: Dict[str, np.ndarray] = {}
+    for target_text in dict.fromkeys(target_texts):
+        if not await scheduler.run('io', ref_phones_cache.contains, reference_cache_key(target_text)):
+            # Only needs the TTS model, so this never waits for Kaldi to load
+            audio[target_text] = await scheduler.run('tts', lambda: load_reference_audio(models.get('tts'), tts_cache, reference_cache_key(target_text)))
+    return audio
+
+# Open files stay reachable through their descriptor after they are deleted (Linux)
+FD_DIR = '/proc/self/fd'
+
+def iter_file(handle: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+def file_response(handle: BinaryIO, media_type: str, headers: Dict[str, str]) -> Response:
+    """
+    Response for an already open file, which the cache may cull before it is sent: the file
+    is served through its descriptor (still sendfile/pathsend), closed once the response is done
+    """
+    try:
+        fd = handle.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        fd = None
+    if fd is not None and os.path.isdir(FD_DIR):
+        return FileResponse(
+            os.path.join(FD_DIR, str(fd)), media_type=media_type, headers=headers,
+            stat_result=os.fstat(fd), background=BackgroundTask(handle.close)
+        )
+    # Values without a file of their own (kept inline in SQLite or in memory) are streamed
+    size = handle.seek(0, io.SEEK_END)
+    handle.seek(0)
+    return StreamingResponse(iter_file(handle), media_type=media_type, headers={**headers, 'Content-Length': str(size)})
+
+async def stream_wav(chunks: AsyncIterator[np.ndarray], sr: int) -> AsyncIterator[bytes]:
+    """WAV header with unknown length followed by 16-bit PCM chunks"""
+    try:
+        yield wav_header(sr)
+        async for chunk in chunks:
+            yield to_pcm16(chunk)
+    finally:
+        # Gives the stage slot back when the client disconnects mid-stream
+        await chunks.aclose()
 
 @router.post('/evaluate-pronunciation')
-async def pronunciation_check(audio: UploadFile = File(...), target_text: str = Form(...)):
+async def pronunciation_check(
+    audio: UploadFile = File(...),
+    target_text: str = Form(...),
+    idempotency_key: Optional[str] = Header(None, alias='Idempotency-Key'),
+):
     '''
     Endpoint to check pronunciation accuracy.
     Args:
         file: Audio file uploaded by the client
         expected_text: The target phrase to compare against
+        Idempotency-Key (header): Optional client key, retries with it return the first result
+            (422 when the key is sent again with a different recording)
     Returns:
         JSON response with recognized text and accuracy score
     '''
     try:
-        # Read the uploaded audio file as bytes
-        audio_bytes = await audio.read()
-        print('Audio bytes:', len(audio_bytes))
+        # Retries of a request that was already evaluated skip the upload decoding
+        upload = None
+        if idempotency_key:
+            upload = await scheduler.run('io', upload_fingerprint, audio.file)
+            result = await scheduler.run('io', evaluation_cache.get_idempotent, IdempotencyKey(idempotency_key, target_text), upload)
+            if result is not None:
+                return result
+
+        # Decode the uploaded audio file into a NumPy array
+        audio_array, sample_rate = await scheduler.run('io', decode_audio, audio.file)
+        print('Audio array:', audio_array.shape, sample_rate)
+
+        # Resubmissions of the same recording never wait behind the GOP queue (the lookup needs
+        # the evaluator's scoring config: while it loads, evaluate answers them on the GOP stage)
+        result = None
+        evaluator: Optional[PronunciationEvaluator] = models.get_if_ready('evaluator')
+        if evaluator is not None:
+            result = await scheduler.run('io', evaluator.get_cached_result, audio_array, target_text, sample_rate)
+        if result is None:
+            ref_audio = (await reference_audio([target_text])).get(target_text)
 
-        # Decode the audio bytes into a NumPy array
-        audio_array, sample_rate = sf.read(io.BytesIO(audio_bytes))
-        audio_array = np.array(audio_array, dtype=np.float32)
-        print('Audio array:', audio_array)
+            # Evaluate pronunciation using your evaluator (resampled to 16 kHz for Kaldi)
+            with span('evaluate'):
+                result = await scheduler.run('gop', lambda: models.get('evaluator').evaluate(audio_array, target_text, sample_rate, ref_audio))
 
-        # Evaluate pronunciation using your evaluator
-        result = pronunciation_evaluator.evaluate(audio_array, target_text)
+        if idempotency_key:
+            await scheduler.run('io', evaluation_cache.set_idempotent, IdempotencyKey(idempotency_key, target_text), upload, result)
         return result
+    except (SchedulerBusyError, WorkspaceBudgetError):
+        raise
+    except IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print('Exception occurred:', str(e))
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+@router.post('/evaluate-pronunciation/batch')
+async def pronunciation_check_batch(audios: List[UploadFile] = File(...), target_texts: List[str] = Form(...)):
+    '''
+    Endpoint to check the pronunciation of many recordings at once (classroom / offline grading).
+    Args:
+        audios: Audio files uploaded by the client
+        target_texts: The target phrase of each audio file (same order)
+    Returns:
+        JSON response with one result (or error) per audio file
+    '''
+    if len(audios) != len(target_texts):
+        raise HTTPException(status_code=400, detail='audios and target_texts must have the same length')
+    if len(audios) > GOP_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f'At most {GOP_BATCH_MAX_ITEMS} utterances per batch')
+
+    try:
+        items = []
+        for audio, target_text in zip(audios, target_texts):
+            audio_array, sample_rate = await scheduler.run('io', decode_audio, audio.file)
+            items.append((audio_array, target_text, sample_rate))
+
+        ref_audio = await reference_audio(target_texts)
+        results = await scheduler.run('gop', lambda: models.get('evaluator').evaluate_batch(items, ref_audio))
+        return {'results': results}
+    except (SchedulerBusyError, WorkspaceBudgetError):
+        raise
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print('Exception occurred:', str(e))
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post('/transcribe')
+async def transcribe(
+    audio: UploadFile = File(...),
+    lang: str = Form(Lang.EN_US),
+    word_timestamps: bool = Form(False),
+):
+    '''
+    Endpoint to transcribe a recording.
+    Args:
+        audio: Audio file uploaded by the client
+        lang: Spoken language (BCP47)
+        word_timestamps: Also return the timing of every word
+    Returns:
+        JSON response with the text and its timed segments
+    '''
+    try:
+        audio_array, sample_rate = await scheduler.run('io', decode_audio, audio.file)
+        transcription_service: Optional[TranscriptionService] = models.get_if_ready('asr')
+        if transcription_service is None:
+            # The model is loaded on the ASR stage, never on the I/O threads
+            with span('transcribe'):
+                result = await scheduler.run('asr', lambda: models.get('asr').transcribe(audio_array, sample_rate, lang, word_timestamps))
+            return transcription_response(result)
+        key, whisper_audio = await scheduler.run('io', transcription_service.prepare, audio_array, sample_rate, lang, word_timestamps)
+
+        # Cache hits (same decoded audio) never wait behind the ASR queue
+        result = await scheduler.run('io', transcription_service.asr_cache.get, key)
+        if result is None:
+            with span('transcribe'):
+                result = await scheduler.run('asr', transcription_service.transcribe_prepared, key, whisper_audio)
+        return transcription_response(result)
+    except SchedulerBusyError:
+        raise
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print('Exception occurred:', str(e))
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post('/transcribe/batch')
+async def transcribe_batch(
+    audios: List[UploadFile] = File(...),
+    lang: str = Form(Lang.EN_US),
+    word_timestamps: bool = Form(False),
+):
+    '''
+    Endpoint to transcribe many recordings at once.
+    Args:
+        audios: Audio files uploaded by the client
+        lang: Spoken language of every file (BCP47)
+        word_timestamps: Also return the timing of every word
+    Returns:
+        JSON response with one transcription per audio file
+    '''
+    if len(audios) > ASR_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f'At most {ASR_BATCH_MAX_ITEMS} audio files per batch')
+
+    try:
+        items = []
+        for audio in audios:
+            items.append(await scheduler.run('io', decode_audio, audio.file))
+
+        results = await scheduler.run('asr', lambda: models.get('asr').transcribe_batch(items, lang, word_timestamps))
+        return {'results': [transcription_response(result) for result in results]}
+    except SchedulerBusyError:
+        raise
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidAudioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print('Exception occurred:', str(e))
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post('/kokoro/synthesize')
 async def synthesize(
     text: str = Form(...),
     lang: str = Form(Lang.EN_US),
     voice: str = Form(KokoroVoice.AMERICAN_FEMALE_HEART),
+    stream: bool = Form(False),
+    accept: Optional[str] = Header(None),
 ):
-    wav, sr = tts_service.tts(text, lang, voice, speed=1, sample_rate=24000)
+    tts_cache_key = TTSCacheKey(text, speed=1, lang=lang, speaker=voice, sample_rate=24000, provider='kokoro')
+    # Streams are PCM WAV, complete responses are encoded in the format the client prefers
+    audio_format = WAV if stream else negotiate_audio_format(accept)
+    encoded_key = tts_cache_key.with_format(audio_format.name)
+    headers = {'Vary': 'Accept'}
+
+    # Repeat requests are served from the encoded file, without decoding or encoding
+    handle = await scheduler.run('io', encoded_audio_cache.open, encoded_key)
+    if handle is not None:
+        return file_response(handle, audio_format.media_type, headers)
+
+    cached_audio = await scheduler.run('io', tts_cache.get, tts_cache_key)
+
+    if stream:
+        # Cached audio goes through the same chunked path as fresh synthesis
+        if cached_audio is not None:
+            wav, sr = cached_audio
+            chunks = scheduler.stream('io', iter_chunks, wav, sr)
+        else:
+            sr = tts_cache_key.sample_rate
+            chunks = scheduler.stream('tts', synthesize_chunks, tts_cache_key)
+        return StreamingResponse(stream_wav(chunks, sr), media_type='audio/wav')
 
-    buffer = io.BytesIO()
-    sf.write(buffer, wav, sr, format='WAV')
+    if cached_audio is not None:
+        wav, sr = cached_audio
+    else:
+        # Concurrent requests for the same audio wait for a single synthesis
+        wav, sr = await scheduler.run(
+            'tts', tts_cache.get_or_compute, tts_cache_key,
+            lambda: models.get('tts').tts(text, lang, voice, speed=1, sample_rate=24000)
+        )
 
-    return StreamingResponse(buffer, media_type='audio/wav')
\ No newline at end of file
+    handle = await scheduler.run(
+        'io', encoded_audio_cache.open_or_compute, encoded_key,
+        lambda: encode_audio(wav, sr, audio_format)
+    )
+    return file_response(handle, audio_format.media_type, headers)
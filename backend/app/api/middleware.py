@@ -0,0 +1,111 @@
+import time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from services.metrics.registry import metrics
+from services.metrics.tracing import start_trace
+
+requests_total = metrics.counter('http_requests_total', 'HTTP requests by method, route and status', ('method', 'path', 'status'))
+request_duration = metrics.histogram('http_request_duration_seconds', 'HTTP request latency until the response completes', ('method', 'path'))
+requests_in_flight = metrics.gauge('http_requests_in_flight', 'HTTP requests being served', ('method',))
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware) so streamed responses are neither buffered
+    nor cut short: a request is counted when its last body chunk has been sent.
+    """
+
+    def __init__(self, app, prefix: str = '/api/') -> None:
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        requests_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.dec(method=method)
+            # The router stores the matched route in the scope, label by its template to bound cardinality
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            requests_total.inc(method=method, path=path, status=str(status))
+            request_duration.observe(time.perf_counter() - start, method=method, path=path)
+
+class ServerTimingMiddleware:
+    """Adds the spans recorded while serving a request as a Server-Timing response header"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        trace = start_trace()
+
+        async def send_wrapper(message) -> None:
+            # Streamed responses only report the spans finished before their first chunk
+            if message['type'] == 'http.response.start' and trace.spans:
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', trace.server_timing().encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+class UploadLimitMiddleware:
+    """
+    Rejects request bodies over the limit with a 413 before they are spooled to disk: by
+    their Content-Length right away, and bodies without one as soon as they cross it.
+    Batch routes (ending in /batch) get their own, larger limit.
+    """
+
+    # Multipart boundaries, part headers and form fields on top of the uploaded files
+    FORM_OVERHEAD = 64 * 1024
+
+    def __init__(self, app, max_bytes: int, batch_max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        self.batch_max_bytes = batch_max_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.batch_max_bytes if scope['path'].endswith('/batch') else self.max_bytes
+        limit = max_bytes + self.FORM_OVERHEAD
+        detail = f'Upload larger than {max_bytes // (1024 * 1024)} MB'
+
+        content_length = dict(scope['headers']).get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse(status_code=413, content={'detail': detail})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    # Raised while the endpoint parses its form, FastAPI answers it as is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_wrapper, send)
@@ -0,0 +1,150 @@
+"""
+Deterministic stand-ins for Kokoro, Whisper and Kaldi, so the backend can be benchmarked on a
+plain CPU box. Enable them in the API with TTS_BACKEND=fake, ASR_BACKEND=fake and GOP_BACKEND=fake.
+
+Outputs only depend on the inputs (text, audio bytes) and latencies are simulated with
+sleeps, so runs are repeatable and measure the backend's own overhead.
+"""
+import os
+import time
+import zlib
+import tempfile
+import numpy as np
+import soundfile as sf
+from typing import Dict, List, Optional, Tuple
+from core.enums.lang import Lang
+from core.interfaces.itts_service import ITTSService
+from core.interfaces.iasr_service import IASRService, ASRResult, Segment, Word
+from services.pronunciation.kaldi_shell_interface import KaldiShellInterface
+
+# CMU phone set (pure phones, without stress and word position markers)
+PURE_PHONES = [
+    'AA', 'AE', 'AH', 'AO', 'AW', 'AY', 'B', 'CH', 'D', 'DH', 'EH', 'ER', 'EY', 'F', 'G', 'HH',
+    'IH', 'IY', 'JH', 'K', 'L', 'M', 'N', 'NG', 'OW', 'OY', 'P', 'R', 'S', 'SH', 'T', 'TH',
+    'UH', 'UW', 'V', 'W', 'Y', 'Z', 'ZH'
+]
+
+def _seed(data: bytes) -> int:
+    return zlib.crc32(data)
+
+class FakeTTSService(ITTSService):
+    """Sine tones whose pitch and length depend on the text, after a simulated synthesis delay"""
+
+    def __init__(self, sample_rate: int = 24000, seconds_per_char: float = 0.06, latency_per_char_ms: float = 1.0) -> None:
+        self._sample_rate = sample_rate
+        self._seconds_per_char = seconds_per_char
+        self._latency_per_char_ms = latency_per_char_ms
+
+    def tts(
+        self,
+        text: str,
+        lang: Lang = Lang.EN_US,
+        speaker: Optional[str] = None,
+        speed: float = 1,
+        **kargs
+    ) -> Tuple[np.ndarray, int]:
+        time.sleep(len(text) * self._latency_per_char_ms / 1000)
+
+        sr = kargs.get('sample_rate', self._sample_rate)
+        n_samples = max(1, int(len(text) * self._seconds_per_char * sr / speed))
+        frequency = 150 + _seed(f'{text}|{speaker}'.encode()) % 250
+        t = np.arange(n_samples, dtype=np.float32) / sr
+        return (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32), sr
+
+class FakeASRService(IASRService):
+    """Words picked from the audio's hash (one per 0.4 s), after a simulated decoding delay"""
+    provider = 'fake'
+    model_name = 'fake'
+    
+    VOCABULARY = ['the', 'school', 'tomorrow', 'I', 'will', 'go', 'to', 'she', 'sells', 'sea', 'shells', 'today']
+
+    def __init__(self, seconds_per_audio_second: float = 0.1, seconds_per_word: float = 0.4) -> None:
+        self._rtf = seconds_per_audio_second
+        self._seconds_per_word = seconds_per_word
+
+    def transcribe(self, audio: np.ndarray, lang: str = 'en', word_timestamps: bool = False) -> ASRResult:
+        duration = len(audio) / 16000
+        time.sleep(duration * self._rtf)
+
+        seed = _seed(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        n_words = max(1, int(duration / self._seconds_per_word))
+        words = [
+            Word(' ' + self.VOCABULARY[(seed >> i) % len(self.VOCABULARY)], i * self._seconds_per_word, (i + 1) * self._seconds_per_word, 1.0)
+            for i in range(n_words)
+        ]
+        text = ''.join(word.text for word in words)
+        return ASRResult(text, [Segment(text, 0.0, duration, words if word_timestamps else [])])
+
+class FakeKaldiShellInterface(KaldiShellInterface):
+    """
+    Replaces the Kaldi jobs with deterministic outputs in the same formats (text-phone
+    files and gop arks), keeping the real parsing and alignment code on the request path.
+    """
+
+    def __init__(self, seconds_per_audio_second: float = 0.3, setup_latency_s: float = 0.05) -> None:
+        super().__init__(workers=0)
+        self._rtf = seconds_per_audio_second
+        self._setup_latency_s = setup_latency_s
+
+        # Phone table in the format of lang_nosp/phones-pure.txt (0-2 are the skipped phones)
+        table_dir = tempfile.mkdtemp(prefix='fake_kaldi_')
+        self.phones_file = os.path.join(table_dir, 'phones-pure.txt')
+        self._phone_ids = {phone: i + 3 for i, phone in enumerate(PURE_PHONES)}
+        with open(self.phones_file, 'tw') as file:
+            file.write('<eps> 0\nSIL 1\nSPN 2\n')
+            file.writelines(f'{phone} {idx}\n' for phone, idx in self._phone_ids.items())
+
+    def word_phones(self, word: str) -> List[str]:
+        """Fake pronunciation: 2-5 phones picked from the word's hash, with Kaldi position markers"""
+        seed = _seed(word.upper().encode())
+        phones = [PURE_PHONES[(seed >> (5 * i)) % len(PURE_PHONES)] for i in range(2 + seed % 4)]
+        return [f'{phones[0]}_B', *(f'{phone}_I' for phone in phones[1:-1]), f'{phones[-1]}_E']
+
+    def generate_reference_phones(self, text_file: str, wav_file: str, input_dir: str) -> str:
+        with open(text_file, 'rt') as file:
+            words = file.read().split()
+        self._simulate(wav_file)
+
+        os.makedirs(input_dir, exist_ok=True)
+        with open(os.path.join(input_dir, 'text-phone'), 'tw') as file:
+            file.writelines(f'utt1.{i} {" ".join(self.word_phones(word))}\n' for i, word in enumerate(words))
+        return ''
+
+    def run_evaluator(self, text_file: str, wav_file: str, text_phone: str, input_dir: str) -> str:
+        ref_phones = self._read_text_phone(text_phone)
+        self._simulate(wav_file)
+        return self._gop_line('utt1', wav_file, sum(ref_phones.values(), [])) + '\n'
+
+    def run_batch_evaluator(self, input_dir: str, text_phone: str, nj: int, audio_seconds: float = 0.0) -> str:
+        ref_phones = self._read_text_phone(text_phone)
+        with open(os.path.join(input_dir, 'wav.scp'), 'rt') as file:
+            wav_files = dict(line.split(maxsplit=1) for line in file.read().splitlines() if line)
+
+        time.sleep(self._setup_latency_s)
+        lines = []
+        for utt_id, wav_file in wav_files.items():
+            self._simulate(wav_file.strip(), setup=False, parallel=nj)
+            lines.append(self._gop_line(utt_id, wav_file.strip(), ref_phones.get(utt_id, [])))
+        return '\n'.join(lines) + '\n'
+
+    def _read_text_phone(self, text_phone: str) -> Dict[str, List[str]]:
+        """Phones per utterance id, in word order"""
+        phones: Dict[str, List[str]] = {}
+        with open(text_phone, 'rt') as file:
+            for line in file:
+                parts = line.split()
+                if parts:
+                    phones.setdefault(parts[0].rsplit('.', 1)[0], []).extend(parts[1:])
+        return phones
+
+    def _gop_line(self, utt_id: str, wav_file: str, phones: List[str]) -> str:
+        with open(wav_file, 'rb') as file:
+            rng = np.random.default_rng(_seed(file.read()))
+        scores = rng.uniform(-1.2, 0.0, size=len(phones))
+        pure = [phone.split('_')[0].rstrip('012') for phone in phones]
+        return utt_id + ' ' + ' '.join(f'[ {self._phone_ids[phone]} {score:.6f} ]' for phone, score in zip(pure, scores))
+
+    def _simulate(self, wav_file: str, setup: bool = True, parallel: int = 1) -> None:
+        """Sleep like a Kaldi run over this audio would take"""
+        duration = sf.info(wav_file).duration
+        time.sleep((self._setup_latency_s if setup else 0.0) + duration * self._rtf / max(parallel, 1))
@@ -0,0 +1,193 @@
+"""
+Load test of the speech endpoints at a fixed concurrency.
+
+By default the API is started in-process on a free port with the fake Kokoro, Whisper
+and Kaldi backends (bench/fakes.py), so it runs anywhere. Pass --url to load a real deployment.
+
+Usage (from the app directory):
+    python -m bench.load evaluate --concurrency 8 --requests 200
+    python -m bench.load synthesize --unique --save-baseline
+    python -m bench.load evaluate --url http://localhost:8080
+"""
+import io
+import os
+import sys
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from bench.report import Results, summarize, print_results, load_baseline, save_baseline, compare
+
+SENTENCES = [
+    'Tomorrow I will go to school',
+    'She sells sea shells by the sea shore',
+    'The quick brown fox jumps over the lazy dog',
+    'Can you tell me where the station is',
+    'I would like a cup of coffee please',
+    'We have been living here for ten years',
+    'How much does this book cost',
+    'The weather is nice today',
+]
+
+ENDPOINTS = {
+    'evaluate': '/api/speech/evaluate-pronunciation',
+    'synthesize': '/api/speech/kokoro/synthesize',
+    'transcribe': '/api/speech/transcribe',
+}
+
+def encode_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    """multipart/form-data body and its content type"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+def user_recording(text: str) -> bytes:
+    """Deterministic stand-in for a learner's 16 kHz recording of the text"""
+    from bench.fakes import FakeTTSService
+    wav, sr = FakeTTSService(latency_per_char_ms=0).tts(text, sample_rate=16000)
+    buffer = io.BytesIO()
+    sf.write(buffer, wav, sr, format='WAV')
+    return buffer.getvalue()
+
+def build_request(endpoint: str, base_url: str, index: int, unique: bool) -> urllib.request.Request:
+    text = SENTENCES[index % len(SENTENCES)]
+    if unique:
+        # A new text per request defeats the caches (cold path)
+        text = f'{text} number {index}'
+
+    if endpoint == 'evaluate':
+        body, content_type = encode_multipart({'target_text': text}, {'audio': ('audio.wav', user_recording(text), 'audio/wav')})
+    elif endpoint == 'transcribe':
+        body, content_type = encode_multipart({}, {'audio': ('audio.wav', user_recording(text), 'audio/wav')})
+    else:
+        body, content_type = encode_multipart({'text': text}, {})
+    return urllib.request.Request(base_url + ENDPOINTS[endpoint], data=body, headers={'Content-Type': content_type}, method='POST')
+
+def run_load(requests: List[urllib.request.Request], concurrency: int, timeout: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def send(request: urllib.request.Request) -> None:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+            error = None
+        except urllib.error.HTTPError as e:
+            error = str(e.code)
+        except Exception as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            if error is None:
+                latencies.append(elapsed)
+            else:
+                errors[error] = errors.get(error, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    wall = time.perf_counter() - start
+
+    if errors:
+        print('Errors:', ', '.join(f'{error} x{count}' for error, count in errors.items()))
+    return {
+        'requests': len(requests),
+        'errors': sum(errors.values()),
+        'rps': len(latencies) / wall if wall > 0 else 0.0,
+        **summarize(latencies),
+    }
+
+def start_local_server() -> Tuple[str, Callable[[], None]]:
+    """Serve the API with the fake backends on a free port, return its URL and a stop function"""
+    os.environ.setdefault('TTS_BACKEND', 'fake')
+    os.environ.setdefault('GOP_BACKEND', 'fake')
+    os.environ.setdefault('ASR_BACKEND', 'fake')
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    os.environ.setdefault('WORKSPACE_DIR', os.path.join(workdir, 'workspaces'))
+    # Caches are created relative to the working directory
+    os.chdir(workdir)
+
+    import uvicorn
+    from main import app
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join()
+
+    return f'http://127.0.0.1:{port}', stop
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test of the speech endpoints')
+    parser.add_argument('endpoint', choices=sorted(ENDPOINTS), help='Endpoint to load')
+    parser.add_argument('--url', default=None, help='Base URL of a running API (default: in-process with fakes)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests')
+    parser.add_argument('--warmup', type=int, default=len(SENTENCES), help='Untimed requests sent first')
+    parser.add_argument('--unique', action='store_true', help='Unique text per request (cache misses)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout (s)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results to bench/baselines/')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 slowdown against the baseline')
+    args = parser.parse_args()
+
+    stop: Optional[Callable[[], None]] = None
+    base_url = args.url
+    if base_url is None:
+        base_url, stop = start_local_server()
+
+    try:
+        warmup = [build_request(args.endpoint, base_url, i, False) for i in range(args.warmup)]
+        run_load(warmup, args.concurrency, args.timeout)
+
+        # Timed requests start after the warm-up ones, so --unique never hits a warmed entry
+        requests = [build_request(args.endpoint, base_url, args.warmup + i, args.unique) for i in range(args.requests)]
+        stats = run_load(requests, args.concurrency, args.timeout)
+    finally:
+        if stop is not None:
+            stop()
+
+    name = f'load.{args.endpoint}' + ('.unique' if args.unique else '') + f'.c{args.concurrency}'
+    results: Results = {name: stats}
+    print_results(results)
+
+    baseline_name = 'load_remote' if args.url else 'load_fake'
+    baseline = load_baseline(baseline_name) or {}
+    if args.save_baseline:
+        print('Saved baseline:', save_baseline(baseline_name, {**baseline, **results}))
+        return
+
+    regressions = compare(results, baseline, 'p95_ms', args.tolerance)
+    regressions += compare(results, baseline, 'rps', args.tolerance, higher_is_better=True)
+    if regressions or stats['errors']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Microbenchmarks of the hot helpers on the request path.
+
+Usage (from the app directory):
+    python -m bench.micro
+    python -m bench.micro --repeat 2000 --save-baseline
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+from typing import Callable, Dict
+from bench.report import Results, summarize, print_results, load_baseline, save_baseline, compare
+
+BASELINE = 'micro'
+SENTENCE = 'Tomorrow I would went by the school and I will study with my friends after lunch'
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 10) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, unit='us')
+
+def build_benchmarks() -> Dict[str, Callable[[], Callable[[], object]]]:
+    """Benchmark name -> setup returning the function to time (setup may raise ImportError)"""
+    from services.tts.cache import TTSCacheService, TTSCacheKey
+
+    audio = (0.1 * np.sin(np.linspace(0, 3000, 24000 * 3))).astype(np.float32)
+    key = TTSCacheKey(SENTENCE, speed=1.0, lang='en-US', speaker='af_heart', sample_rate=24000, provider='kokoro')
+
+    def cache_get_disk():
+        cache = TTSCacheService(directory='bench_disk', memory_limit_mb=0)
+        cache.set(key, (audio, 24000))
+        return lambda: cache.get(key)
+
+    def cache_get_memory():
+        cache = TTSCacheService(directory='bench_memory', memory_limit_mb=64)
+        cache.set(key, (audio, 24000))
+        return lambda: cache.get(key)
+
+    def cache_set():
+        cache = TTSCacheService(directory='bench_set', memory_limit_mb=0)
+        return lambda: cache.set(key, (audio, 24000))
+
+    def cache_key_hash():
+        return key.to_hash
+
+    def prepare_for_whisper():
+        from utils.audio_ingest import prepare_for_whisper
+        return lambda: prepare_for_whisper(audio, 24000)
+
+    def decode_upload():
+        import io
+        import soundfile as sf
+        from utils.audio_ingest import decode_upload
+        upload = io.BytesIO()
+        sf.write(upload, np.stack([audio, audio], axis=1), 44100, format='WAV')
+        return lambda: decode_upload(upload, max_bytes=20 * 1024 * 1024)
+
+    def resample_user():
+        from utils.audio_ingest import resample
+        return lambda: resample(audio, 44100, 16000)
+
+    def gop_result():
+        """Fake Kaldi interface, reference phones and matching gop ark of the sentence"""
+        from bench.fakes import FakeKaldiShellInterface
+        ksi = FakeKaldiShellInterface()
+        words = SENTENCE.split()
+        ref_phones = ''.join(f'utt1.{i} {" ".join(ksi.word_phones(word))}\n' for i, word in enumerate(words))
+        scores = ' '.join(
+            f'[ {ksi._phone_ids[phone.split("_")[0]]} -0.{i % 10}12 ]'
+            for i, phone in enumerate(ref_phones.split()) if '_' in phone
+        )
+        return ksi, f'utt1 {scores}\n', ref_phones
+
+    def format_result():
+        ksi, gop_line, ref_phones = gop_result()
+        return lambda: ksi.format_result(gop_line, ref_phones)
+
+    def format_and_summarize():
+        ksi, gop_line, ref_phones = gop_result()
+        return lambda: ksi.postprocessor.summarize([ksi.format_result(gop_line, ref_phones)])
+
+    return {
+        'tts_cache.get[disk]': cache_get_disk,
+        'tts_cache.get[memory]': cache_get_memory,
+        'tts_cache.set': cache_set,
+        'cache_key.to_hash': cache_key_hash,
+        'prepare_for_whisper': prepare_for_whisper,
+        'ingest.decode_upload[wav]': decode_upload,
+        'ingest.resample[44.1k->16k]': resample_user,
+        'kaldi.format_result': format_result,
+        'kaldi.format_result+summarize': format_and_summarize,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Microbenchmarks of caches, cache keys and GOP post-processing')
+    parser.add_argument('--repeat', type=int, default=500, help='Timed calls per benchmark')
+    parser.add_argument('--only', default=None, help='Only run benchmarks whose name contains this')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Write the results to bench/baselines/{BASELINE}.json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown against the baseline')
+    args = parser.parse_args()
+
+    # Cache directories are relative to the working directory, keep them out of the app
+    os.chdir(tempfile.mkdtemp(prefix='bench_micro_'))
+
+    results: Results = {}
+    for name, setup in build_benchmarks().items():
+        if args.only and args.only not in name:
+            continue
+        # The services log every cache write and GOP result, keep that out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            try:
+                results[name] = measure(setup(), args.repeat)
+            except ImportError as e:
+                skipped = e
+        if name not in results:
+            print(f'{name}: skipped ({skipped})')
+
+    print_results(results)
+
+    baseline: Results = load_baseline(BASELINE) or {}
+    if args.save_baseline:
+        # Merged, so --only refreshes a single entry
+        print('Saved baseline:', save_baseline(BASELINE, {**baseline, **results}))
+        return
+
+    if compare(results, baseline, 'p50_us', args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
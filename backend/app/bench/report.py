@@ -0,0 +1,67 @@
+import os
+import json
+import math
+from typing import Dict, List, Optional, Sequence
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+Results = Dict[str, Dict[str, float]]
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of unsorted values"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+UNIT_SCALE = {'s': 1.0, 'ms': 1e3, 'us': 1e6}
+
+def summarize(latencies_s: Sequence[float], unit: str = 'ms') -> Dict[str, float]:
+    """Latency distribution (mean, p50, p95, p99) in the given unit"""
+    scale = UNIT_SCALE[unit]
+    return {
+        f'mean_{unit}': sum(latencies_s) / len(latencies_s) * scale if latencies_s else float('nan'),
+        f'p50_{unit}': percentile(latencies_s, 50) * scale,
+        f'p95_{unit}': percentile(latencies_s, 95) * scale,
+        f'p99_{unit}': percentile(latencies_s, 99) * scale,
+    }
+
+def print_results(results: Results) -> None:
+    for name, values in results.items():
+        print(f'{name:<32}' + '  '.join(f'{metric}={value:.3f}' for metric, value in values.items()))
+
+def load_baseline(name: str) -> Optional[Results]:
+    path = os.path.join(BASELINE_DIR, f'{name}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rt') as file:
+        return json.load(file)
+
+def save_baseline(name: str, results: Results) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f'{name}.json')
+    with open(path, 'wt') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+    return path
+
+def compare(results: Results, baseline: Results, metric: str, tolerance: float, higher_is_better: bool = False) -> List[str]:
+    """
+    Compare one metric of every benchmark with the baseline and return the regressions
+    (changes worse than the tolerance, e.g. 0.2 for 20%)
+    """
+    regressions = []
+    for name, values in results.items():
+        if name not in baseline or metric not in values or metric not in baseline[name]:
+            continue
+        current, previous = values[metric], baseline[name][metric]
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        status = 'REGRESSION' if worse > tolerance else 'ok'
+        print(f'{name:<32}{metric} {previous:.3f} -> {current:.3f} ({change * 100:+.1f}%) {status}')
+        if worse > tolerance:
+            regressions.append(name)
+    return regressions
@@ -0,0 +1,94 @@
+"""
+Cold start: time to import the API (main) in a fresh interpreter, against a budget.
+
+Importing main must not import the model libraries (they are loaded by the model registry
+after startup), so the import time is what a restarted or autoscaled worker waits before
+it can listen.
+
+Usage (from the app directory):
+    python -m bench.startup
+    python -m bench.startup --budget-ms 800 --save-baseline
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Tuple
+from bench.report import Results, summarize, print_results, load_baseline, save_baseline, compare
+
+BASELINE = 'startup'
+
+# Must stay out of the import of main
+HEAVY_MODULES = ['torch', 'kokoro', 'whisper', 'faster_whisper', 'ctranslate2', 'librosa', 'scipy']
+
+PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'heavy': [name for name in %r if name in sys.modules]}))
+''' % HEAVY_MODULES
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_main(importtime: bool = False) -> Tuple[float, List[str], str]:
+    """Import time (s) of main in a new interpreter, heavy modules it imported and the -X importtime log"""
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([APP_DIR, os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep)}
+    args = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', PROBE]
+    # Caches are created relative to the working directory
+    result = subprocess.run(args, check=True, capture_output=True, text=True, env=env, cwd=tempfile.mkdtemp(prefix='bench_startup_'))
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe['seconds'], probe['heavy'], result.stderr
+
+def slowest_imports(importtime_log: str, top: int) -> List[Tuple[str, int]]:
+    """Top-level packages by the import time (us) of all their modules, from the -X importtime log"""
+    per_package: Dict[str, int] = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        per_package[package] = per_package.get(package, 0) + int(own)
+    return sorted(per_package.items(), key=lambda item: -item[1])[:top]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Import time of the API against a budget')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to time')
+    parser.add_argument('--budget-ms', type=float, default=1500.0, help='Maximum p50 import time of main')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Write the results to bench/baselines/{BASELINE}.json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown against the baseline')
+    args = parser.parse_args()
+
+    # The first run also warms the bytecode and OS caches, it is not timed
+    _, heavy, log = import_main(importtime=True)
+    latencies = [import_main()[0] for _ in range(args.repeat)]
+
+    results: Results = {'import.main': summarize(latencies)}
+    print_results(results)
+    print('Slowest imports:', ', '.join(f'{name} {us / 1000:.0f}ms' for name, us in slowest_imports(log, args.top)))
+
+    failed = False
+    if heavy:
+        print('Model libraries imported by main:', ', '.join(heavy))
+        failed = True
+    p50 = results['import.main']['p50_ms']
+    if p50 > args.budget_ms:
+        print(f'Import time {p50:.0f}ms is over the {args.budget_ms:.0f}ms budget')
+        failed = True
+
+    baseline: Results = load_baseline(BASELINE) or {}
+    if args.save_baseline:
+        print('Saved baseline:', save_baseline(BASELINE, {**baseline, **results}))
+    elif compare(results, baseline, 'p50_ms', args.tolerance):
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import os
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Speech backends: 'kokoro' / 'kaldi' in production, 'fake' swaps in the deterministic
+# stand-ins of bench/fakes.py (no model weights, no Kaldi install)
+TTS_BACKEND = os.environ.get('TTS_BACKEND', 'kokoro')
+GOP_BACKEND = os.environ.get('GOP_BACKEND', 'kaldi')
+
+# Speech recognition: 'faster-whisper' (CTranslate2), 'whisper' (openai-whisper) or 'fake'.
+# ASR_DEVICE=auto picks the GPU when there is one, ASR_COMPUTE_TYPE defaults to int8 on
+# CPU and float16 on GPU (faster-whisper only)
+ASR_BACKEND = os.environ.get('ASR_BACKEND', 'faster-whisper')
+ASR_MODEL = os.environ.get('ASR_MODEL', 'base')
+ASR_DEVICE = os.environ.get('ASR_DEVICE', 'auto')
+ASR_COMPUTE_TYPE = os.environ.get('ASR_COMPUTE_TYPE', '')
+ASR_CPU_THREADS = _env_int('ASR_CPU_THREADS', 0)
+ASR_WORKERS = _env_int('ASR_WORKERS', 1)
+ASR_BATCH_MAX_ITEMS = _env_int('ASR_BATCH_MAX_ITEMS', 32)
+# 30 s windows per encoder/decoder call of /transcribe/batch (faster-whisper >= 1.1)
+ASR_BATCH_SIZE = _env_int('ASR_BATCH_SIZE', 8)
+
+# Models are loaded in the background once the server listens (GET /ready reports when they
+# are), otherwise on first use. Kokoro G2P pipelines are preloaded for these language codes,
+# and these voice packs whatever their language (empty = every KokoroVoice)
+PRELOAD_MODELS = _env_bool('PRELOAD_MODELS', True)
+KOKORO_PRELOAD_LANGS = [lang.strip() for lang in os.environ.get('KOKORO_PRELOAD_LANGS', 'a').split(',') if lang.strip()]
+KOKORO_PRELOAD_VOICES = [voice.strip() for voice in os.environ.get('KOKORO_PRELOAD_VOICES', '').split(',') if voice.strip()]
+
+# Failed preloads are retried in the background: after MODEL_RETRY_S, doubling up to
+# MODEL_RETRY_MAX_S. GET /ready only waits for the ASR model with ASR_REQUIRED, so nodes
+# that cannot load it still serve TTS and pronunciation
+MODEL_RETRY_S = _env_float('MODEL_RETRY_S', 30.0)
+MODEL_RETRY_MAX_S = _env_float('MODEL_RETRY_MAX_S', 600.0)
+ASR_REQUIRED = _env_bool('ASR_REQUIRED', False)
+
+# Working data dirs of the pronunciation pipeline
+DATA_HOME = os.environ.get('DATA_HOME', '/usr/src/data')
+
+# Per-request Kaldi workspaces: on tmpfs when available, removed once the result is parsed.
+# WORKSPACE_KEEP retains them for debugging: never, failed or always
+WORKSPACE_DIR = os.environ.get('WORKSPACE_DIR') or (
+    '/dev/shm/app-english' if os.path.isdir('/dev/shm') else os.path.join(DATA_HOME, 'workspaces')
+)
+# Workspace budget of the whole server, split over its WEB_CONCURRENCY worker processes
+# (serve.py sets it). 0 = half of the workspace filesystem, at most 512 MB: Docker gives
+# containers a 64 MB /dev/shm unless they are run with --shm-size
+WORKSPACE_BUDGET_MB = _env_int('WORKSPACE_BUDGET_MB', 0)
+WEB_CONCURRENCY = _env_int('WEB_CONCURRENCY', 1)
+WORKSPACE_KEEP = os.environ.get('WORKSPACE_KEEP', 'never')
+WORKSPACE_WAIT_S = _env_float('WORKSPACE_WAIT_S', 30.0)
+
+# Kaldi GOP workers (resident bash processes, 0 spawns run.sh per request)
+GOP_WORKERS = _env_int('GOP_WORKERS', 2)
+GOP_WORKER_TIMEOUT_S = _env_float('GOP_WORKER_TIMEOUT_S', 120.0)
+# Batch jobs get this much more time per second of audio they score (split over their nj jobs)
+GOP_TIMEOUT_PER_AUDIO_S = _env_float('GOP_TIMEOUT_PER_AUDIO_S', 2.0)
+
+# Kaldi I/O of single utterances: 'files' runs the recipe scripts on a data dir, 'pipe'
+# chains the Kaldi binaries through in-memory arks (no data dir, batches still use files)
+GOP_IO_MODE = os.environ.get('GOP_IO_MODE', 'files')
+
+# Parallel Kaldi jobs for batch evaluation (capped by the number of utterances)
+GOP_BATCH_NJ = _env_int('GOP_BATCH_NJ', os.cpu_count() or 1)
+GOP_BATCH_MAX_ITEMS = _env_int('GOP_BATCH_MAX_ITEMS', 500)
+
+# Kokoro request coalescing (opt-in): requests arriving within the window are handed to the
+# model together, identical ones synthesized once. Kokoro runs one utterance per forward pass
+# (no padded batch), so distinct texts gain no throughput on GPU or CPU and every request
+# waits up to the window: only enable it for traffic with many concurrent identical requests
+TTS_BATCHING = _env_bool('TTS_BATCHING', False)
+TTS_BATCH_WINDOW_MS = _env_float('TTS_BATCH_WINDOW_MS', 20.0)
+TTS_BATCH_MAX_SIZE = _env_int('TTS_BATCH_MAX_SIZE', 8)
+
+# TTS cache sample storage: float32 (lossless), float16 (half size) or int16 (half size, 16-bit PCM)
+TTS_CACHE_STORAGE_DTYPE = os.environ.get('TTS_CACHE_STORAGE_DTYPE', 'float32')
+
+# Phonemes of synthesized texts (shared by all voices and speeds): in-memory LRU entries,
+# and whether they are also persisted to disk
+G2P_CACHE_SIZE = _env_int('G2P_CACHE_SIZE', 4096)
+G2P_CACHE_DISK = _env_bool('G2P_CACHE_DISK', True)
+
+# In-memory (L1) tier in front of each disk cache, 0 disables it
+TTS_CACHE_MEMORY_MB = _env_int('TTS_CACHE_MEMORY_MB', 256)
+ASR_CACHE_MEMORY_MB = _env_int('ASR_CACHE_MEMORY_MB', 32)
+REF_PHONES_CACHE_MEMORY_MB = _env_int('REF_PHONES_CACHE_MEMORY_MB', 16)
+EVAL_CACHE_MEMORY_MB = _env_int('EVAL_CACHE_MEMORY_MB', 16)
+
+# Final evaluation results are kept this long, so client retries of a recording skip the pipeline
+EVAL_CACHE_TTL_S = _env_float('EVAL_CACHE_TTL_S', 3600.0)
+
+# Cross-process coalescing of cache misses (lock record expiry and polling interval)
+CACHE_LOCK_TIMEOUT_S = _env_float('CACHE_LOCK_TIMEOUT_S', 120.0)
+CACHE_LOCK_POLL_S = _env_float('CACHE_LOCK_POLL_S', 0.05)
+
+# Blocking work scheduler (per stage: worker threads and how many extra jobs may wait)
+# With TTS_BATCHING the extra TTS threads only wait on the single batcher thread, so that the
+# coalescing window can collect more than one request
+TTS_CONCURRENCY = _env_int('TTS_CONCURRENCY', TTS_BATCH_MAX_SIZE if TTS_BATCHING else 1)
+TTS_QUEUE_SIZE = _env_int('TTS_QUEUE_SIZE', 8)
+GOP_CONCURRENCY = _env_int('GOP_CONCURRENCY', max(GOP_WORKERS, 1))
+GOP_QUEUE_SIZE = _env_int('GOP_QUEUE_SIZE', 8)
+ASR_CONCURRENCY = _env_int('ASR_CONCURRENCY', ASR_WORKERS)
+ASR_QUEUE_SIZE = _env_int('ASR_QUEUE_SIZE', 8)
+IO_CONCURRENCY = _env_int('IO_CONCURRENCY', 4)
+IO_QUEUE_SIZE = _env_int('IO_QUEUE_SIZE', 32)
+SCHEDULER_RETRY_AFTER_S = _env_int('SCHEDULER_RETRY_AFTER_S', 5)
+
+# Per-request stage timings in a Server-Timing response header (stage histograms are always on /metrics)
+SERVER_TIMING = _env_bool('SERVER_TIMING', False)
+
+# Upload limits of the audio ingest path (compressed size per file and of a whole batch
+# request, decoded duration)
+MAX_UPLOAD_MB = _env_int('MAX_UPLOAD_MB', 20)
+MAX_BATCH_UPLOAD_MB = _env_int('MAX_BATCH_UPLOAD_MB', 200)
+MAX_AUDIO_SECONDS = _env_float('MAX_AUDIO_SECONDS', 60.0)
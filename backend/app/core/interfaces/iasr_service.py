@@ -1,13 +1,21 @@
 import numpy as np
 from abc import ABC, abstractmethod
 from typing import List
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+@dataclass
+class Word:
+    text: str
+    start_t: float
+    end_t: float
+    probability: float
 
 @dataclass
 class Segment:
     text: str
     start_t: float
     end_t: float
+    words: List[Word] = field(default_factory=list)
 
 @dataclass
 class ASRResult:
@@ -17,10 +25,18 @@ class ASRResult:
 class IASRService(ABC):
     """Interface for all ASR service implementations"""
     
+    # Cache identity of the backend and of its model
+    provider: str = ''
+    model_name: str = ''
+    
     @abstractmethod
     def __init__(self, model_name: str, **kwargs) -> None:
         """Initialize ASR model with specific model version"""
     
     @abstractmethod
-    def transcribe(self, audio: np.ndarray) -> ASRResult:
-        """Process audio and return transcription with metadata"""
\ No newline at end of file
+    def transcribe(self, audio: np.ndarray, lang: str = 'en', word_timestamps: bool = False) -> ASRResult:
+        """Process 16 kHz mono float32 audio and return transcription with metadata"""
+    
+    def transcribe_batch(self, audios: List[np.ndarray], lang: str = 'en', word_timestamps: bool = False) -> List[ASRResult]:
+        """Transcribe many audios (backends override this when they can run them together)"""
+        return [self.transcribe(audio, lang, word_timestamps) for audio in audios]
@@ -50,6 +50,11 @@ class CacheStats:
     hit_ratio: float
     volume: int
     size_mb: float
+    l1_hits: int = 0
+    l2_hits: int = 0
+    l1_size_mb: float = 0.0
+    bytes_written: int = 0
+    evictions: int = 0
     
 class ICacheService(ABC, Generic[T_Key, T_Value]):
     """Base interface for all cache services"""
@@ -60,8 +65,8 @@ class ICacheService(ABC, Generic[T_Key, T_Value]):
         pass
     
     @abstractmethod
-    def set(self, key: T_Key, value: T_Value) -> None:
-        """Store value in cache"""
+    def set(self, key: T_Key, value: T_Value, expire: Optional[float] = None) -> None:
+        """Store value in cache (expire: seconds to live, None keeps it until evicted)"""
         pass
     
     @abstractmethod
@@ -1,8 +1,18 @@
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from core.enums.lang import Lang
 
+@dataclass
+class TTSRequest:
+    """Arguments of one tts() call"""
+    text: str
+    lang: Lang = Lang.EN_US
+    speaker: Optional[str] = None
+    speed: float = 1
+    kargs: Dict[str, Any] = field(default_factory=dict)
+
 class ITTSService(ABC):
     @abstractmethod
     def tts(
@@ -15,6 +25,25 @@ class ITTSService(ABC):
     ) -> Tuple[np.ndarray, int]:
         """Interface for Text-to-Speech services"""
     
+    def tts_stream(
+        self, 
+        text: str, 
+        lang: Lang = Lang.EN_US,
+        speaker: Optional[str] = None,
+        speed: float = 1,
+        **kargs
+    ) -> Tuple[Iterator[np.ndarray], int]:
+        """Generate audio chunk by chunk, override when the backend produces audio incrementally"""
+        wav, sr = self.tts(text, lang, speaker, speed, **kargs)
+        return iter([wav]), sr
+    
+    def tts_batch(self, requests: List[TTSRequest]) -> List[Tuple[np.ndarray, int]]:
+        """Synthesize several requests, override when the backend can share work between them"""
+        return [
+            self.tts(request.text, request.lang, request.speaker, request.speed, **request.kargs)
+            for request in requests
+        ]
+    
     def tts_file(
         self, 
         output_path: str, 
@@ -1,8 +1,29 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from api.endpoints import speech
+from api.endpoints import speech, metrics, health
+from api.middleware import RequestMetricsMiddleware, ServerTimingMiddleware, UploadLimitMiddleware
+from config import SERVER_TIMING, PRELOAD_MODELS, MAX_UPLOAD_MB, MAX_BATCH_UPLOAD_MB, SCHEDULER_RETRY_AFTER_S
+from services.scheduling.stage_scheduler import SchedulerBusyError
+from services.pronunciation.workspace import WorkspaceBudgetError
+from services.models.registry import models
 
-app = FastAPI(title='AppIngles API', version='1.0.0')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load while the server already listens, requests needing one wait for it
+    if PRELOAD_MODELS:
+        models.preload_in_background()
+    yield
+
+app = FastAPI(title='AppIngles API', version='1.0.0', lifespan=lifespan)
+
+# Oversized uploads are refused before they are read (innermost, so the 413 gets CORS headers)
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=MAX_UPLOAD_MB * 1024 * 1024,
+    batch_max_bytes=MAX_BATCH_UPLOAD_MB * 1024 * 1024
+)
 
 # CORS
 app.add_middleware(
@@ -13,12 +34,37 @@ app.add_middleware(
     allow_headers=['*'],
 )
 
+# Request counters and latency for the /metrics endpoint
+app.add_middleware(RequestMetricsMiddleware, prefix='/api/')
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
 # Include routes
 app.include_router(speech.router, prefix='/api/speech', tags=['speech'])
+app.include_router(metrics.router, tags=['metrics'])
+app.include_router(health.router, tags=['health'])
 #app.include_router(camera.router, prefix='/api/camera', tags=['camera'])
 #app.include_router(location.router, prefix='/api/location', tags=['location'])
 #app.include_router(lessons.router, prefix='/api/lessons', tags=['lessons'])
 
+@app.exception_handler(SchedulerBusyError)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusyError):
+    # Fail fast so clients back off instead of waiting for their own timeout
+    return JSONResponse(
+        status_code=503,
+        content={'detail': str(exc)},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+@app.exception_handler(WorkspaceBudgetError)
+async def workspace_budget_handler(request: Request, exc: WorkspaceBudgetError):
+    # Kaldi scratch space is full for now, as retryable as a full stage queue
+    return JSONResponse(
+        status_code=503,
+        content={'detail': str(exc)},
+        headers={'Retry-After': str(SCHEDULER_RETRY_AFTER_S)}
+    )
+
 @app.get("/")
 async def root():
     return {'message': 'AppIngles API is working!'}
\ No newline at end of file
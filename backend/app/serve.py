@@ -0,0 +1,213 @@
+"""
+Pre-fork server: the master loads the model weights once, then forks the uvicorn workers,
+which share the weights copy-on-write and accept from one listening socket.
+
+Every worker gets an explicit slice of the cores: torch intra-op threads, BLAS threads,
+CTranslate2 threads and Kaldi jobs are all sized to it, so N workers never run more than
+one busy thread per core. With --pin-cores each worker is also bound to its slice.
+
+Models that own threads, subprocesses or a device context (the GOP workers, CTranslate2,
+anything on a GPU) are not fork safe: each worker loads those itself after the fork.
+
+Usage (from the app directory):
+    python serve.py
+    python serve.py --workers 4 --threads 2 --pin-cores
+
+Options default to SERVE_WORKERS, SERVE_THREADS_PER_WORKER and SERVE_PIN_CORES (0 = derive
+from the cores available to the process: two threads per worker).
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+from typing import Dict, List, Tuple
+
+DEFAULT_THREADS_PER_WORKER = 2
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (honours taskset and container cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def thread_budget(cores: int, workers: int, threads: int) -> Tuple[int, int]:
+    """(workers, threads per worker): the unset one (0) is derived from the core count"""
+    if workers <= 0:
+        workers = max(1, cores // (threads if threads > 0 else DEFAULT_THREADS_PER_WORKER))
+    if threads <= 0:
+        threads = max(1, cores // workers)
+    return workers, threads
+
+def core_slice(cores: List[int], index: int, threads: int) -> List[int]:
+    """Cores of worker index: consecutive slices, wrapping around when oversubscribed"""
+    return [cores[(index * threads + i) % len(cores)] for i in range(min(threads, len(cores)))]
+
+def apply_thread_env(threads: int) -> None:
+    """Thread pool sizes read at import time, so this must run before numpy, torch or config"""
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+        os.environ.setdefault(name, str(threads))
+    os.environ.setdefault('ASR_CPU_THREADS', str(threads))
+    # Kaldi binaries are single threaded: one resident GOP worker and one batch job per core
+    os.environ.setdefault('GOP_WORKERS', str(threads))
+    os.environ.setdefault('GOP_BATCH_NJ', str(threads))
+    # torch.cuda.is_available() without creating a CUDA context, which a fork cannot inherit
+    os.environ.setdefault('PYTORCH_NVML_BASED_CUDA_CHECK', '1')
+
+def parse_args() -> argparse.Namespace:
+    env = os.environ
+    parser = argparse.ArgumentParser(description='Pre-fork server with shared model weights')
+    parser.add_argument('--host', default=env.get('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(env.get('SERVE_PORT') or 8080))
+    parser.add_argument('--workers', type=int, default=int(env.get('SERVE_WORKERS') or 0), help='Worker processes (0 = cores / threads)')
+    parser.add_argument('--threads', type=int, default=int(env.get('SERVE_THREADS_PER_WORKER') or 0), help='Threads per worker (0 = cores / workers)')
+    parser.add_argument(
+        '--pin-cores', action='store_true',
+        default=env.get('SERVE_PIN_CORES', '').strip().lower() in ('1', 'true', 'yes', 'on'),
+        help='Bind every worker to its own slice of the cores'
+    )
+    parser.add_argument('--log-level', default=env.get('SERVE_LOG_LEVEL', 'info'))
+    return parser.parse_args()
+
+def gpu_visible() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+def set_torch_threads(threads: int) -> None:
+    # Only when a model already imported torch, the fake backends never do
+    torch = sys.modules.get('torch')
+    if torch is None:
+        return
+    torch.set_num_threads(threads)
+    try:
+        # Allowed once per process, before any inter-op work: the workers inherit it
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+class PreforkMaster:
+    """Loads the shared models, forks the workers and replaces the ones that exit"""
+
+    def __init__(self, app, sock: socket.socket, workers: int, threads: int, cores: List[int], pin_cores: bool, log_level: str) -> None:
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.cores = cores
+        self.pin_cores = pin_cores
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.stopping = False
+
+    def spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker(index)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                # Never fall back into the master loop (or its atexit handlers)
+                os._exit(code)
+        self.children[pid] = index
+
+    def run_worker(self, index: int) -> None:
+        import uvicorn
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        cores = core_slice(self.cores, index, self.threads)
+        if self.pin_cores and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+        set_torch_threads(self.threads)
+        print(f'[serve] worker {index} pid {os.getpid()}: {self.threads} threads' + (f', cores {cores}' if self.pin_cores else ''))
+
+        # The lifespan preload only builds what the master did not load (the non fork safe models)
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan='on')
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            print(f'[serve] worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting')
+            # A worker that crashes at startup must not turn into a fork loop
+            time.sleep(1.0)
+            if not self.stopping:
+                self.spawn(index)
+
+    def stop(self, signum: int, frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f'[serve] {signal.Signals(signum).name}: stopping {len(self.children)} workers')
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+def main() -> None:
+    args = parse_args()
+    cores = available_cores()
+    workers, threads = thread_budget(len(cores), args.workers, args.threads)
+    # Before anything imports numpy, torch or config
+    apply_thread_env(threads)
+    # Per-server budgets (Kaldi workspaces) are split over the workers
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+
+    from main import app
+    from services.models.registry import models
+
+    print(f'[serve] {workers} workers x {threads} threads on {len(cores)} cores')
+    set_torch_threads(threads)
+
+    shared = models.fork_safe_names()
+    if shared and gpu_visible():
+        print('[serve] GPU visible: every worker loads its own models (CUDA cannot be forked)')
+        shared = []
+    if shared:
+        start = time.perf_counter()
+        models.preload(shared)
+        print(f'[serve] Shared models loaded in {time.perf_counter() - start:.2f}s: {", ".join(shared)}')
+
+    # Move everything allocated so far to the permanent generation: collections in the
+    # workers then never write to (and copy) the pages of the shared objects
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f'[serve] Listening on {args.host}:{args.port}')
+    PreforkMaster(app, sock, workers, threads, cores, args.pin_cores, args.log_level).run()
+
+if __name__ == '__main__':
+    main()
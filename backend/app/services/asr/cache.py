@@ -1,22 +1,34 @@
 import pickle
+import numpy as np
 from dataclasses import dataclass, asdict
+from config import ASR_CACHE_MEMORY_MB
 from services.cache.diskcache_service import DiskCacheService
 from core.interfaces.icache_service import CacheKey
-from core.interfaces.iasr_service import ASRResult, Segment
+from core.interfaces.iasr_service import ASRResult, Segment, Word
+from utils.audio_ingest import audio_content_hash
 
 @dataclass(frozen=True)
 class ASRCacheKey(CacheKey):
+    """Transcription of some audio content by one model"""
     key: str
     lang: str 
     provider: str
+    model: str = ''
+    word_timestamps: bool = False
+    
+    @classmethod
+    def from_audio(cls, audio: np.ndarray, lang: str, provider: str, model: str, word_timestamps: bool = False) -> 'ASRCacheKey':
+        """Key of the 16 kHz audio that is transcribed"""
+        return cls(audio_content_hash(audio), lang, provider, model, word_timestamps)
 
 class ASRCacheService(DiskCacheService[ASRCacheKey, ASRResult]):
     """Cache for ASR results (transcriptions and segments)"""
     
-    def __init__(self, directory: str = 'asr_cache', size_limit_gb: int = 10) -> None:
+    def __init__(self, directory: str = 'asr_cache', size_limit_gb: int = 10, memory_limit_mb: int = ASR_CACHE_MEMORY_MB) -> None:
         super().__init__(
             namespace='asr',
             directory=directory,
+            memory_limit_bytes=memory_limit_mb * 1024 * 1024,
             size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
             eviction_policy='least-recently-used',
             disk_min_file_size=4096,  # Audio optimization
@@ -38,5 +50,8 @@ class ASRCacheService(DiskCacheService[ASRCacheKey, ASRResult]):
     
     def _deserialize_value(self, data: bytes) -> ASRResult:
         loaded = pickle.loads(data)
-        segments = [Segment(**seg_dict) for seg_dict in loaded['segments']]
-        return ASRResult(loaded['text'], segments)
\ No newline at end of file
+        segments = [
+            Segment(**{**seg_dict, 'words': [Word(**word) for word in seg_dict.get('words', [])]})
+            for seg_dict in loaded['segments']
+        ]
+        return ASRResult(loaded['text'], segments)
@@ -0,0 +1,70 @@
+import numpy as np
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+from core.interfaces.iasr_service import IASRService, ASRResult
+from services.asr.cache import ASRCacheService, ASRCacheKey
+from services.metrics.tracing import span
+from utils.audio_ingest import prepare_for_whisper
+
+def whisper_lang(lang: str) -> str:
+    """Whisper language code of a BCP47 tag: 'en-US' -> 'en'"""
+    return str(getattr(lang, 'value', lang)).split('-')[0].strip().lower()
+
+def transcription_response(result: ASRResult) -> Dict[str, Any]:
+    return {
+        'text': result.transcription.strip(),
+        'segments': [asdict(segment) for segment in result.segments]
+    }
+
+class TranscriptionService:
+    """Transcription of uploaded audio, cached by the content of the decoded 16 kHz audio"""
+    
+    def __init__(self, asr_service: IASRService, asr_cache: Optional[ASRCacheService] = None) -> None:
+        self._asr_service = asr_service
+        self.asr_cache = asr_cache or ASRCacheService()
+    
+    def prepare(self, audio: np.ndarray, sample_rate: int, lang: str, word_timestamps: bool = False) -> Tuple[ASRCacheKey, np.ndarray]:
+        """Whisper input (16 kHz, mono, peak normalized) and its cache key"""
+        with span('resample'):
+            audio = prepare_for_whisper(audio, sample_rate)
+        key = ASRCacheKey.from_audio(
+            audio, whisper_lang(lang), self._asr_service.provider, self._asr_service.model_name, word_timestamps
+        )
+        return key, audio
+    
+    def transcribe_prepared(self, key: ASRCacheKey, audio: np.ndarray) -> ASRResult:
+        """Transcription of prepared audio (concurrent requests for the same audio run it once)"""
+        def transcribe() -> ASRResult:
+            with span('asr'):
+                return self._asr_service.transcribe(audio, key.lang, key.word_timestamps)
+        
+        return self.asr_cache.get_or_compute(key, transcribe)
+    
+    def transcribe(self, audio: np.ndarray, sample_rate: int, lang: str = 'en', word_timestamps: bool = False) -> ASRResult:
+        return self.transcribe_prepared(*self.prepare(audio, sample_rate, lang, word_timestamps))
+    
+    def transcribe_batch(
+        self,
+        items: List[Tuple[np.ndarray, int]],
+        lang: str = 'en',
+        word_timestamps: bool = False
+    ) -> List[ASRResult]:
+        """Transcribe many (audio, sample_rate) items: cached ones are skipped, the rest run as one backend batch"""
+        prepared = [self.prepare(audio, sample_rate, lang, word_timestamps) for audio, sample_rate in items]
+        results: List[Optional[ASRResult]] = [self.asr_cache.get(key) for key, _ in prepared]
+        
+        # Identical audios in the batch are transcribed once
+        missing: Dict[ASRCacheKey, np.ndarray] = {}
+        for (key, audio), result in zip(prepared, results):
+            if result is None and key not in missing:
+                missing[key] = audio
+        
+        if missing:
+            with span('asr'):
+                transcribed = self._asr_service.transcribe_batch(list(missing.values()), whisper_lang(lang), word_timestamps)
+            for key, result in zip(missing, transcribed):
+                self.asr_cache.set(key, result)
+            by_key = dict(zip(missing, transcribed))
+            results = [result if result is not None else by_key[key] for (key, _), result in zip(prepared, results)]
+        
+        return results
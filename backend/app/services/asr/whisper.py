@@ -1,23 +1,32 @@
+import torch
 import whisper
 import numpy as np
-from typing import Literal
-from core.interfaces.iasr_service import IASRService, ASRResult, Segment
+from typing import Literal, Optional
+from core.interfaces.iasr_service import IASRService, ASRResult, Segment, Word
 
 class WhisperASRService(IASRService):
+    provider = 'openai-whisper'
+    
     def __init__(
         self, 
         model_name: Literal['tiny', 'base', 'small', 'medium', 'large'] = 'base', 
-        device: Literal['cuda', 'cpu'] = 'cuda'
+        device: Optional[Literal['cuda', 'cpu']] = None
     ) -> None:
-        self.model = whisper.load_model(model_name, device)
+        self.model_name = model_name
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model = whisper.load_model(model_name, self.device)
         
-    def transcribe(self, audio: np.ndarray) -> ASRResult:
+    def transcribe(self, audio: np.ndarray, lang: str = 'en', word_timestamps: bool = False) -> ASRResult:
         """Return transcribed text"""
-        result = self.model.transcribe(audio, language='en', word_timestamps=True)
+        # fp16 only runs on GPU (on CPU whisper warns and falls back to fp32)
+        result = self.model.transcribe(audio, language=lang, word_timestamps=word_timestamps, fp16=self.device == 'cuda')
         
         segments = [
-            Segment(segment_info['text'], segment_info['start'], segment_info['end'])
+            Segment(
+                segment_info['text'], segment_info['start'], segment_info['end'],
+                [Word(word['word'], word['start'], word['end'], word['probability']) for word in segment_info.get('words', [])]
+            )
             for segment_info in result['segments']
         ]
         
-        return ASRResult(result['text'], segments)
\ No newline at end of file
+        return ASRResult(result['text'], segments)
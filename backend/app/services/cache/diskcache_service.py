@@ -1,16 +1,39 @@
 import os
+import time
+import mmap
+import weakref
+import threading
 from abc import abstractmethod
 from diskcache import Cache
-from typing import Generic, Optional
+from typing import Any, Callable, Dict, Generic, Iterable, Optional
+from config import CACHE_LOCK_TIMEOUT_S, CACHE_LOCK_POLL_S
 from core.interfaces.icache_service import ICacheService, CacheStats, T_Key, T_Value
+from services.cache.memory_tier import MemoryTier
+from services.cache.single_flight import SingleFlight
+from services.metrics.registry import metrics, format_sample
+
+# Live cache services, exported by _collect_cache_metrics at scrape time
+_instances: 'weakref.WeakSet[DiskCacheService]' = weakref.WeakSet()
 
 class DiskCacheService(ICacheService[T_Key, T_Value], Generic[T_Key, T_Value]):
     """Base disk cache implementation using diskcache"""
     
+    # Memory-map file-backed values instead of reading them into bytes (see _deserialize_value)
+    _mmap_values: bool = False
+    
+    # Time to live (seconds) of entries stored without an explicit expire, None never expires
+    _default_expire: Optional[float] = None
+    
+    # Bump when the keys or values of a cache change incompatibly: a cache directory written
+    # with another version is cleared when it is opened, instead of keeping unreachable entries
+    _schema_version: Optional[str] = None
+    _SCHEMA_FILE = 'schema_version'
+    
     def __init__(
         self, 
         namespace: str,
         directory: str,
+        memory_limit_bytes: int = 0,
         **cache_kwargs
     ) -> None:
         self._namespace = namespace
@@ -20,61 +43,189 @@ class DiskCacheService(ICacheService[T_Key, T_Value], Generic[T_Key, T_Value]):
             directory=self._directory,
             **cache_kwargs
         )
+        if self._schema_version is not None:
+            self._migrate()
+        
+        # Optional L1 tier of deserialized values in front of the disk (L2)
+        self._memory: Optional[MemoryTier[T_Value]] = MemoryTier(memory_limit_bytes) if memory_limit_bytes > 0 else None
+        
+        # Counters are maintained incrementally, reading them never touches the disk
+        self._stats_lock = threading.Lock()
+        self._l1_hits = 0
+        self._l2_hits = 0
+        self._misses = 0
+        self._bytes_written = 0
+        self._evictions = 0
+        
+        self._single_flight: SingleFlight[T_Value] = SingleFlight()
+        _instances.add(self)
     
     def get(self, key: T_Key) -> Optional[T_Value]:
         """Retrieve value from cache"""
         cache_key = self._serialize_key(key)
         
+        # L1 hits skip SQLite and deserialization entirely
+        if self._memory is not None:
+            value = self._memory.get(cache_key)
+            if value is not None:
+                self._count('_l1_hits')
+                self._on_cache_hit()
+                return value
+        
         with self._cache as cache:
-            result = cache.get(cache_key)
+            result, expire_time = cache.get(cache_key, read=self._mmap_values, expire_time=True)
             
         if result is not None:
+            self._count('_l2_hits')
             self._on_cache_hit()
-            return self._deserialize_value(result)
+            if self._mmap_values:
+                result = self._map_value(result)
+            value = self._deserialize_value(result)
+            if self._memory is not None:
+                self._memory.put(cache_key, value, len(result), expire_time)
+            return value
         
+        self._count('_misses')
         self._on_cache_miss()
         return None
     
-    def set(self, key: T_Key, value: T_Value) -> None:
-        """Store value in cache"""
+    def get_or_compute(self, key: T_Key, compute: Callable[[], T_Value]) -> T_Value:
+        """
+        Retrieve value from cache, computing and storing it on a miss.
+        Concurrent misses for the same key compute it only once: threads of this process
+        wait on the first caller, other processes (sharing the cache dir) wait on its lock record.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        cache_key = self._serialize_key(key)
+        return self._single_flight.do(cache_key, lambda: self._compute_locked(key, cache_key, compute))
+    
+    def _compute_locked(self, key: T_Key, cache_key: str, compute: Callable[[], T_Value]) -> T_Value:
+        lock_key = f'{cache_key}:lock'
+        deadline = time.monotonic() + CACHE_LOCK_TIMEOUT_S
+        
+        while True:
+            # The lock record expires on its own if its owner dies mid-computation
+            if self._cache.add(lock_key, os.getpid(), expire=CACHE_LOCK_TIMEOUT_S):
+                try:
+                    # Filled between our miss and taking the lock
+                    value = self.get(key) if self.contains(key) else None
+                    if value is None:
+                        value = compute()
+                        self.set(key, value)
+                    return value
+                finally:
+                    self._cache.delete(lock_key)
+            
+            # Another process is computing it, wait for its result
+            time.sleep(CACHE_LOCK_POLL_S)
+            if self.contains(key):
+                value = self.get(key)
+                if value is not None:
+                    return value
+            if time.monotonic() > deadline:
+                print(f'[{self._namespace}] Lock wait timed out, computing: {cache_key[:16]}...')
+                value = compute()
+                self.set(key, value)
+                return value
+    
+    def contains(self, key: T_Key) -> bool:
+        """Check whether a key is cached, without reading or deserializing its value"""
+        cache_key = self._serialize_key(key)
+        if self._memory is not None and self._memory.get(cache_key) is not None:
+            return True
+        return cache_key in self._cache
+    
+    def set(self, key: T_Key, value: T_Value, expire: Optional[float] = None) -> None:
+        """Store value in cache (expire: seconds to live, defaults to the service's _default_expire)"""
         cache_key = self._serialize_key(key)
         serialized_value = self._serialize_value(value)
+        if expire is None:
+            expire = self._default_expire
+        # Same clock as diskcache, so L1 and L2 copies expire together
+        expire_time = time.time() + expire if expire is not None else None
         
         with self._cache as cache:
-            cache.set(cache_key, serialized_value, expire=None)
+            # diskcache culls on write, the entry count tells how many entries it evicted
+            count_before = len(cache)
+            existed = cache_key in cache
+            cache.set(cache_key, serialized_value, expire=expire)
+            evicted = count_before + (0 if existed else 1) - len(cache)
+        
+        self._count('_bytes_written', len(serialized_value))
+        if evicted > 0:
+            self._count('_evictions', evicted)
+        
+        # Write-through: L1 keeps what the disk returns, not the caller's (mutable) object
+        if self._memory is not None:
+            self._memory.put(cache_key, self._deserialize_value(serialized_value), len(serialized_value), expire_time)
         
         print(f'[{self._namespace}] Cached with key: {cache_key[:16]}...')
     
+    def _migrate(self) -> None:
+        """
+        Clear the entries of another schema version. The version is kept in a file next to
+        the cache, where eviction never drops it (concurrent openers clear the cache once).
+        """
+        path = os.path.join(self._directory, self._SCHEMA_FILE)
+        with self._cache.transact():
+            try:
+                with open(path, 'rt') as file:
+                    version: Optional[str] = file.read().strip()
+            except FileNotFoundError:
+                version = None
+            if version == self._schema_version:
+                return
+            if version is not None or len(self._cache) > 0:
+                print(f'[{self._namespace}] Cache schema {version} -> {self._schema_version}, clearing {len(self._cache)} entries')
+                self._cache.clear()
+            staged = f'{path}.{os.getpid()}'
+            with open(staged, 'wt') as file:
+                file.write(self._schema_version)
+            os.replace(staged, path)
+    
     def get_stats(self) -> CacheStats:
-        """Get cache performance statistics"""
-        hits, misses = self._cache.stats()
+        """Get cache performance statistics (O(1): counters plus diskcache's own volume accounting)"""
+        hits = self._l1_hits + self._l2_hits
+        misses = self._misses
         total = hits + misses
         hit_ratio = (hits / total) * 100 if total > 0 else 0
+        volume = self._cache.volume()
         
         return CacheStats(
             hits=hits,
             misses=misses,
             hit_ratio=hit_ratio,
-            volume=self._cache.volume(),
-            size_mb=self._get_directory_size()
+            volume=volume,
+            size_mb=volume / (1024 * 1024),
+            l1_hits=self._l1_hits,
+            l2_hits=self._l2_hits,
+            l1_size_mb=self._memory.nbytes / (1024 * 1024) if self._memory is not None else 0.0,
+            bytes_written=self._bytes_written,
+            evictions=self._evictions
         )
     
     def clear_expired(self) -> None:
         """Clean up expired entries"""
         self._cache.expire()
     
-    def _get_directory_size(self) -> float:
-        """Calculate total size of cache directory in MB"""
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(self._directory):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
-                total_size += os.path.getsize(filepath)
-        return total_size / (1024 * 1024)
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+    
+    def _map_value(self, result: Any) -> Any:
+        """Memory-map a value diskcache returned as an open file (small values come back as bytes)"""
+        if not hasattr(result, 'fileno'):
+            return result
+        with result as file:
+            # The mapping stays valid after the file is closed (or evicted)
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
     
     def _on_cache_hit(self) -> None:
         """Override for cache hit logging"""
-        if self._cache.stats()[0] % 100 == 0:
+        if (self._l1_hits + self._l2_hits) % 100 == 0:
             self._log_cache_stats()
     
     def _on_cache_miss(self) -> None:
@@ -84,7 +235,10 @@ class DiskCacheService(ICacheService[T_Key, T_Value], Generic[T_Key, T_Value]):
     def _log_cache_stats(self) -> None:
         """Log cache performance metrics"""
         stats = self.get_stats()
-        print(f'[{self._namespace}] Cache Stats - Hits: {stats.hits}, Misses: {stats.misses}, Ratio: {stats.hit_ratio:.1f}%')
+        print(
+            f'[{self._namespace}] Cache Stats - Hits: {stats.hits}, Misses: {stats.misses}, Ratio: {stats.hit_ratio:.1f}%, '
+            f'L1 hits: {stats.l1_hits}, L2 hits: {stats.l2_hits}'
+        )
     
     # Abstract methods for serialization (should be implemented by subclasses)
     @abstractmethod
@@ -100,4 +254,36 @@ class DiskCacheService(ICacheService[T_Key, T_Value], Generic[T_Key, T_Value]):
     @abstractmethod
     def _deserialize_value(self, data: bytes) -> T_Value:
         """Deserialize value from storage"""
-        pass
\ No newline at end of file
+        pass
+
+def _collect_cache_metrics() -> Iterable[str]:
+    """Prometheus lines for every live cache service, summed per namespace"""
+    per_namespace: Dict[str, Dict[str, float]] = {}
+    for service in list(_instances):
+        stats = service.get_stats()
+        totals = per_namespace.setdefault(service._namespace, {})
+        for name, value in (
+            ('hits_l1', stats.l1_hits), ('hits_l2', stats.l2_hits), ('misses', stats.misses),
+            ('bytes_written', stats.bytes_written), ('evictions', stats.evictions), ('l1_bytes', stats.l1_size_mb * 1024 * 1024),
+        ):
+            totals[name] = totals.get(name, 0) + value
+        # Instances sharing a namespace share the same disk store
+        totals['volume_bytes'] = stats.volume
+
+    families = (
+        ('cache_hits_total', 'counter', 'Cache hits', lambda t: [({'tier': 'l1'}, t['hits_l1']), ({'tier': 'l2'}, t['hits_l2'])]),
+        ('cache_misses_total', 'counter', 'Cache misses', lambda t: [({}, t['misses'])]),
+        ('cache_written_bytes_total', 'counter', 'Serialized bytes written to disk', lambda t: [({}, t['bytes_written'])]),
+        ('cache_evictions_total', 'counter', 'Entries culled by diskcache on write', lambda t: [({}, t['evictions'])]),
+        ('cache_volume_bytes', 'gauge', 'Disk volume reported by diskcache', lambda t: [({}, t['volume_bytes'])]),
+        ('cache_l1_bytes', 'gauge', 'Bytes held by the in-memory tier', lambda t: [({}, t['l1_bytes'])]),
+    )
+    lines = []
+    for name, type_name, help, samples in families:
+        lines += [f'# HELP {name} {help}', f'# TYPE {name} {type_name}']
+        for namespace, totals in per_namespace.items():
+            for labels, value in samples(totals):
+                lines.append(format_sample(name, value, {'namespace': namespace, **labels}))
+    return lines
+
+metrics.register_collector(_collect_cache_metrics)
@@ -0,0 +1,66 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+class MemoryTier(Generic[T]):
+    """
+    In-process LRU of deserialized cache values, bounded by their serialized size in bytes.
+    Entries may carry an expiry time (wall clock, as diskcache's expire_time).
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, Tuple[T, int, Optional[float]]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[T]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] is not None and entry[2] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: T, size: int, expire_time: Optional[float] = None) -> None:
+        # Values larger than the whole tier would only flush it
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expire_time)
+            self._bytes += size
+
+            # Evict least recently used entries until the tier fits its budget again
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> Any:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
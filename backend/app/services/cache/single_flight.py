@@ -0,0 +1,36 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, TypeVar
+
+T = TypeVar('T')
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls for the same key within a process: the first caller runs
+    the function and every caller that arrives while it runs waits for that result.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
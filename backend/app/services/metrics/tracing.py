@@ -0,0 +1,48 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from services.metrics.registry import metrics
+
+stage_duration = metrics.histogram('stage_duration_seconds', 'Latency of each pipeline stage', ('stage',))
+
+class Trace:
+    """Spans recorded while serving one request (from any thread the request's context reaches)"""
+
+    def __init__(self) -> None:
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. decode;dur=3.1, kaldi.mfcc;dur=120.4"""
+        with self._lock:
+            return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+def start_trace() -> Trace:
+    """Collect the spans of the current context (and of the contexts copied from it) into a new trace"""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+def record(name: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere (e.g. reported by a shell script)"""
+    stage_duration.observe(seconds, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
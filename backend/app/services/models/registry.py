@@ -0,0 +1,135 @@
+import time
+import threading
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import MODEL_RETRY_S, MODEL_RETRY_MAX_S
+from services.metrics.registry import metrics, format_sample
+
+@dataclass
+class ModelEntry:
+    name: str
+    factory: Callable[[], Any]
+    preload: bool
+    # Safe to load in a pre-fork master and share copy-on-write with the forked workers:
+    # plain CPU tensors, no threads, subprocesses or device contexts
+    fork_safe: bool = False
+    # GET /ready waits for it (optional models are preloaded too, but only their status shows a failure)
+    required: bool = True
+    state: str = 'pending'  # pending, loading, ready or failed
+    value: Any = None
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+class ModelRegistry:
+    """
+    Models built by a factory on first use, or ahead of time by a background preload.
+    Factories import their heavy libraries themselves, so importing the API stays cheap.
+    Failed preloads are retried in the background, retry_s after the failure and then
+    twice as long each time (at most retry_max_s).
+    """
+
+    def __init__(self, retry_s: float = MODEL_RETRY_S, retry_max_s: float = MODEL_RETRY_MAX_S) -> None:
+        self._retry_s = retry_s
+        self._retry_max_s = retry_max_s
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.Lock()
+        # One lock per model: a request that needs a model being preloaded waits for it
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._preload_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable[[], Any], preload: bool = True, fork_safe: bool = False, required: bool = True) -> None:
+        with self._lock:
+            self._entries[name] = ModelEntry(name, factory, preload, fork_safe, required)
+            self._load_locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """The model, built now if it is not loaded yet (load failures are retried on the next call)"""
+        entry = self._entries[name]
+        if entry.state == 'ready':
+            return entry.value
+
+        with self._load_locks[name]:
+            if entry.state == 'ready':
+                return entry.value
+
+            entry.state = 'loading'
+            start = time.perf_counter()
+            try:
+                value = entry.factory()
+            except Exception as e:
+                entry.state, entry.error = 'failed', str(e)
+                raise
+            entry.load_seconds = time.perf_counter() - start
+            entry.value, entry.state, entry.error = value, 'ready', None
+            print(f'[models] {name} loaded in {entry.load_seconds:.2f}s')
+            return value
+
+    def get_if_ready(self, name: str) -> Optional[Any]:
+        """The model if it is loaded, None instead of building it (or waiting for its preload)"""
+        entry = self._entries[name]
+        return entry.value if entry.state == 'ready' else None
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> None:
+        """Load the preload models (or the given ones) one after the other"""
+        for name in names if names is not None else [entry.name for entry in self._entries.values() if entry.preload]:
+            try:
+                self.get(name)
+            except Exception:
+                print(f'[models] Failed to preload {name}')
+                traceback.print_exc()
+
+    def preload_in_background(self) -> threading.Thread:
+        """Preload on a daemon thread, so the server listens (and answers /ready) meanwhile"""
+        if self._preload_thread is None:
+            self._preload_thread = threading.Thread(target=self._preload_with_retries, name='model-preload', daemon=True)
+            self._preload_thread.start()
+        return self._preload_thread
+
+    def _preload_with_retries(self) -> None:
+        self.preload()
+        delay = self._retry_s
+        while True:
+            failed = [entry.name for entry in self._entries.values() if entry.preload and entry.state == 'failed']
+            if not failed:
+                return
+            print(f'[models] Retrying {", ".join(failed)} in {delay:.0f}s')
+            time.sleep(delay)
+            self.preload(failed)
+            delay = min(2 * delay, self._retry_max_s)
+
+    def fork_safe_names(self) -> List[str]:
+        """Preload models that a pre-fork master can load once for all its workers"""
+        return [entry.name for entry in self._entries.values() if entry.preload and entry.fork_safe]
+
+    @property
+    def ready(self) -> bool:
+        """Every required preload model is loaded"""
+        return all(entry.state == 'ready' for entry in self._entries.values() if entry.preload and entry.required)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            entry.name: {
+                'state': entry.state,
+                'preload': entry.preload,
+                'required': entry.required,
+                'load_seconds': round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+                **({'error': entry.error} if entry.error else {}),
+            }
+            for entry in self._entries.values()
+        }
+
+    def collect_metrics(self) -> Iterable[str]:
+        """Prometheus lines: load state and load time of every model"""
+        entries: List[ModelEntry] = list(self._entries.values())
+        lines = ['# HELP model_ready Model loaded (1) or not (0)', '# TYPE model_ready gauge']
+        lines += [format_sample('model_ready', int(entry.state == 'ready'), {'model': entry.name}) for entry in entries]
+        lines += ['# HELP model_load_seconds Time it took to build the model', '# TYPE model_load_seconds gauge']
+        lines += [
+            format_sample('model_load_seconds', entry.load_seconds, {'model': entry.name})
+            for entry in entries if entry.load_seconds is not None
+        ]
+        return lines
+
+models = ModelRegistry()
+metrics.register_collector(models.collect_metrics)
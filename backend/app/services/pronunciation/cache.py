@@ -0,0 +1,115 @@
+import json
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Union
+from config import REF_PHONES_CACHE_MEMORY_MB, EVAL_CACHE_MEMORY_MB, EVAL_CACHE_TTL_S
+from core.interfaces.icache_service import CacheKey
+from services.cache.diskcache_service import DiskCacheService
+from services.tts.cache import TTSCacheKey
+from utils.audio_ingest import audio_content_hash
+
+class ReferencePhonesCacheService(DiskCacheService[TTSCacheKey, str]):
+    """Cache for reference phone alignments (text-phone output of the reference audio)"""
+    
+    def __init__(
+        self, 
+        directory: str = 'pronunciation_cache', 
+        size_limit_gb: int = 1, 
+        memory_limit_mb: int = REF_PHONES_CACHE_MEMORY_MB
+    ) -> None:
+        super().__init__(
+            namespace='ref_phones',
+            directory=directory,
+            memory_limit_bytes=memory_limit_mb * 1024 * 1024,
+            size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
+            eviction_policy='least-recently-used',
+            sqlite_journal_mode='WAL'  # Write-ahead logging
+        )
+        self._hash_version = 'ref-phones-v1'
+    
+    def _serialize_key(self, key: TTSCacheKey) -> str:
+        """Same hash as the reference audio it was aligned from"""
+        return key.to_cache_key(prefix='ref_phones')
+    
+    def _serialize_value(self, value: str) -> bytes:
+        return value.encode('utf-8')
+    
+    def _deserialize_value(self, data: bytes) -> str:
+        return data.decode('utf-8')
+
+@dataclass(frozen=True)
+class EvaluationCacheKey(CacheKey):
+    """Evaluation of one recording (decoded audio fingerprint) against a target text"""
+    fingerprint: str
+    sample_rate: int
+    target_text: str
+    scoring: str
+    
+    @classmethod
+    def from_audio(cls, audio: np.ndarray, sample_rate: int, target_text: str, scoring: str) -> 'EvaluationCacheKey':
+        return cls(audio_content_hash(audio), int(sample_rate), target_text.strip(), scoring)
+
+@dataclass(frozen=True)
+class IdempotencyKey(CacheKey):
+    """
+    Client supplied Idempotency-Key of an evaluation request (scoped to its target text).
+    Its entry holds the fingerprint of the upload and the result: {'upload': ..., 'result': ...}
+    """
+    key: str
+    target_text: str
+
+class IdempotencyKeyReusedError(ValueError):
+    """An Idempotency-Key sent again with a different recording"""
+
+EvaluationKey = Union[EvaluationCacheKey, IdempotencyKey]
+
+class EvaluationCacheService(DiskCacheService[EvaluationKey, Dict[str, Any]]):
+    """
+    Short-lived cache of final evaluation results (JSON), so resubmissions of the same
+    recording return without rerunning TTS and Kaldi
+    """
+    
+    _default_expire = EVAL_CACHE_TTL_S
+    # v2: idempotency entries store the upload fingerprint with the result
+    _schema_version = 'evaluations-v2'
+    
+    def __init__(
+        self, 
+        directory: str = 'pronunciation_cache', 
+        size_limit_gb: int = 1, 
+        memory_limit_mb: int = EVAL_CACHE_MEMORY_MB
+    ) -> None:
+        super().__init__(
+            namespace='evaluations',
+            directory=directory,
+            memory_limit_bytes=memory_limit_mb * 1024 * 1024,
+            size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
+            eviction_policy='least-recently-stored',
+            sqlite_journal_mode='WAL'  # Write-ahead logging
+        )
+        self._hash_version = 'evaluations-v1'
+    
+    def get_idempotent(self, key: IdempotencyKey, upload: str) -> Optional[Dict[str, Any]]:
+        """
+        Result stored for an Idempotency-Key (upload: upload_fingerprint of the request).
+        Raises IdempotencyKeyReusedError when the key came with another recording.
+        """
+        record = self.get(key)
+        if record is None:
+            return None
+        if record['upload'] != upload:
+            raise IdempotencyKeyReusedError('Idempotency-Key was already used with a different recording')
+        return record['result']
+    
+    def set_idempotent(self, key: IdempotencyKey, upload: str, result: Dict[str, Any]) -> None:
+        self.set(key, {'upload': upload, 'result': result})
+    
+    def _serialize_key(self, key: EvaluationKey) -> str:
+        prefix = 'idempotency' if isinstance(key, IdempotencyKey) else 'evaluation'
+        return key.to_cache_key(prefix=prefix)
+    
+    def _serialize_value(self, value: Dict[str, Any]) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+    
+    def _deserialize_value(self, data: bytes) -> Dict[str, Any]:
+        return json.loads(data)
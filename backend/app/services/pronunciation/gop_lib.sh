@@ -0,0 +1,159 @@
+#!/bin/bash
+
+# GOP pipeline shared by run.sh (one run per process) and gop_worker.sh (resident worker).
+# Source this file, call gop_setup once and then gop_run for every utterance
+# (or gop_score for a data dir that already holds many utterances).
+
+# Load the Kaldi environment, validate the model dirs and build the assets that only
+# depend on the model (must run before parse_options.sh, which lives in utils/)
+gop_setup() {
+    # This pipeline must be executed from gop home
+    cd $KALDI_HOME/egs/gop_speechocean762/s5 || return 1;
+
+    # Load the cmd.sh and path.sh scripts
+    . ./cmd.sh
+    . ./path.sh
+
+    # This recipe depends on the model trained in the librispeech recipe.
+    librispeech_eg=$KALDI_HOME/egs/librispeech/s5
+    model=$librispeech_eg/exp/nnet3_cleaned/tdnn_sp
+    ivector_extractor=$librispeech_eg/exp/nnet3_cleaned/extractor
+    lang=$librispeech_eg/data/lang
+    phones=$model/phones.txt
+
+    for d in $model $ivector_extractor $lang; do
+      [ ! -d $d ] && echo "$0: no such path $d" >&2 && return 1;
+    done
+
+    # Make a map which converts phones to "pure-phones" (only depends on the lang dir).
+    # Every shell builds its own copy, named by its pid under GOP_ASSETS_DIR (so a respawned
+    # worker never rewrites files another one is reading); copies of dead shells are swept
+    if [ -n "$GOP_ASSETS_DIR" ]; then
+        mkdir -p $GOP_ASSETS_DIR || return 1;
+        local stale
+        for stale in $GOP_ASSETS_DIR/*; do
+            [[ ${stale##*/} =~ ^[0-9]+$ ]] && ! kill -0 ${stale##*/} 2> /dev/null && rm -rf $stale
+        done
+        gop_assets=$GOP_ASSETS_DIR/$$
+        mkdir -p $gop_assets || return 1;
+    else
+        gop_assets=$(mktemp -d) || return 1;
+    fi
+    trap 'rm -rf "$gop_assets"' EXIT
+    local/remove_phone_markers.pl $lang/phones.txt $gop_assets/phones-pure.txt $gop_assets/phone-to-pure-phone.int > /dev/null || return 1;
+
+    # Pull the model files into the page cache so every Kaldi binary reads them from RAM
+    cat $model/final.mdl $model/tree $ivector_extractor/* $lang/L.fst $lang/words.txt > /dev/null 2>&1
+    return 0
+}
+
+# Stage timings: when GOP_TIMING_FILE is set, every gop_timer_mark appends
+# "<stage> <microseconds since the previous mark>" to it (EPOCHREALTIME, no forks)
+gop_timer_start() {
+    _gop_mark=${EPOCHREALTIME/[.,]/}
+}
+
+gop_timer_mark() {
+    local now=${EPOCHREALTIME/[.,]/}
+    if [ -n "$GOP_TIMING_FILE" ]; then
+        echo "$1 $(( now - _gop_mark ))" >> $GOP_TIMING_FILE
+    fi
+    _gop_mark=$now
+}
+
+# Compute GOP scores for one data dir and print the gop ark to stdout
+# Args: text_file wav_file text_phone input_dir
+gop_run() {
+    local text_file=$1
+    local wav_file=$2
+    local text_phone=$3
+    local input_dir=$4
+
+    # Create data directory
+    gop_timer_start
+    rm -rf $input_dir
+    local/create_struct.sh $text_file $wav_file $input_dir conf/mfcc_hires.conf > /dev/null || exit 1;
+    gop_timer_mark data_prep
+
+    gop_score $input_dir $text_phone
+}
+
+# Compute GOP scores for every utterance of a data dir (wav.scp, text, utt2spk, spk2utt)
+# using $nj parallel jobs and print the gop arks to stdout
+# Args: input_dir text_phone
+gop_score() {
+    local input_dir=$1
+    local text_phone=$2
+
+    # Create output temp directories (next to the data dir, i.e. in the same request workspace)
+    local output_dir=$(mktemp -d "${input_dir%/}.out.XXXXXX")
+    gop_timer_start
+
+    # Validate data directory
+    utils/validate_data_dir.sh --no-feats $input_dir > /dev/null || exit 1;
+    gop_timer_mark validate
+
+    # Create high-resolution MFCC features
+    steps/make_mfcc.sh --nj $nj --mfcc-config conf/mfcc_hires.conf --cmd "$cmd" $input_dir > /dev/null || exit 1;
+    steps/compute_cmvn_stats.sh $input_dir > /dev/null || exit 1;
+    utils/fix_data_dir.sh $input_dir > /dev/null || exit 1;
+    gop_timer_mark mfcc_cmvn
+
+    # Extract ivector
+    steps/online/nnet2/extract_ivectors_online.sh --cmd "$cmd" --nj $nj $input_dir $ivector_extractor $input_dir/ivectors > /dev/null || exit 1;
+    gop_timer_mark ivector
+
+    # Compute Log-likelihoods
+    steps/nnet3/compute_output.sh --cmd "$cmd" --nj $nj --online-ivector-dir $input_dir/ivectors $input_dir $model $output_dir/probs_test > /dev/null || exit 1;
+    gop_timer_mark compute_output
+
+    # Split data and make phone-level transcripts
+    utils/split_data.sh $input_dir $nj > /dev/null || exit 1;
+    for i in `seq 1 $nj`; do
+        utils/sym2int.pl -f 2- $lang/words.txt $input_dir/split${nj}/$i/text > $input_dir/split${nj}/$i/text.int || exit 1;
+    done
+
+    # Convert reference phone transcripts to integer format
+    utils/sym2int.pl -f 2- $phones $text_phone > $input_dir/text-phone.int || exit 1
+    gop_timer_mark split_data
+
+    # Make align graphs
+    $cmd JOB=1:$nj $output_dir/ali_test/log/mk_align_graph.JOB.log \
+        compile-train-graphs-without-lexicon \
+            --read-disambig-syms=$lang/phones/disambig.int \
+            $model/tree $model/final.mdl \
+            "ark,t:$input_dir/split${nj}/JOB/text.int" \
+            "ark,t:$input_dir/text-phone.int" \
+            "ark:|gzip -c > $output_dir/ali_test/fsts.JOB.gz" > /dev/null || exit 1;
+        echo $nj > $output_dir/ali_test/num_jobs
+    gop_timer_mark align_graph
+
+    # Align
+    steps/align_mapped.sh --cmd "$cmd" --nj $nj --graphs $output_dir/ali_test $input_dir $output_dir/probs_test $lang $model $output_dir/ali_test > /dev/null || exit 1;
+    gop_timer_mark align_mapped
+
+    # Convert transition-id to phone-id
+    $cmd JOB=1:$nj $output_dir/ali_test/log/ali_to_phones.JOB.log \
+        ali-to-phones --per-frame=true $model/final.mdl \
+            "ark,t:gunzip -c $output_dir/ali_test/ali.JOB.gz|" \
+            "ark,t:|gzip -c >$output_dir/ali_test/ali-phone.JOB.gz" > /dev/null || exit 1;
+    gop_timer_mark ali_to_phones
+
+    # Compute GOP
+    mkdir -p $output_dir/computed
+    $cmd JOB=1:$nj $output_dir/computed/log/compute_gop.JOB.log \
+        compute-gop --phone-map=$gop_assets/phone-to-pure-phone.int \
+            --skip-phones-string=0:1:2 \
+            $model/final.mdl \
+            "ark,t:gunzip -c $output_dir/ali_test/ali.JOB.gz|" \
+            "ark,t:gunzip -c $output_dir/ali_test/ali-phone.JOB.gz|" \
+            "ark:$output_dir/probs_test/output.JOB.ark" \
+            "ark,t,scp:$output_dir/computed/gop.JOB.ark,$output_dir/computed/gop.JOB.scp" \
+            "ark,t,scp:$output_dir/computed/feat.JOB.ark,$output_dir/computed/feat.JOB.scp" > /dev/null || exit 1;
+    gop_timer_mark compute_gop
+
+    # Return results to stdout
+    cat $output_dir/computed/gop.*.ark
+
+    rm -rf $output_dir
+}
@@ -0,0 +1,140 @@
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Sequence, Tuple
+
+# Word labels by average GOP score
+PASSED_THRESHOLD = -0.3
+AVERAGE_THRESHOLD = -0.7
+LABELS = np.array(['passed', 'average', 'failed'], dtype=object)
+
+POSITION_SUFFIXES = ('_B', '_I', '_E', '_S')
+
+def score_to_label(score: float) -> Literal['passed', 'average', 'failed']:
+    if score >= PASSED_THRESHOLD:
+        return 'passed'
+    elif score >= AVERAGE_THRESHOLD:
+        return 'average'
+    else:
+        return 'failed'
+
+def pure_phone(phone: str) -> str:
+    """Removes the word position suffix (_B, _I, _E, _S) and stress digits: 'AH0_B' -> 'AH'"""
+    if phone.endswith(POSITION_SUFFIXES):
+        phone = phone[:-2]
+    return ''.join(c for c in phone if not c.isdigit())
+
+@dataclass(frozen=True)
+class ReferencePhones:
+    """Pure phones of a text-phone file: ids, names and word lengths (in phones)"""
+    phone_ids: np.ndarray
+    words: Tuple[Tuple[str, ...], ...]
+    word_lengths: np.ndarray
+
+@dataclass(frozen=True)
+class WordScores:
+    """GOP score of every reference phone, segmented into words"""
+    words: Tuple[Tuple[str, ...], ...]
+    scores: np.ndarray
+    word_lengths: np.ndarray
+
+    def to_list(self) -> List[List[Tuple[str, float]]]:
+        """[[(phone, score), ...] per word], the format of the former align_phonemes_with_scores"""
+        scores = iter(self.scores.tolist())
+        return [[(phone, next(scores)) for phone in word] for word in self.words]
+
+class GOPPostProcessor:
+    """
+    Parses compute-gop output and aggregates it per word with NumPy.
+    The phone table (phones-pure.txt) is loaded once into an id -> name lookup array.
+    """
+
+    def __init__(self, phones_file: str) -> None:
+        table: Dict[int, str] = {}
+        with open(phones_file, 'rt') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 2:
+                    table[int(parts[1])] = parts[0]
+
+        size = max(table) + 1 if table else 0
+        self.phone_names = np.array([table.get(i, f'UNK{i}') for i in range(size)], dtype=object)
+        self.phone_ids = {name: idx for idx, name in table.items()}
+
+        # The same reference phones are scored over and over (one per target text)
+        self.reference = lru_cache(maxsize=1024)(self._reference)
+
+    def parse(self, gop_result_raw: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """(phone ids, scores) of every utterance of a gop ark: "utt [ id score ] [ id score ] ..." """
+        parsed = {}
+        for line in gop_result_raw.splitlines():
+            tokens = line.replace('[', ' ').replace(']', ' ').split()
+            if not tokens:
+                continue
+            pairs = np.array(tokens[1:], dtype=np.float64).reshape(-1, 2)
+            parsed[tokens[0]] = (pairs[:, 0].astype(np.int64), pairs[:, 1])
+        return parsed
+
+    def _reference(self, ref_phones_raw: str) -> ReferencePhones:
+        words = tuple(
+            tuple(pure_phone(phone) for phone in line.split()[1:])
+            for line in ref_phones_raw.strip().split('\n')
+        )
+        phones = [phone for word in words for phone in word]
+        # Unknown phones get -1, so they never match a scored phone
+        phone_ids = np.array([self.phone_ids.get(phone, -1) for phone in phones], dtype=np.int64)
+        word_lengths = np.array([len(word) for word in words], dtype=np.int64)
+        return ReferencePhones(phone_ids, words, word_lengths)
+
+    def align(self, phone_ids: np.ndarray, scores: np.ndarray, ref_phones_raw: str) -> WordScores:
+        """Match the scored phones with the reference phones, in order"""
+        reference = self.reference(ref_phones_raw)
+        n_phones = len(reference.phone_ids)
+        if len(phone_ids) < n_phones:
+            raise ValueError('Mismatch between scored phonemes and segments.')
+
+        mismatches = np.flatnonzero(phone_ids[:n_phones] != reference.phone_ids)
+        if len(mismatches):
+            index = int(mismatches[0])
+            expected = [phone for word in reference.words for phone in word][index]
+            got = self._phone_name(int(phone_ids[index]))
+            raise ValueError(f'Phoneme mismatch at index {index}: expected \'{expected}\', got \'{got}\'')
+
+        return WordScores(reference.words, scores[:n_phones], reference.word_lengths)
+
+    def _phone_name(self, idx: int) -> str:
+        return self.phone_names[idx] if 0 <= idx < len(self.phone_names) else f'UNK{idx}'
+
+    def format_result(self, gop_result_raw: str, ref_phones_raw: str) -> WordScores:
+        """Word scores of a single utterance gop ark"""
+        parsed = self.parse(gop_result_raw)
+        if not parsed:
+            raise ValueError('Empty GOP result')
+        phone_ids, scores = next(iter(parsed.values()))
+        return self.align(phone_ids, scores, ref_phones_raw)
+
+    def summarize(self, utterances: Sequence[WordScores]) -> List[List[Dict[str, Any]]]:
+        """
+        Average score and label of every word, for many utterances at once: all phones are
+        concatenated and reduced per word with one bincount.
+        """
+        if not utterances:
+            return []
+        word_lengths = np.concatenate([utterance.word_lengths for utterance in utterances])
+        scores = np.concatenate([utterance.scores for utterance in utterances])
+        word_index = np.repeat(np.arange(len(word_lengths)), word_lengths)
+
+        totals = np.bincount(word_index, weights=scores, minlength=len(word_lengths))
+        # Words without phones average 0.0
+        averages = totals / np.maximum(word_lengths, 1)
+        labels = LABELS[np.select([averages >= PASSED_THRESHOLD, averages >= AVERAGE_THRESHOLD], [0, 1], 2)]
+
+        averages, labels = np.round(averages, 4).tolist(), labels.tolist()
+        results, offset = [], 0
+        for utterance in utterances:
+            results.append([
+                {'phonemes': list(word), 'score': averages[offset + i], 'label': labels[offset + i]}
+                for i, word in enumerate(utterance.words)
+            ])
+            offset += len(utterance.words)
+        return results
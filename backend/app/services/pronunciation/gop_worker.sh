@@ -0,0 +1,40 @@
+#!/bin/bash
+
+# Resident GOP worker: loads the Kaldi environment once and then serves jobs read from stdin.
+#
+# Protocol (one job per line, tab separated):
+#   gop <timing_file> <text_file> <wav_file> <text_phone> <input_dir>   -> run the GOP pipeline
+#   ref <timing_file> <text_file> <wav_file> <input_dir>                -> run local/text-to-phone.sh
+#   batch <timing_file> <input_dir> <text_phone> <nj>                   -> score a multi-utterance data dir
+# <timing_file> receives the stage timings (see gop_timer_mark), "-" disables them.
+# The job stdout is forwarded as is. When a job fails its stderr is forwarded as
+# "__GOP_ERR__ <line>" lines. Every reply ends with "__GOP_DONE__ <exit status>".
+
+. "$(dirname "${BASH_SOURCE[0]}")/gop_lib.sh"
+
+# Each job handles one single file
+nj=1
+
+if ! gop_setup; then
+    echo "__GOP_READY__ 1"
+    exit 1
+fi
+echo "__GOP_READY__ 0"
+
+while IFS=$'\t' read -r kind timing_file arg1 arg2 arg3 arg4; do
+    err_file=$(mktemp)
+    [ "$timing_file" = "-" ] && GOP_TIMING_FILE= || GOP_TIMING_FILE=$timing_file
+
+    # Jobs run in a subshell so a failing stage (exit 1) does not kill the worker
+    case $kind in
+        gop) ( gop_run "$arg1" "$arg2" "$arg3" "$arg4" ) 2> $err_file ;;
+        ref) ( /bin/bash local/text-to-phone.sh "$arg1" "$arg2" "$arg3" ) 2> $err_file ;;
+        batch) ( nj=$arg3; gop_score "$arg1" "$arg2" ) 2> $err_file ;;
+        *) echo "unknown job kind: $kind" > $err_file; false ;;
+    esac
+    status=$?
+
+    [ $status -ne 0 ] && sed 's/^/__GOP_ERR__ /' $err_file
+    rm -f $err_file
+    echo "__GOP_DONE__ $status"
+done
@@ -0,0 +1,166 @@
+import os
+import queue
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+READY_MARKER = '__GOP_READY__'
+DONE_MARKER = '__GOP_DONE__'
+ERROR_MARKER = '__GOP_ERR__'
+
+class GOPWorker:
+    """Resident gop_worker.sh process that serves one job at a time over its stdin/stdout pipes"""
+
+    def __init__(self, script_path: str, timeout: float, env: Optional[Dict[str, str]] = None) -> None:
+        self._timeout = timeout
+        self._process = subprocess.Popen(
+            ['/bin/bash', script_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            text=True,
+            bufsize=1
+        )
+
+        # Wait until the Kaldi environment is loaded
+        line = self._read_line()
+        if not line.startswith(READY_MARKER) or line.split()[1] != '0':
+            self.close()
+            raise RuntimeError(f'GOP worker failed to start: {line.strip()}')
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def run(self, kind: str, args: List[str], timing_file: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """
+        Send one job to the worker and return its stdout (stage timings go to timing_file).
+        The job is killed after timeout seconds (the worker's default when None).
+        """
+        fields = [kind, timing_file or '-', *args]
+        if any('\t' in field or '\n' in field for field in fields):
+            raise ValueError('GOP job arguments cannot contain tabs or newlines')
+
+        self._process.stdin.write('\t'.join(fields) + '\n')
+        self._process.stdin.flush()
+
+        # Kill the worker if the job hangs, which unblocks the read below
+        timer = threading.Timer(timeout or self._timeout, self._process.kill)
+        timer.start()
+        try:
+            output, errors = [], []
+            while True:
+                line = self._read_line()
+                if line.startswith(DONE_MARKER):
+                    status = int(line.split()[1])
+                    break
+                if line.startswith(ERROR_MARKER):
+                    errors.append(line[len(ERROR_MARKER) + 1:])
+                else:
+                    output.append(line)
+        finally:
+            timer.cancel()
+
+        if status != 0:
+            stderr = ''.join(errors)
+            print(f'Error running GOP job {kind}:', stderr)
+            raise subprocess.CalledProcessError(status, [kind, *args], output=''.join(output), stderr=stderr)
+        return ''.join(output)
+
+    def close(self) -> None:
+        if self.alive:
+            self._process.stdin.close()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+
+    def _read_line(self) -> str:
+        line = self._process.stdout.readline()
+        if not line:
+            raise RuntimeError('GOP worker exited unexpectedly')
+        return line
+
+class GOPWorkerPool:
+    """
+    Pool of resident GOP workers.
+
+    Each worker sources the Kaldi environment, validates the model dirs and builds the
+    phone map once, so a job only pays for the Kaldi stages themselves.
+    """
+
+    def __init__(self, size: int, timeout: float, script_path: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> None:
+        self._size = size
+        self._timeout = timeout
+        self._env = env
+        self._script_path = script_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gop_worker.sh')
+        self._idle: queue.Queue[GOPWorker] = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        # Workers of this process, idle or busy: fewer than size after a failed respawn
+        self._live = 0
+
+    def start(self) -> None:
+        """Spawn the workers (again after a fork, pipes cannot be shared between processes)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._idle = queue.Queue()
+            for _ in range(self._size):
+                self._idle.put(GOPWorker(self._script_path, self._timeout, self._env))
+            self._live = self._size
+            self._pid = os.getpid()
+            print(f'Started {self._size} GOP workers')
+
+    def run(self, kind: str, args: List[str], timing_file: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """Run a job on the next idle worker (timeout: of this job, see GOPWorker.run)"""
+        self.start()
+        worker = self._acquire()
+        try:
+            return worker.run(kind, args, timing_file, timeout)
+        finally:
+            self._release(worker)
+
+    def _acquire(self) -> GOPWorker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Replace a worker whose respawn failed (e.g. a transient fork or memory failure)
+        # instead of waiting for one of the remaining workers
+        with self._lock:
+            spawn = self._live < self._size
+            if spawn:
+                self._live += 1
+        if spawn:
+            try:
+                return GOPWorker(self._script_path, self._timeout, self._env)
+            except Exception:
+                with self._lock:
+                    self._live -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise RuntimeError('No GOP worker available')
+
+    def _release(self, worker: GOPWorker) -> None:
+        """Return a worker to the pool, replacing it if it died (crash or timeout)"""
+        if not worker.alive:
+            try:
+                worker = GOPWorker(self._script_path, self._timeout, self._env)
+            except Exception as e:
+                # The next job that finds no idle worker spawns its replacement
+                print('Could not respawn GOP worker:', str(e))
+                with self._lock:
+                    self._live -= 1
+                return
+        self._idle.put(worker)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+        self._live = 0
+        self._pid = None
@@ -0,0 +1,89 @@
+"""
+Minimal reader/writer for Kaldi binary archives (ark) held in memory.
+
+Supported objects: float/double matrices (FM/DM), float/double vectors (FV/DV) and int32
+vectors (alignments). Reading returns NumPy views on the input bytes, no copies.
+"""
+import struct
+import numpy as np
+from typing import Iterable, Iterator, Tuple, Union
+
+ArkData = Union[bytes, bytearray, memoryview]
+
+_MATRIX_TOKENS = {b'FM ': np.float32, b'DM ': np.float64}
+_VECTOR_TOKENS = {b'FV ': np.float32, b'DV ': np.float64}
+
+# Binary int32 vectors store every element with its size byte: \x04 <int32>
+_INT_ELEMENT = np.dtype([('size', 'i1'), ('value', '<i4')])
+
+class KaldiFormatError(ValueError):
+    """Data that is not a supported binary Kaldi archive"""
+
+def _read_int32(data: memoryview, pos: int) -> Tuple[int, int]:
+    if data[pos] != 4:
+        raise KaldiFormatError(f'Expected int32 size marker at byte {pos}')
+    return struct.unpack_from('<i', data, pos + 1)[0], pos + 5
+
+def read_ark(data: ArkData) -> Iterator[Tuple[str, np.ndarray]]:
+    """Iterate (key, array) pairs of a binary archive"""
+    data = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        space = bytes(data[pos:pos + 256]).find(b' ')
+        if space <= 0:
+            raise KaldiFormatError(f'Expected "<key> " at byte {pos}')
+        key = bytes(data[pos:pos + space]).decode()
+        pos += space + 1
+
+        if bytes(data[pos:pos + 2]) != b'\0B':
+            raise KaldiFormatError(f'Entry {key} is not binary (text archives are not supported)')
+        pos += 2
+
+        token = bytes(data[pos:pos + 3])
+        if token in _MATRIX_TOKENS:
+            dtype = np.dtype(_MATRIX_TOKENS[token])
+            rows, pos = _read_int32(data, pos + 3)
+            cols, pos = _read_int32(data, pos)
+            size = rows * cols * dtype.itemsize
+            array = np.frombuffer(data[pos:pos + size], dtype=dtype).reshape(rows, cols)
+            pos += size
+        elif token in _VECTOR_TOKENS:
+            dtype = np.dtype(_VECTOR_TOKENS[token])
+            dim, pos = _read_int32(data, pos + 3)
+            size = dim * dtype.itemsize
+            array = np.frombuffer(data[pos:pos + size], dtype=dtype)
+            pos += size
+        elif data[pos] == 4:
+            dim, pos = _read_int32(data, pos)
+            size = dim * _INT_ELEMENT.itemsize
+            array = np.frombuffer(data[pos:pos + size], dtype=_INT_ELEMENT)['value']
+            pos += size
+        else:
+            raise KaldiFormatError(f'Entry {key} has an unsupported type {token!r} (e.g. compressed matrix)')
+
+        yield key, array
+
+def write_ark(items: Iterable[Tuple[str, np.ndarray]]) -> bytes:
+    """Binary archive of float matrices/vectors and int32 vectors"""
+    parts = []
+    for key, array in items:
+        parts.append(key.encode() + b' \0B')
+        if np.issubdtype(array.dtype, np.integer):
+            if array.ndim != 1:
+                raise KaldiFormatError(f'Entry {key}: only 1-d integer arrays are supported')
+            elements = np.empty(len(array), dtype=_INT_ELEMENT)
+            elements['size'] = 4
+            elements['value'] = array
+            parts.append(b'\x04' + struct.pack('<i', len(array)) + elements.tobytes())
+            continue
+
+        array = np.ascontiguousarray(array, dtype=np.float64 if array.dtype == np.float64 else np.float32)
+        prefix = b'D' if array.dtype == np.float64 else b'F'
+        if array.ndim == 2:
+            parts.append(prefix + b'M \x04' + struct.pack('<i', array.shape[0]) + b'\x04' + struct.pack('<i', array.shape[1]))
+        elif array.ndim == 1:
+            parts.append(prefix + b'V \x04' + struct.pack('<i', array.shape[0]))
+        else:
+            raise KaldiFormatError(f'Entry {key}: only matrices and vectors are supported')
+        parts.append(array.tobytes())
+    return b''.join(parts)
@@ -0,0 +1,266 @@
+"""
+In-memory GOP pipeline: the Kaldi binaries of gop_score (gop_lib.sh) chained through pipes.
+
+Audio goes in through ark:- and every intermediate archive (features, ivectors, log-likelihoods,
+graphs, alignments) moves between the processes as bytes, either on stdin/stdout or on extra
+pipes passed as /dev/fd/<n>. Nothing is written to disk per utterance.
+"""
+import os
+import io
+import signal
+import subprocess
+import threading
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+from config import GOP_WORKER_TIMEOUT_S
+from services.metrics.tracing import span
+from services.pronunciation.kaldi_io import read_ark, write_ark
+
+# steps/online/nnet2/extract_ivectors_online.sh defaults
+IVECTOR_PERIOD = 10
+IVECTOR_OPTS = ['--num-gselect=5', '--min-post=0.025', '--posterior-scale=0.1', '--max-remembered-frames=1000', '--max-count=0']
+
+# steps/nnet3/compute_output.sh defaults
+NNET_OPTS = ['--frames-per-chunk=50', '--extra-left-context=0', '--extra-right-context=0',
+             '--extra-left-context-initial=-1', '--extra-right-context-final=-1']
+
+# steps/align_mapped.sh defaults
+ALIGN_OPTS = ['--transition-scale=1.0', '--acoustic-scale=0.1', '--self-loop-scale=0.1',
+              '--beam=10', '--retry-beam=40', '--careful=false']
+
+def _load_symbols(path: str) -> Dict[str, int]:
+    symbols = {}
+    with open(path, 'rt') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 2:
+                symbols[parts[0]] = int(parts[1])
+    return symbols
+
+def _write_all(fd: int, data: bytes) -> None:
+    try:
+        with os.fdopen(fd, 'wb') as pipe:
+            pipe.write(data)
+    except BrokenPipeError:
+        # The reader exited early, its exit status tells why
+        pass
+
+def apply_cmvn(feats: np.ndarray, norm_means: bool, norm_vars: bool) -> np.ndarray:
+    """Per-utterance CMVN, as apply-cmvn with the stats of compute-cmvn-stats (one speaker per utterance)"""
+    if not norm_means and not norm_vars:
+        return feats
+    mean = feats.mean(axis=0, dtype=np.float64)
+    normalized = feats - mean
+    if norm_vars:
+        normalized /= np.sqrt(np.maximum(normalized.var(axis=0), 1e-10))
+    return normalized.astype(np.float32)
+
+class KaldiPipeline:
+    """
+    Scores one utterance with the GOP recipe's binaries, without a data dir. Every binary
+    is killed (with its process group) when it runs longer than timeout seconds.
+    """
+
+    def __init__(self, kaldi_home: str, assets_dir: str, timeout: float = GOP_WORKER_TIMEOUT_S) -> None:
+        self._timeout = timeout
+        self.gop_home = os.path.join(kaldi_home, 'egs/gop_speechocean762/s5')
+        librispeech_eg = os.path.join(kaldi_home, 'egs/librispeech/s5')
+        self.model_dir = os.path.join(librispeech_eg, 'exp/nnet3_cleaned/tdnn_sp')
+        self.extractor_dir = os.path.join(librispeech_eg, 'exp/nnet3_cleaned/extractor')
+        self.lang_dir = os.path.join(librispeech_eg, 'data/lang')
+        for path in (self.model_dir, self.extractor_dir, self.lang_dir):
+            if not os.path.isdir(path):
+                raise FileNotFoundError(f'No such path {path}')
+
+        self.model = os.path.join(self.model_dir, 'final.mdl')
+        self._env = self._load_kaldi_env()
+        self._words = _load_symbols(os.path.join(self.lang_dir, 'words.txt'))
+        self._phones = _load_symbols(os.path.join(self.model_dir, 'phones.txt'))
+        self._cmvn = self._load_cmvn_opts()
+
+        frame_subsampling = os.path.join(self.model_dir, 'frame_subsampling_factor')
+        self._subsampling_opts = []
+        if os.path.exists(frame_subsampling):
+            with open(frame_subsampling, 'rt') as file:
+                self._subsampling_opts = [f'--frame-subsampling-factor={file.read().strip()}']
+
+        os.makedirs(assets_dir, exist_ok=True)
+        self._build_assets(assets_dir)
+
+    def _load_kaldi_env(self) -> Dict[str, str]:
+        """Environment of the recipe's path.sh (PATH to the Kaldi binaries, LC_ALL=C)"""
+        output = subprocess.run(
+            ['/bin/bash', '-c', '. ./path.sh && env -0'],
+            check=True, capture_output=True, cwd=self.gop_home, timeout=self._timeout
+        ).stdout
+        return dict(entry.split('=', 1) for entry in output.decode().split('\0') if '=' in entry)
+
+    def _load_cmvn_opts(self) -> Dict[str, bool]:
+        """cmvn_opts of the acoustic model (apply-cmvn defaults: means on, variances off)"""
+        cmvn = {'norm_means': True, 'norm_vars': False}
+        path = os.path.join(self.model_dir, 'cmvn_opts')
+        if not os.path.exists(path):
+            return cmvn
+        with open(path, 'rt') as file:
+            for opt in file.read().split():
+                name, _, value = opt.lstrip('-').partition('=')
+                if name in ('norm-means', 'norm-vars'):
+                    cmvn[name.replace('-', '_')] = value != 'false'
+        return cmvn
+
+    def _build_assets(self, assets_dir: str) -> None:
+        """Model-only files, built once: phone map, raw nnet and the online ivector config"""
+        self.phone_map = os.path.join(assets_dir, 'phone-to-pure-phone.int')
+        subprocess.run(
+            ['local/remove_phone_markers.pl', os.path.join(self.lang_dir, 'phones.txt'),
+             os.path.join(assets_dir, 'phones-pure.txt'), self.phone_map],
+            check=True, capture_output=True, cwd=self.gop_home, env=self._env, timeout=self._timeout
+        )
+
+        # compute_output.sh converts the model on every run ("nnet3-am-copy --raw=true ... |")
+        self.raw_nnet = os.path.join(assets_dir, 'final.raw')
+        self._run(['nnet3-am-copy', '--raw=true', self.model, self.raw_nnet])
+
+        conf_dir = os.path.join(assets_dir, 'conf')
+        os.makedirs(conf_dir, exist_ok=True)
+        with open(os.path.join(self.extractor_dir, 'splice_opts'), 'rt') as file:
+            splice_opts = file.read().split()
+        with open(os.path.join(conf_dir, 'splice.conf'), 'tw') as file:
+            file.write('\n'.join(splice_opts) + '\n')
+
+        self.ivector_conf = os.path.join(conf_dir, 'ivector_extractor.conf')
+        with open(self.ivector_conf, 'tw') as file:
+            file.write('\n'.join([
+                f'--cmvn-config={os.path.join(self.extractor_dir, "online_cmvn.conf")}',
+                f'--ivector-period={IVECTOR_PERIOD}',
+                f'--splice-config={os.path.join(conf_dir, "splice.conf")}',
+                f'--lda-matrix={os.path.join(self.extractor_dir, "final.mat")}',
+                f'--global-cmvn-stats={os.path.join(self.extractor_dir, "global_cmvn.stats")}',
+                f'--diag-ubm={os.path.join(self.extractor_dir, "final.dubm")}',
+                f'--ivector-extractor={os.path.join(self.extractor_dir, "final.ie")}',
+                *IVECTOR_OPTS,
+            ]) + '\n')
+
+    def _run(self, args: List[str], stdin: Optional[bytes] = None, inputs: Sequence[bytes] = ()) -> bytes:
+        """
+        Run a Kaldi binary and return its stdout. Each extra input is fed through its own
+        pipe and replaces the {0}, {1}... placeholders of the arguments with /dev/fd/<n>.
+        """
+        pipes = [os.pipe() for _ in inputs]
+        read_fds = [read_fd for read_fd, _ in pipes]
+        args = [arg.format(*(f'/dev/fd/{fd}' for fd in read_fds)) for arg in args]
+
+        try:
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=read_fds,
+                cwd=self.gop_home,
+                env=self._env,
+                # Own process group, so a timeout kills anything the binary started
+                start_new_session=True
+            )
+        except Exception:
+            for read_fd, write_fd in pipes:
+                os.close(read_fd)
+                os.close(write_fd)
+            raise
+
+        for read_fd in read_fds:
+            os.close(read_fd)
+        writers = [threading.Thread(target=_write_all, args=(write_fd, data)) for (_, write_fd), data in zip(pipes, inputs)]
+        for writer in writers:
+            writer.start()
+        try:
+            stdout, stderr = process.communicate(stdin, timeout=self._timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise
+        finally:
+            # Writers to a killed reader end with a broken pipe
+            for writer in writers:
+                writer.join()
+
+        if process.returncode != 0:
+            print(f'Error running {args[0]}:', stderr.decode(errors='replace'))
+            raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+        return stdout
+
+    def _to_ints(self, symbols: Dict[str, int], tokens: List[str], kind: str) -> str:
+        missing = [token for token in tokens if token not in symbols]
+        if missing:
+            raise ValueError(f'Unknown {kind}: {" ".join(missing)}')
+        return ' '.join(str(symbols[token]) for token in tokens)
+
+    def score(self, utt_id: str, transcript: str, wav: np.ndarray, text_phone: str) -> str:
+        """
+        GOP ark (text) of one 16 kHz utterance. transcript are the lang dir words and
+        text_phone the reference phones, keyed <utt_id>.<word index>.
+        """
+        # sym2int of the transcript and reference phones (text.int and text-phone.int)
+        text_int = f'{utt_id} {self._to_ints(self._words, transcript.split(), "words")}\n'
+        text_phone_int = ''.join(
+            f'{key} {self._to_ints(self._phones, phones.split(), "phones")}\n'
+            for key, _, phones in (line.partition(' ') for line in text_phone.strip().split('\n'))
+        )
+
+        buffer = io.BytesIO()
+        sf.write(buffer, wav, 16000, format='WAV', subtype='PCM_16')
+        wav_ark = f'{utt_id} '.encode() + buffer.getvalue()
+
+        # The alignment graph only needs the text, build it while the audio goes through the nnet
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            graphs = executor.submit(self._compile_graphs, text_int, text_phone_int)
+            loglikes = self._compute_loglikes(utt_id, wav_ark)
+            fsts = graphs.result()
+
+        with span('kaldi.align_mapped'):
+            ali = self._run(['align-compiled-mapped', *ALIGN_OPTS, self.model, 'ark:{0}', 'ark:{1}', 'ark:-'], inputs=[fsts, loglikes])
+
+        with span('kaldi.ali_to_phones'):
+            ali_phone = self._run(['ali-to-phones', '--per-frame=true', self.model, 'ark:-', 'ark:-'], stdin=ali)
+
+        with span('kaldi.compute_gop'):
+            gop = self._run(
+                ['compute-gop', f'--phone-map={self.phone_map}', '--skip-phones-string=0:1:2', self.model,
+                 'ark:{0}', 'ark:{1}', 'ark:{2}', 'ark,t:-', 'ark:/dev/null'],
+                inputs=[ali, ali_phone, loglikes]
+            )
+        return gop.decode()
+
+    def _compile_graphs(self, text_int: str, text_phone_int: str) -> bytes:
+        with span('kaldi.align_graph'):
+            return self._run(
+                ['compile-train-graphs-without-lexicon', f'--read-disambig-syms={os.path.join(self.lang_dir, "phones/disambig.int")}',
+                 os.path.join(self.model_dir, 'tree'), self.model, 'ark,t:{0}', 'ark,t:{1}', 'ark:-'],
+                inputs=[text_int.encode(), text_phone_int.encode()]
+            )
+
+    def _compute_loglikes(self, utt_id: str, wav_ark: bytes) -> bytes:
+        with span('kaldi.mfcc_cmvn'):
+            feats_ark = self._run(['compute-mfcc-feats', '--config=conf/mfcc_hires.conf', 'ark:-', 'ark:-'], stdin=wav_ark)
+            feats = dict(read_ark(feats_ark))
+            if utt_id not in feats:
+                raise ValueError(f'No features for utterance {utt_id}')
+            nnet_feats_ark = feats_ark
+            if self._cmvn['norm_means'] or self._cmvn['norm_vars']:
+                nnet_feats_ark = write_ark([(utt_id, apply_cmvn(feats[utt_id], **self._cmvn))])
+
+        with span('kaldi.ivector'):
+            # Raw features: the online extractor applies its own CMVN
+            ivectors_ark = self._run(
+                ['ivector-extract-online2', f'--config={self.ivector_conf}', 'ark,t:{0}', 'ark:-', 'ark:-'],
+                stdin=feats_ark, inputs=[f'{utt_id} {utt_id}\n'.encode()]
+            )
+
+        with span('kaldi.compute_output'):
+            return self._run(
+                ['nnet3-compute', '--online-ivectors=ark:{0}', f'--online-ivector-period={IVECTOR_PERIOD}',
+                 *self._subsampling_opts, *NNET_OPTS, self.raw_nnet, 'ark:-', 'ark:-'],
+                stdin=nnet_feats_ark, inputs=[ivectors_ark]
+            )
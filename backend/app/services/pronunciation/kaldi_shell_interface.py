@@ -1,15 +1,59 @@
-import re
 import os
+import tempfile
 import subprocess
-from typing import List, Tuple, Optional
+import numpy as np
+from typing import Dict, List, Optional, Union
+from config import GOP_WORKERS, GOP_WORKER_TIMEOUT_S, GOP_TIMEOUT_PER_AUDIO_S, GOP_IO_MODE, WORKSPACE_DIR
+from services.metrics.tracing import span, record
+from services.pronunciation.gop_worker_pool import GOPWorkerPool
+from services.pronunciation.kaldi_pipeline import KaldiPipeline
+from services.pronunciation.gop_postprocessor import GOPPostProcessor, WordScores
+
+IO_MODES = ('files', 'pipe')
 
 class KaldiShellInterface:
-    def __init__(self) -> None:
+    def __init__(self, workers: int = GOP_WORKERS, tmp_dir: str = WORKSPACE_DIR, io_mode: str = GOP_IO_MODE) -> None:
         self.kaldi_home = os.environ.get('KALDI_HOME', '')
         self.gop_home = os.path.join(self.kaldi_home, 'egs/gop_speechocean762/s5')
         self.data_home = os.path.join(self.gop_home, 'data')
+        self.phones_file = os.path.join(self.data_home, 'lang_nosp/phones-pure.txt')
+        self._postprocessor: Optional[GOPPostProcessor] = None
+
+        # Scratch files of the Kaldi scripts (mktemp) go to the workspace filesystem (tmpfs).
+        # Model assets of the scripts live in this process' workspace dir (<root>/<pid>), which
+        # the WorkspaceManager sweeps once the process is gone
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._env = {**os.environ, 'TMPDIR': tmp_dir, 'GOP_ASSETS_DIR': os.path.join(tmp_dir, str(os.getpid()), 'gop_assets')}
+
+        # Pipe mode scores single utterances in memory, the file-based scripts remain the fallback.
+        # Its model assets are built in this process' workspace dir too, never shared in place
+        if io_mode not in IO_MODES:
+            raise ValueError(f'Unknown GOP_IO_MODE {io_mode!r}, expected one of {", ".join(IO_MODES)}')
+        self._pipeline: Optional[KaldiPipeline] = None
+        if io_mode == 'pipe':
+            try:
+                self._pipeline = KaldiPipeline(self.kaldi_home, os.path.join(tmp_dir, str(os.getpid()), 'gop_pipe_assets'))
+            except Exception as e:
+                print('Kaldi pipe mode unavailable, falling back to data dirs:', str(e))
+
+        # Resident workers keep the Kaldi environment loaded between requests
+        self._pool: Optional[GOPWorkerPool] = None
+        if workers > 0:
+            self._pool = GOPWorkerPool(workers, GOP_WORKER_TIMEOUT_S, env=self._env)
+            try:
+                self._pool.start()
+            except Exception as e:
+                print('GOP workers unavailable, falling back to run.sh per request:', str(e))
+                self._pool = None
     
-    def _run_shell_script(self, script_path: str, args: List[str], cwd: Optional[str] = None) -> str:
+    def _run_shell_script(
+        self, 
+        script_path: str, 
+        args: List[str], 
+        cwd: Optional[str] = None, 
+        env: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> str:
         full_command = ['/bin/bash', script_path] + args
 
         try:
@@ -18,118 +62,114 @@ class KaldiShellInterface:
                 check=True,
                 capture_output=True,
                 cwd=cwd,
-                text=True
+                env=env,
+                text=True,
+                timeout=timeout or GOP_WORKER_TIMEOUT_S
             )
             return result.stdout
         except subprocess.CalledProcessError as e:
             print(f'Error running {script_path}:', e.stderr)
             raise
 
+    def _run_job(
+        self,
+        kind: str,
+        args: List[str],
+        script_path: str,
+        script_args: List[str],
+        cwd: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Run a job on a resident worker (or its one-shot script) and record the stage timings it
+        reports. Jobs are killed after timeout seconds (GOP_WORKER_TIMEOUT_S when None).
+        """
+        fd, timing_file = tempfile.mkstemp(prefix='gop_timing_', dir=self._env['TMPDIR'])
+        os.close(fd)
+        try:
+            with span(f'kaldi.{kind}'):
+                if self._pool is not None:
+                    return self._pool.run(kind, args, timing_file, timeout)
+                env = {**self._env, 'GOP_TIMING_FILE': timing_file}
+                return self._run_shell_script(script_path, script_args, cwd=cwd, env=env, timeout=timeout)
+        finally:
+            self._record_stage_timings(timing_file)
+            os.remove(timing_file)
+
+    def _record_stage_timings(self, timing_file: str) -> None:
+        """Parses the "<stage> <microseconds>" lines written by gop_timer_mark (see gop_lib.sh)"""
+        with open(timing_file, 'rt') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) == 2 and parts[1].isdigit():
+                    record(f'kaldi.{parts[0]}', int(parts[1]) / 1e6)
+
     def generate_reference_phones(self, text_file: str, wav_file: str, input_dir: str) -> str:
-        return self._run_shell_script(
+        return self._run_job(
+            'ref', [text_file, wav_file, input_dir],
             os.path.join(self.gop_home, 'local/text-to-phone.sh'), 
             [text_file, wav_file, input_dir], 
             cwd=self.gop_home
         )
 
     def run_evaluator(self, text_file: str, wav_file: str, text_phone: str, input_dir: str) -> str:
-        return self._run_shell_script(
+        return self._run_job(
+            'gop', [text_file, wav_file, text_phone, input_dir],
             'services/pronunciation/run.sh', 
             [text_file, wav_file, text_phone, input_dir]
         )
 
-    def format_result(self, gop_result_raw: str, ref_phones_raw: str) -> List[List[Tuple[str, float]]]:
-        _, gop_result = self.format_gop_result(gop_result_raw)
-        ref_phones = self.format_phonemes(ref_phones_raw)
-
-        print(gop_result)
-        print(ref_phones)
-
-        return self.align_phonemes_with_scores(gop_result, ref_phones)
-
-    def format_gop_result(self, gop_result: str) -> Tuple[str, List[Tuple[str, float]]]:
-        """Processes GOP (Goodness of Pronunciation) data from Kaldi files and returns results as a list."""
-        
-        phones_file = os.path.join(self.data_home, 'lang_nosp/phones-pure.txt')
-
-        # Load mapping: index -> phoneme
-        phone_map = {}
-        with open(phones_file, 'r') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) == 2:
-                    phone, idx = parts
-                    phone_map[int(idx)] = phone
-
-        # Regex to capture each [index value]
-        pattern = re.compile(r'\[\s*(\d+)\s*([-\d.e]+)\s*\]')
-
-        line = gop_result.strip()
-        utt = line.split()[0]  # UTT1
-        gop_list = []
-        for match in pattern.finditer(line):
-            idx, gop = match.groups()
-            idx = int(idx)
-            gop_list.append((phone_map.get(idx, f'UNK{idx}'), float(gop)))
-        
-        return (utt, gop_list)
-    
-    def format_phonemes(self, data: str) -> List[Tuple[str]]:
-        """
-        Extracts phonemes - each line is a word
-        """
-        words = []
-        
-        lines = data.strip().split('\n')
-        
-        for line in lines:
-            parts = line.split()
-            # Remove the first element (utt1.0, utt1.1, etc)
-            phonemes = parts[1:]
-            words.append(tuple(self.clear_phones(phonemes)))
-        
-        return words
-    
-    def clear_phones(self, phonemes: List[str]) -> List[str]:
+    @property
+    def pipe_mode(self) -> bool:
+        return self._pipeline is not None
+
+    @property
+    def io_mode(self) -> str:
+        """I/O mode single utterances are actually scored with (pipe mode may have fallen back)"""
+        return 'pipe' if self.pipe_mode else 'files'
+
+    def run_evaluator_in_memory(self, utt_id: str, transcript: str, wav: np.ndarray, text_phone: str) -> str:
+        """GOP ark of one 16 kHz utterance, computed through pipes (requires pipe mode)"""
+        if self._pipeline is None:
+            raise RuntimeError('Kaldi pipe mode is not enabled (GOP_IO_MODE=pipe)')
+        with span('kaldi.gop'):
+            return self._pipeline.score(utt_id, transcript, wav, text_phone)
+
+    def run_batch_evaluator(self, input_dir: str, text_phone: str, nj: int, audio_seconds: float = 0.0) -> str:
         """
-        Removes suffixes (_B, _I, _E, _S) and digits from phonemes like 'AH0' → 'AH'
+        Score every utterance of a prepared data dir with nj parallel Kaldi jobs. The run may
+        take GOP_TIMEOUT_PER_AUDIO_S per second of audio (of its nj jobs) on top of the fixed timeout.
         """
-        cleaned = []
-        for phone in phonemes:
-            # Remove suffixes like _B, _I, _E, _S
-            phone = re.sub(r'_[BIES]$', '', phone)
-            # Remove digits (like 0, 1, 2) from the phoneme (e.g., AH0 → AH)
-            phone = re.sub(r'\d', '', phone)
-            cleaned.append(phone)
-        return cleaned
-
-    def align_phonemes_with_scores(
-        self,
-        scored_phones: List[Tuple[str, float]],
-        segmented_words: List[Tuple[str]]
-    ) -> List[List[Tuple[str, float]]]:
+        return self._run_job(
+            'batch', [input_dir, text_phone, str(nj)],
+            'services/pronunciation/run_batch.sh', 
+            ['--nj', str(nj), input_dir, text_phone],
+            timeout=GOP_WORKER_TIMEOUT_S + GOP_TIMEOUT_PER_AUDIO_S * audio_seconds / max(nj, 1)
+        )
+
+    @property
+    def postprocessor(self) -> GOPPostProcessor:
+        """GOP parser over the phone table, loaded on first use"""
+        if self._postprocessor is None:
+            self._postprocessor = GOPPostProcessor(self.phones_file)
+        return self._postprocessor
+
+    def format_result(self, gop_result_raw: str, ref_phones_raw: str) -> WordScores:
+        return self.postprocessor.format_result(gop_result_raw, ref_phones_raw)
+
+    def format_batch_result(self, gop_result_raw: str, ref_phones: Dict[str, str]) -> Dict[str, Union[WordScores, Exception]]:
         """
-        Aligns scored phonemes with their corresponding word segments.
+        Word scores of every utterance of a multi-utterance gop ark (parsed once), or the
+        exception explaining why an utterance has none
         """
-        aligned = []
-        index = 0
-
-        for word in segmented_words:
-            word_alignment = []
-            for phoneme in word:
-                if index >= len(scored_phones):
-                    raise ValueError('Mismatch between scored phonemes and segments.')
-                scored_phoneme, score = scored_phones[index]
-                if scored_phoneme != phoneme:
-                    raise ValueError(
-                        f'Phoneme mismatch at index {index}: expected \'{phoneme}\', got \'{scored_phoneme}\''
-                    )
-                word_alignment.append((scored_phoneme, score))
-                index += 1
-            aligned.append(word_alignment)
-
-        return aligned
-
-
-        
-         
+        parsed = self.postprocessor.parse(gop_result_raw)
+        results: Dict[str, Union[WordScores, Exception]] = {}
+        for utt_id, ref_phones_raw in ref_phones.items():
+            if utt_id not in parsed:
+                results[utt_id] = ValueError(f'No GOP output for utterance {utt_id} (feature extraction or alignment failed)')
+                continue
+            try:
+                results[utt_id] = self.postprocessor.align(*parsed[utt_id], ref_phones_raw)
+            except ValueError as e:
+                results[utt_id] = e
+        return results
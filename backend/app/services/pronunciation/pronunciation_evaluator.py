@@ -1,114 +1,194 @@
+import json
 import numpy as np
-from typing import List, Tuple, Dict, Any, Literal
+from typing import List, Tuple, Dict, Any, Literal, Optional
 from core.enums.lang import Lang
 from core.interfaces.itts_service import ITTSService
-from services.tts.kokoro import KokoroVoice
+from services.tts.voices import KokoroVoice
 from services.tts.cache import TTSCacheService, TTSCacheKey
+from services.metrics.tracing import span
+from utils.audio_ingest import prepare_for_whisper
 from services.pronunciation.pronunciation_service import PronunciationService
+from services.pronunciation.gop_postprocessor import WordScores, score_to_label, PASSED_THRESHOLD, AVERAGE_THRESHOLD
+from services.pronunciation.cache import ReferencePhonesCacheService, EvaluationCacheService, EvaluationCacheKey
 
-def prepare_for_whisper(audio: np.ndarray, sr: int) -> np.ndarray:
-    """
-    Converts any input audio to Whisper-compatible format:
-    - mono
-    - float32 in [-1, 1]
-    - 16 kHz sample rate
-    """
-    # Convert to mono
-    if audio.ndim > 1:
-        print('err/1')
-        audio = np.mean(audio, axis=1)
-    
-    # Convert to float32
-    audio = audio.astype(np.float32)
+# Reference audio is always synthesized with these parameters
+DEFAULT_REF_AUDIO_PARAMS = {
+    'speed': 1.0,
+    'lang': Lang.EN_US,
+    'speaker': KokoroVoice.AMERICAN_FEMALE_HEART,
+    'sample_rate': 24000
+}
+
+# Bump when a change of the pipeline changes the scores of cached evaluations
+EVALUATION_VERSION = 1
 
-    # Normalize to [-1, 1]
-    max_abs = np.max(np.abs(audio))
-    if max_abs > 0:
-        print('err/2')
-        audio = audio / max_abs
+# Pipeline-ready variant of the reference audio: 16 kHz, mono, peak normalized, float32
+REFERENCE_AUDIO_FORMAT = 'pcm-16k-norm'
 
-    # Resample to 16kHz if needed
-    if sr != 16000:
-        print('err/3')
-        import librosa
-        audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
+def reference_cache_key(target_text: str) -> TTSCacheKey:
+    """Cache key of the reference audio (and its derived artifacts) for a target text"""
+    return TTSCacheKey(target_text, provider='kokoro', **DEFAULT_REF_AUDIO_PARAMS)
 
-    return audio.astype(np.float32)
+def load_reference_audio(tts_service: ITTSService, tts_cache: TTSCacheService, tts_cache_key: TTSCacheKey) -> np.ndarray:
+    """
+    Get the 16 kHz reference audio for a key, ready for alignment. The canonical variant
+    is cached next to the synthesized audio, so hits skip the resampling. Only needs the
+    TTS service, so callers can produce it before the evaluator (and Kaldi) is loaded.
+    """
+    def synthesize_reference() -> Tuple[np.ndarray, int]:
+        print('Getting reference audio for text:', tts_cache_key.text)
+        with span('tts'):
+            return tts_service.tts(tts_cache_key.text, **DEFAULT_REF_AUDIO_PARAMS)
+    
+    def canonical_reference() -> Tuple[np.ndarray, int]:
+        ref_audio, sr = tts_cache.get_or_compute(tts_cache_key, synthesize_reference)
+        with span('resample'):
+            return prepare_for_whisper(ref_audio, sr), 16000
+    
+    with span('reference_audio'):
+        ref_audio, _ = tts_cache.get_or_compute(tts_cache_key.with_format(REFERENCE_AUDIO_FORMAT), canonical_reference)
+    return ref_audio
 
 class PronunciationEvaluator:
     """Orchestrates pronunciation evaluation using multiple services"""
     
-    def __init__(self, tts_service: ITTSService) -> None:        
+    def __init__(
+        self, 
+        tts_service: ITTSService, 
+        tts_cache: Optional[TTSCacheService] = None,
+        pronunciation_service: Optional[PronunciationService] = None,
+        evaluation_cache: Optional[EvaluationCacheService] = None,
+        ref_phones_cache: Optional[ReferencePhonesCacheService] = None
+    ) -> None:        
         self._tts_service = tts_service
-        self._tts_cache = TTSCacheService()
+        self._tts_cache = tts_cache or TTSCacheService()
+        self._ref_phones_cache = ref_phones_cache or ReferencePhonesCacheService()
+        self._evaluation_cache = evaluation_cache or EvaluationCacheService()
         
-        self.pronunciation_service = PronunciationService()
+        self.pronunciation_service = pronunciation_service or PronunciationService()
         
-        self._default_ref_audio_params = {
-            'speed': 1.0,
-            'lang': Lang.EN_US,
-            'speaker': KokoroVoice.AMERICAN_FEMALE_HEART,
-            'sample_rate': 24000
-        }
+        self._default_ref_audio_params = dict(DEFAULT_REF_AUDIO_PARAMS)
+        self._scoring_config = self.scoring_config()
     
-    def evaluate(self, usr_audio: np.ndarray, target_text: str) -> Dict[str, Any]: # TODO use dataclass in return
-        """Main method to evaluate pronunciation"""
-                                
+    def scoring_config(self) -> str:
+        """Everything besides the audio and text that a result depends on (part of its cache key)"""
+        return json.dumps({
+            'version': EVALUATION_VERSION,
+            'tts': type(self._tts_service).__name__,
+            'gop': type(self.pronunciation_service.ksi).__name__,
+            'gop_io': self.pronunciation_service.ksi.io_mode,
+            'reference': {name: str(getattr(value, 'value', value)) for name, value in self._default_ref_audio_params.items()},
+            'thresholds': [PASSED_THRESHOLD, AVERAGE_THRESHOLD],
+        }, sort_keys=True)
+    
+    def get_cached_result(self, usr_audio: np.ndarray, target_text: str, sample_rate: int = 16000) -> Optional[Dict[str, Any]]:
+        """Result of an earlier evaluation of the same recording (by the decoded audio's fingerprint)"""
+        return self._evaluation_cache.get(EvaluationCacheKey.from_audio(usr_audio, sample_rate, target_text, self._scoring_config))
+    
+    def evaluate(
+        self,
+        usr_audio: np.ndarray,
+        target_text: str,
+        sample_rate: int = 16000,
+        reference_audio: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]: # TODO use dataclass in return
+        """
+        Main method to evaluate pronunciation. Results are cached (EVAL_CACHE_TTL_S) by the
+        fingerprint of the audio, concurrent resubmissions wait for the first evaluation
+        instead of running their own.
+        
+        reference_audio (see load_reference_audio) is only used when the reference phones of
+        the target text are not cached; without it the reference is synthesized here.
+        """
+        with span('fingerprint'):
+            key = EvaluationCacheKey.from_audio(usr_audio, sample_rate, target_text, self._scoring_config)
+        
+        return self._evaluation_cache.get_or_compute(key, lambda: self._evaluate(usr_audio, target_text, sample_rate, reference_audio))
+    
+    def _evaluate(self, usr_audio: np.ndarray, target_text: str, sample_rate: int, reference_audio: Optional[np.ndarray]) -> Dict[str, Any]:
         # 1. Get reference audio cache key
-        tts_cache_key = TTSCacheKey(target_text, provider='kokoro', **self._default_ref_audio_params)
+        tts_cache_key = reference_cache_key(target_text)
                                 
-        # 2. Get reference audio (with caching)
-        cached_audio = self._tts_cache.get(tts_cache_key)
-        if cached_audio is not None:
-            print('Getting reference audio for text from cache')
-            ref_audio, sr = cached_audio
-        else:
-            print('Getting reference audio for text:', target_text)
-            ref_audio, sr = self._tts_service.tts(target_text, **self._default_ref_audio_params)
-            # Cache the result
-            self._tts_cache.set(tts_cache_key, (ref_audio, sr))
-                    
-        ref_audio = prepare_for_whisper(ref_audio, sr)
-                    
-        scores = self.pronunciation_service.run_pipeline(tts_cache_key.to_cache_key(), target_text, ref_audio, usr_audio)
+        # 2. Get reference phones (skips TTS and the reference alignment on a hit)
+        with span('reference_phones'):
+            ref_phones = self._get_reference_phones(tts_cache_key, reference_audio)
         
-        results: List[List[Tuple[str, float]]] = self.evaluate_pronunciation_per_word(scores)
+        # 3. Score the user audio against the reference phones
+        with span('score'):
+            scores = self.pronunciation_service.run_pipeline(tts_cache_key.to_cache_key(), target_text, ref_phones, usr_audio, sample_rate)
+        
+        results: List[Dict[str, Any]] = self.evaluate_pronunciation_per_word(scores)
         print('Final result:', results)
         return {
             'results': results
         }
-        
-    def evaluate_pronunciation_per_word(
+    
+    def evaluate_batch(
         self,
-        aligned: List[List[Tuple[str, float]]]
+        items: List[Tuple[np.ndarray, str, int]],
+        reference_audio: Optional[Dict[str, np.ndarray]] = None
     ) -> List[Dict[str, Any]]:
+        """
+        Evaluate many (usr_audio, target_text, sample_rate) items with a single multi-job Kaldi run
+        (reference_audio: load_reference_audio of target texts, as for evaluate)
+        """
+        reference_audio = reference_audio or {}
+        
+        # 1. Get reference phones once per distinct target text
+        ref_phones_by_text: Dict[str, str] = {}
+        for _, target_text, _ in items:
+            if target_text not in ref_phones_by_text:
+                ref_phones_by_text[target_text] = self._get_reference_phones(
+                    reference_cache_key(target_text), reference_audio.get(target_text)
+                )
+        
+        # 2. Score all utterances together
+        batch = [
+            (target_text, ref_phones_by_text[target_text], usr_audio, sample_rate) 
+            for usr_audio, target_text, sample_rate in items
+        ]
+        batch_scores = self.pronunciation_service.run_batch_pipeline('batch', batch)
+        
+        # 3. Per-utterance results (failures are reported per utterance), words of all
+        # scored utterances are aggregated together
+        scored = [scores for scores in batch_scores if not isinstance(scores, Exception)]
+        words = iter(self.pronunciation_service.ksi.postprocessor.summarize(scored))
+        return [
+            {'error': str(scores)} if isinstance(scores, Exception) else {'results': next(words)}
+            for scores in batch_scores
+        ]
+    
+    def prepare_reference(self, target_text: str) -> None:
+        """Compute and cache every reference artifact for a target text (cache warm-up)"""
+        self._get_reference_phones(reference_cache_key(target_text))
+    
+    def _get_reference_phones(self, tts_cache_key: TTSCacheKey, ref_audio: Optional[np.ndarray] = None) -> str:
+        """Get the reference phones for a key (cached, computed once for concurrent misses)"""
+        def align_reference() -> str:
+            print('Aligning reference audio for text:', tts_cache_key.text)
+            audio = ref_audio if ref_audio is not None else self._get_reference_audio(tts_cache_key)
+            with span('align_reference'):
+                return self.pronunciation_service.generate_reference_phones(
+                    tts_cache_key.to_cache_key(), tts_cache_key.text, audio
+                )
+        
+        return self._ref_phones_cache.get_or_compute(tts_cache_key, align_reference)
+        
+    def _get_reference_audio(self, tts_cache_key: TTSCacheKey) -> np.ndarray:
+        return load_reference_audio(self._tts_service, self._tts_cache, tts_cache_key)
+        
+    def evaluate_pronunciation_per_word(self, aligned: WordScores) -> List[Dict[str, Any]]:
         """
         For each word (list of phonemes with scores), compute:
         - word text (as string of phonemes)
         - average score
         - label (passed / average / failed)
         """
-        results = []
-        for word in aligned:
-            phonemes = [ph for ph, _ in word]
-            scores = [score for _, score in word]
-            avg_score = sum(scores) / len(scores) if scores else 0.0
-            label = self.score_to_label(avg_score)
-            results.append({
-                'phonemes': phonemes,
-                'score': round(avg_score, 4),
-                'label': label
-            })
-        return results
+        return self.pronunciation_service.ksi.postprocessor.summarize([aligned])[0]
     
     def score_to_label(self, score: float) -> Literal['passed', 'average', 'failed']:
         """
         Maps a score to a qualitative label.
-        You can tweak the thresholds as needed.
+        The thresholds live in gop_postprocessor (PASSED_THRESHOLD, AVERAGE_THRESHOLD).
         """
-        if score >= -0.3:
-            return 'passed'
-        elif score >= -0.7:
-            return 'average'
-        else:
-            return 'failed'
\ No newline at end of file
+        return score_to_label(score)
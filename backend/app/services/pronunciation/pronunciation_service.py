@@ -1,56 +1,160 @@
 import os
+import re
 import numpy as np
 import soundfile as sf
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Union
+from config import GOP_BATCH_NJ
+from services.metrics.tracing import span
+from utils.audio_ingest import to_mono, resample
 from services.pronunciation.kaldi_shell_interface import KaldiShellInterface
-from utils.file_utils import create_tmp_dir, remove_dir, get_next_subdir
+from services.pronunciation.gop_postprocessor import WordScores
+from services.pronunciation.workspace import WorkspaceManager
 
 class PronunciationService:
-    def __init__(self) -> None:
-        self.data_home = '/usr/src/data'
-        os.makedirs(self.data_home, exist_ok=True)
-        
-        self.ksi = KaldiShellInterface()
+    def __init__(self, workspace: Optional[WorkspaceManager] = None, ksi: Optional[KaldiShellInterface] = None) -> None:
+        # Every Kaldi run gets its own scratch dir (tmpfs), removed once its output is parsed
+        self.workspace = workspace or WorkspaceManager()
 
-    def run_pipeline(
-        self, 
-        id: str, 
-        text: str, 
-        ref_wav: np.ndarray, 
-        usr_wav: np.ndarray
-    ) -> List[Tuple[str, float]]:
-        input_dir = os.path.join(self.data_home, id)
-        
-        ref_input_dir = get_next_subdir(input_dir, 'ref_')
-        usr_input_dir = get_next_subdir(input_dir, 'usr_')
-
-        tmp_dir = os.path.join(self.data_home, create_tmp_dir(prefix=f'user_{id}'))
-
-        text_file = os.path.join(tmp_dir, 'text.txt')
-        usr_wav_file = os.path.join(tmp_dir, 'usr_wav.wav')
-        ref_wav_file = os.path.join(tmp_dir, 'ref_wav.wav')
-
-        try:
-            with open(text_file, 'tw') as file:
-                file.write(text)
-
-            sf.write(usr_wav_file, usr_wav, 16000)
-            sf.write(ref_wav_file, ref_wav, 24000)
+        self.ksi = ksi or KaldiShellInterface(tmp_dir=self.workspace.root)
+
+    def generate_reference_phones(self, id: str, text: str, ref_wav: np.ndarray) -> str:
+        """Align the 16 kHz reference audio and return its text-phone content (one word per line)"""
+        with self.workspace.allocate(f'ref_{id[-8:]}_') as workspace:
+            text_file = os.path.join(workspace, 'text.txt')
+            ref_wav_file = os.path.join(workspace, 'ref_wav.wav')
+            ref_input_dir = os.path.join(workspace, 'data')
+
+            with span('write_inputs'):
+                with open(text_file, 'tw') as file:
+                    file.write(text)
+
+                sf.write(ref_wav_file, ref_wav, 16000)
 
             self.ksi.generate_reference_phones(text_file, ref_wav_file, ref_input_dir)
-            ref_phones_file = os.path.join(ref_input_dir, 'text-phone')
-            
+
+            with open(os.path.join(ref_input_dir, 'text-phone'), 'rt') as file:
+                return file.read()
+
+    def run_pipeline(
+        self,
+        id: str,
+        text: str,
+        ref_phones_raw: str,
+        usr_wav: np.ndarray,
+        sample_rate: int = 16000
+    ) -> WordScores:
+        if self.ksi.pipe_mode:
+            return self.run_pipeline_in_memory(text, ref_phones_raw, usr_wav, sample_rate)
+
+        with self.workspace.allocate(f'usr_{id[-8:]}_') as workspace:
+            text_file = os.path.join(workspace, 'text.txt')
+            usr_wav_file = os.path.join(workspace, 'usr_wav.wav')
+            ref_phones_file = os.path.join(workspace, 'text-phone')
+            usr_input_dir = os.path.join(workspace, 'data')
+
+            with span('write_inputs'):
+                with open(text_file, 'tw') as file:
+                    file.write(text)
+
+                with open(ref_phones_file, 'tw') as file:
+                    file.write(ref_phones_raw)
+
+                sf.write(usr_wav_file, self.to_kaldi_rate(usr_wav, sample_rate), 16000)
+
             gop_result_raw = self.ksi.run_evaluator(text_file, usr_wav_file, ref_phones_file, usr_input_dir)
             print('Raw GOP result:', gop_result_raw)
-            
-            with open(ref_phones_file, 'rt') as file:
-                ref_phones_raw = file.read()
+
+            # Parsed inside the workspace block, so a misaligned result keeps its inputs (WORKSPACE_KEEP=failed)
+            with span('format_result'):
                 scores = self.ksi.format_result(gop_result_raw, ref_phones_raw)
 
-            print('Scores:', scores)
-            return scores
-        finally:
-            remove_dir(tmp_dir)
+        print('Scores:', scores)
+        return scores
+
+    def run_pipeline_in_memory(
+        self,
+        text: str,
+        ref_phones_raw: str,
+        usr_wav: np.ndarray,
+        sample_rate: int = 16000
+    ) -> WordScores:
+        """run_pipeline without a workspace: the audio and arks only go through pipes"""
+        gop_result_raw = self.ksi.run_evaluator_in_memory(
+            'utt1',
+            self.normalize_transcript(text),
+            self.to_kaldi_rate(usr_wav, sample_rate),
+            self.rename_reference_phones(ref_phones_raw, 'utt1')
+        )
+        print('Raw GOP result:', gop_result_raw)
+
+        with span('format_result'):
+            scores = self.ksi.format_result(gop_result_raw, ref_phones_raw)
+
+        print('Scores:', scores)
+        return scores
+
+    def run_batch_pipeline(
+        self,
+        id: str,
+        items: List[Tuple[str, str, np.ndarray, int]]
+    ) -> List[Union[WordScores, Exception]]:
+        """
+        Score many (text, ref_phones_raw, usr_wav, sample_rate) utterances with one multi-job Kaldi run.
+        Returns the scores of each utterance, or the exception explaining why it has none.
+        """
+        # Zero padded ids keep Kaldi's sorted order equal to the input order
+        utt_ids = [f'utt{i:05d}' for i in range(len(items))]
+
+        with self.workspace.allocate(f'batch_{id[-8:]}_', items=len(items)) as workspace:
+            input_dir = os.path.join(workspace, 'data')
+            ref_phones_file = os.path.join(workspace, 'text-phone')
+
+            os.makedirs(input_dir)
+            wav_scp, text, utt2spk, ref_phones = [], [], [], {}
+            audio_seconds = 0.0
+            for utt_id, (target_text, ref_phones_raw, usr_wav, sample_rate) in zip(utt_ids, items):
+                usr_wav_file = os.path.join(workspace, f'{utt_id}.wav')
+                kaldi_wav = self.to_kaldi_rate(usr_wav, sample_rate)
+                sf.write(usr_wav_file, kaldi_wav, 16000)
+                audio_seconds += len(kaldi_wav) / 16000
+
+                wav_scp.append(f'{utt_id} {usr_wav_file}')
+                text.append(f'{utt_id} {self.normalize_transcript(target_text)}')
+                # Every utterance is its own speaker, so nj can go up to the batch size
+                utt2spk.append(f'{utt_id} {utt_id}')
+                ref_phones[utt_id] = self.rename_reference_phones(ref_phones_raw, utt_id)
+
+            for name, lines in (('wav.scp', wav_scp), ('text', text), ('utt2spk', utt2spk), ('spk2utt', utt2spk)):
+                with open(os.path.join(input_dir, name), 'tw') as file:
+                    file.write('\n'.join(lines) + '\n')
+
+            with open(ref_phones_file, 'tw') as file:
+                file.write(''.join(ref_phones.values()))
+
+            nj = max(1, min(GOP_BATCH_NJ, len(items)))
+            gop_result_raw = self.ksi.run_batch_evaluator(input_dir, ref_phones_file, nj, audio_seconds)
+            print('Raw GOP batch result:', gop_result_raw)
+
+            # One bad utterance (dropped by Kaldi or misaligned) must not fail the whole batch
+            with span('format_result'):
+                results = self.ksi.format_batch_result(gop_result_raw, ref_phones)
+
+        return [results[utt_id] for utt_id in utt_ids]
+
+    def to_kaldi_rate(self, wav: np.ndarray, sample_rate: int) -> np.ndarray:
+        """Mono 16 kHz audio, the rate of the acoustic model (mfcc_hires.conf)"""
+        with span('resample_user'):
+            return resample(to_mono(wav), sample_rate, 16000)
+
+    def normalize_transcript(self, text: str) -> str:
+        """Upper case words without punctuation, as in the lang dir word list"""
+        return ' '.join(re.sub(r"[^\w\s']", ' ', text).upper().split())
 
-    
-    
+    def rename_reference_phones(self, ref_phones_raw: str, utt_id: str) -> str:
+        """Re-keys text-phone lines (<utt>.<word index> phones...) to another utterance id"""
+        lines = []
+        for line in ref_phones_raw.strip().split('\n'):
+            key, _, phones = line.partition(' ')
+            word_index = key.rsplit('.', 1)[-1]
+            lines.append(f'{utt_id}.{word_index} {phones}\n')
+        return ''.join(lines)
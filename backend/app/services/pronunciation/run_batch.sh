@@ -0,0 +1,17 @@
+#!/bin/bash
+
+# GOP run over a data dir holding many utterances (wav.scp, text, utt2spk, spk2utt)
+. "$(dirname "${BASH_SOURCE[0]}")/gop_lib.sh"
+
+# Number of parallel jobs (at most one per speaker, i.e. per utterance)
+nj=1
+
+# Load the Kaldi environment and validate the model dirs (changes into gop home)
+gop_setup || exit 1;
+. parse_options.sh
+
+# Input arguments
+input_dir=$1
+text_phone=$2
+
+gop_score $input_dir $text_phone
@@ -0,0 +1,162 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Literal, Optional, Tuple
+from config import WORKSPACE_DIR, WORKSPACE_BUDGET_MB, WORKSPACE_KEEP, WORKSPACE_WAIT_S, WEB_CONCURRENCY
+
+KeepPolicy = Literal['never', 'failed', 'always']
+
+class WorkspaceBudgetError(RuntimeError):
+    """No room for another workspace within the budget"""
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _filesystem_size(path: str) -> int:
+    """Size of the filesystem a (possibly not yet created) path is on"""
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    stat = os.statvfs(path)
+    return stat.f_blocks * stat.f_frsize
+
+def default_budget(root: str) -> int:
+    """Half of the workspace filesystem (Docker's /dev/shm is only 64 MB by default), at most 512 MB"""
+    return min(_filesystem_size(root) // 2, 512 * 1024 * 1024)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class WorkspaceManager:
+    """
+    Hands out per-request scratch directories for the Kaldi jobs.
+
+    Directories are created with mkdtemp (unique names, O(1)) under <root>/<pid>, on tmpfs
+    by default, and removed when the request is done. Workspaces kept for debugging count
+    against the budget and the oldest ones are dropped first when it runs out.
+
+    The budget is shared by the server's worker processes (processes), each one gets an
+    equal part. A workspace reserves the estimated size of one utterance per item it holds.
+    """
+
+    # Estimated size of one utterance's files until a workspace has been measured
+    DEFAULT_ESTIMATE = 4 * 1024 * 1024
+
+    def __init__(
+        self,
+        root: str = WORKSPACE_DIR,
+        budget_mb: int = WORKSPACE_BUDGET_MB,
+        keep: KeepPolicy = WORKSPACE_KEEP,
+        wait_s: float = WORKSPACE_WAIT_S,
+        processes: int = WEB_CONCURRENCY
+    ) -> None:
+        self.root = root
+        self.keep = keep
+        budget = budget_mb * 1024 * 1024 if budget_mb > 0 else default_budget(root)
+        self._budget = budget // max(processes, 1)
+        self._wait_s = wait_s
+        self._estimate = self.DEFAULT_ESTIMATE
+        self._live = 0
+        self._reserved = 0
+        self._retained: Deque[Tuple[str, int]] = deque()
+        self._retained_bytes = 0
+        self._condition = threading.Condition()
+        self._pid: Optional[int] = None
+
+    @property
+    def process_root(self) -> str:
+        """Workspaces of this process (a forked worker gets its own)"""
+        if self._pid != os.getpid():
+            with self._condition:
+                if self._pid != os.getpid():
+                    os.makedirs(self.root, exist_ok=True)
+                    self._sweep_stale()
+                    self._pid = os.getpid()
+                    self._live = 0
+                    self._reserved = 0
+                    self._retained.clear()
+                    self._retained_bytes = 0
+        return os.path.join(self.root, str(self._pid))
+
+    @contextmanager
+    def allocate(self, prefix: str, items: int = 1) -> Iterator[str]:
+        """Create a workspace for the duration of the block, for the files of items utterances"""
+        process_root = self.process_root
+        reserved = self._reserve(items)
+        failed = False
+        try:
+            os.makedirs(process_root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=prefix, dir=process_root)
+        except BaseException:
+            self._release(None, reserved, 0, items, False)
+            raise
+
+        try:
+            yield path
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._release(path, reserved, _dir_size(path), items, failed)
+
+    def _reserve(self, items: int) -> int:
+        deadline = time.monotonic() + self._wait_s
+        with self._condition:
+            size = items * self._estimate
+            while self._reserved + size + self._retained_bytes > self._budget:
+                if self._retained:
+                    # Debug copies go first
+                    retained_path, retained_size = self._retained.popleft()
+                    self._retained_bytes -= retained_size
+                    shutil.rmtree(retained_path, ignore_errors=True)
+                    continue
+                # Always admit one workspace, even when it is estimated over the budget
+                remaining = deadline - time.monotonic()
+                if self._live == 0:
+                    break
+                if remaining <= 0:
+                    raise WorkspaceBudgetError(f'Kaldi workspace budget ({self._budget // (1024 * 1024)} MB) exhausted')
+                self._condition.wait(remaining)
+            self._live += 1
+            self._reserved += size
+            return size
+
+    def _release(self, path: Optional[str], reserved: int, size: int, items: int, failed: bool) -> None:
+        keep = path is not None and (self.keep == 'always' or (self.keep == 'failed' and failed))
+        if path is not None and not keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+        with self._condition:
+            self._live -= 1
+            self._reserved -= reserved
+            if size:
+                # Moving average per utterance, so one large batch does not inflate the
+                # reservation of the single utterance workspaces that follow it
+                self._estimate = int(0.9 * self._estimate + 0.1 * size / max(items, 1))
+            if keep:
+                print(f'Kept Kaldi workspace for debugging: {path}')
+                self._retained.append((path, size))
+                self._retained_bytes += size
+            self._condition.notify_all()
+
+    def _sweep_stale(self) -> None:
+        """Remove workspaces left behind by processes that no longer exist (e.g. after a crash)"""
+        for name in os.listdir(self.root):
+            if name.isdigit() and int(name) != os.getpid() and not _pid_alive(int(name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
@@ -0,0 +1,171 @@
+import time
+import asyncio
+import threading
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+from config import (
+    TTS_CONCURRENCY, TTS_QUEUE_SIZE,
+    GOP_CONCURRENCY, GOP_QUEUE_SIZE,
+    ASR_CONCURRENCY, ASR_QUEUE_SIZE,
+    IO_CONCURRENCY, IO_QUEUE_SIZE,
+    SCHEDULER_RETRY_AFTER_S
+)
+from services.metrics.registry import metrics, format_sample
+from services.metrics.tracing import record
+
+T = TypeVar('T')
+
+class SchedulerBusyError(Exception):
+    """Raised when a stage queue is full and the job was not accepted"""
+
+    def __init__(self, stage: str, retry_after: int) -> None:
+        super().__init__(f'Server busy ({stage} queue is full), retry later')
+        self.stage = stage
+        self.retry_after = retry_after
+
+class StageExecutor:
+    """Bounded thread pool for one kind of blocking work (TTS, GOP, I/O)"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, retry_after: int) -> None:
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self._retry_after = retry_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Jobs running or waiting in this stage"""
+        return self._pending
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run fn on the stage threads, rejecting it right away when the queue is full"""
+        self._admit()
+        try:
+            future = self._get_executor().submit(self._bind(functools.partial(fn, *args, **kwargs)))
+        except BaseException:
+            self._release()
+            raise
+
+        # Release on completion, not on await: a cancelled request still occupies a thread
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stream(self, fn: Callable[..., Iterator[T]], *args: Any, **kwargs: Any) -> AsyncIterator[T]:
+        """
+        Iterate the iterator returned by fn on the stage threads
+        
+        Admission happens right away (so a full queue can still be answered with a 503) and
+        the stream keeps its slot until it is exhausted, fails, is closed or is garbage
+        collected (a stream that is never iterated still gives its slot back).
+        """
+        self._admit()
+        return _StageStream(self, self._stream(functools.partial(fn, *args, **kwargs), contextvars.copy_context()))
+
+    async def _stream(self, factory: Callable[[], Iterator[T]], context: contextvars.Context) -> AsyncIterator[T]:
+        executor = self._get_executor()
+        # Steps run one at a time, so they can all share the caller's copied context
+        iterator = await asyncio.wrap_future(executor.submit(context.run, factory))
+        done = object()
+        while True:
+            item = await asyncio.wrap_future(executor.submit(context.run, next, iterator, done))
+            if item is done:
+                break
+            yield item
+
+    def _bind(self, fn: Callable[[], T]) -> Callable[[], T]:
+        """Run fn in a copy of the caller's context (for tracing) and record its queue wait"""
+        context = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def call() -> T:
+            record(f'{self.name}.queue', time.perf_counter() - submitted)
+            return fn()
+
+        return functools.partial(context.run, call)
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.concurrency + self.queue_size:
+                raise SchedulerBusyError(self.name, self._retry_after)
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so that threads are never inherited across a fork
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=self.name)
+        return self._executor
+
+class _StageStream(AsyncIterator[T]):
+    """Async iterator of StageExecutor.stream, owning one admitted slot of its stage"""
+
+    def __init__(self, stage: StageExecutor, iterator: AsyncIterator[T]) -> None:
+        self._stage = stage
+        self._iterator = iterator
+        self._released = False
+
+    def __aiter__(self) -> '_StageStream[T]':
+        return self
+
+    async def __anext__(self) -> T:
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            # Exhausted (StopAsyncIteration), failed or cancelled
+            self._release()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._iterator.aclose()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._stage._release()
+
+    def __del__(self) -> None:
+        self._release()
+
+class StageScheduler:
+    """Routes blocking work to per-stage bounded executors"""
+
+    def __init__(self, stages: Dict[str, StageExecutor]) -> None:
+        self._stages = stages
+
+    def stage(self, name: str) -> StageExecutor:
+        return self._stages[name]
+
+    def collect_metrics(self) -> Iterable[str]:
+        """Stage occupancy, read at scrape time"""
+        lines = ['# HELP scheduler_pending_jobs Jobs running or queued per stage', '# TYPE scheduler_pending_jobs gauge']
+        lines += [format_sample('scheduler_pending_jobs', stage.pending, {'stage': name}) for name, stage in self._stages.items()]
+        lines += ['# HELP scheduler_capacity_jobs Jobs a stage accepts before rejecting', '# TYPE scheduler_capacity_jobs gauge']
+        lines += [format_sample('scheduler_capacity_jobs', stage.concurrency + stage.queue_size, {'stage': name}) for name, stage in self._stages.items()]
+        return lines
+
+    async def run(self, stage: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await self._stages[stage].run(fn, *args, **kwargs)
+
+    def stream(self, stage: str, fn: Callable[..., Iterator[T]], *args: Any, **kwargs: Any) -> AsyncIterator[T]:
+        return self._stages[stage].stream(fn, *args, **kwargs)
+
+scheduler = StageScheduler({
+    'tts': StageExecutor('tts', TTS_CONCURRENCY, TTS_QUEUE_SIZE, SCHEDULER_RETRY_AFTER_S),
+    'gop': StageExecutor('gop', GOP_CONCURRENCY, GOP_QUEUE_SIZE, SCHEDULER_RETRY_AFTER_S),
+    'asr': StageExecutor('asr', ASR_CONCURRENCY, ASR_QUEUE_SIZE, SCHEDULER_RETRY_AFTER_S),
+    'io': StageExecutor('io', IO_CONCURRENCY, IO_QUEUE_SIZE, SCHEDULER_RETRY_AFTER_S),
+})
+metrics.register_collector(scheduler.collect_metrics)
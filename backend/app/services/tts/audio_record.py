@@ -0,0 +1,49 @@
+import struct
+import numpy as np
+from typing import Literal, Tuple, Union
+
+StorageDType = Literal['float32', 'float16', 'int16']
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Fixed header: magic, format version, storage dtype code, reserved, sample rate, number of samples
+_MAGIC = b'TTSA'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sBBHIQ')
+
+_DTYPE_CODES = {'float32': 0, 'float16': 1, 'int16': 2}
+_CODE_DTYPES = {code: np.dtype(name).newbyteorder('<') for name, code in _DTYPE_CODES.items()}
+
+_INT16_SCALE = 32767
+
+def encode_audio_record(audio: np.ndarray, sample_rate: int, storage_dtype: StorageDType = 'float32') -> bytes:
+    """Serializes mono float audio as a small fixed header followed by the raw PCM buffer"""
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+
+    if storage_dtype == 'int16':
+        pcm = (np.clip(audio, -1.0, 1.0) * _INT16_SCALE).astype('<i2')
+    else:
+        pcm = audio.astype(_CODE_DTYPES[_DTYPE_CODES[storage_dtype]], copy=False)
+
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, _DTYPE_CODES[storage_dtype], 0, sample_rate, len(pcm))
+    return header + pcm.tobytes()
+
+def is_audio_record(data: Buffer) -> bool:
+    return len(data) >= _HEADER.size and bytes(data[:len(_MAGIC)]) == _MAGIC
+
+def decode_audio_record(data: Buffer) -> Tuple[np.ndarray, int]:
+    """
+    Reads an audio record as float32 audio and sample rate.
+    float32 records are returned as a read-only view over `data` (no copy), so passing a
+    memory map of the cache file makes the hit path a page-cache read.
+    """
+    magic, version, dtype_code, _, sample_rate, length = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _FORMAT_VERSION:
+        raise ValueError(f'Unsupported audio record (magic={magic!r}, version={version})')
+
+    pcm = np.frombuffer(data, dtype=_CODE_DTYPES[dtype_code], count=length, offset=_HEADER.size)
+
+    if dtype_code == _DTYPE_CODES['int16']:
+        return np.multiply(pcm, 1 / _INT16_SCALE, dtype=np.float32), sample_rate
+    if dtype_code == _DTYPE_CODES['float16']:
+        return pcm.astype(np.float32), sample_rate
+    return pcm, sample_rate
@@ -0,0 +1,169 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from core.enums.lang import Lang
+from core.interfaces.itts_service import ITTSService, TTSRequest
+from services.metrics.registry import metrics
+
+batch_size = metrics.histogram('tts_batch_size', 'Requests per TTS batch', buckets=(1, 2, 4, 8, 16, 32))
+
+@dataclass
+class BatchStats:
+    """Micro-batching statistics"""
+    batches: int
+    requests: int
+    synthesized: int
+    avg_batch_size: float
+    fill_rate: float
+
+@dataclass
+class _PendingRequest:
+    request: TTSRequest
+    future: Future
+
+    def group_key(self) -> Tuple[Any, ...]:
+        """Identical requests are synthesized once and fanned out"""
+        r = self.request
+        return (r.text, str(r.lang), str(r.speaker), r.speed, tuple(sorted(r.kargs.items())))
+
+class BatchingTTSService(ITTSService):
+    """
+    Micro-batching front-end for a TTS service
+
+    Concurrent tts() calls are collected for up to `window_ms` (or until `max_batch_size`
+    requests are waiting) and handed to the wrapped service's tts_batch in one go.
+    """
+
+    def __init__(self, tts_service: ITTSService, window_ms: float = 20.0, max_batch_size: int = 8) -> None:
+        self._tts_service = tts_service
+        self._window_s = window_ms / 1000
+        self._max_batch_size = max_batch_size
+
+        self._queue: queue.Queue[_PendingRequest] = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+        self._batches = 0
+        self._requests = 0
+        self._synthesized = 0
+
+    def tts(
+        self,
+        text: str,
+        lang: Lang = Lang.EN_US,
+        speaker: Optional[str] = None,
+        speed: float = 1,
+        **kargs
+    ) -> Tuple[np.ndarray, int]:
+        """Queue the request for the next batch and wait for its audio"""
+        self._ensure_started()
+
+        pending = _PendingRequest(TTSRequest(text, lang, speaker, speed, kargs), Future())
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def tts_stream(
+        self,
+        text: str,
+        lang: Lang = Lang.EN_US,
+        speaker: Optional[str] = None,
+        speed: float = 1,
+        **kargs
+    ) -> Tuple[Iterator[np.ndarray], int]:
+        """Streams are not batched, the wrapped service produces their chunks directly"""
+        return self._tts_service.tts_stream(text, lang, speaker, speed, **kargs)
+
+    def get_stats(self) -> BatchStats:
+        batches = self._batches
+        return BatchStats(
+            batches=batches,
+            requests=self._requests,
+            synthesized=self._synthesized,
+            avg_batch_size=self._requests / batches if batches else 0.0,
+            fill_rate=self._requests / (batches * self._max_batch_size) if batches else 0.0
+        )
+
+    def _ensure_started(self) -> None:
+        # The batching thread is not inherited across a fork, so start one per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name='tts-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+
+            # Collect more requests until the window closes or the batch is full
+            deadline = time.monotonic() + self._window_s
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: List[_PendingRequest]) -> None:
+        groups: Dict[Tuple[Any, ...], List[_PendingRequest]] = {}
+        for pending in batch:
+            groups.setdefault(pending.group_key(), []).append(pending)
+
+        unique = [members[0].request for members in groups.values()]
+        try:
+            outputs = self._tts_service.tts_batch(unique)
+        except Exception as e:
+            if len(unique) == 1:
+                self._fan_out(next(iter(groups.values())), exception=e)
+            else:
+                # One bad request (unsupported language or voice, text without phonemes) must
+                # not fail the others: synthesize them one by one to find out which failed
+                print(f'[tts-batcher] Batch of {len(unique)} failed ({e}), synthesizing one by one')
+                for members, request in zip(groups.values(), unique):
+                    try:
+                        output = self._tts_service.tts(request.text, request.lang, request.speaker, request.speed, **request.kargs)
+                    except Exception as item_error:
+                        self._fan_out(members, exception=item_error)
+                    else:
+                        self._fan_out(members, output)
+        else:
+            for members, output in zip(groups.values(), outputs):
+                self._fan_out(members, output)
+
+        self._batches += 1
+        self._requests += len(batch)
+        batch_size.observe(len(batch))
+        self._synthesized += len(unique)
+
+        if self._batches % 100 == 0:
+            self._log_batch_stats()
+
+    def _fan_out(
+        self,
+        members: List[_PendingRequest],
+        output: Optional[Tuple[np.ndarray, int]] = None,
+        exception: Optional[Exception] = None
+    ) -> None:
+        for pending in members:
+            if exception is not None:
+                pending.future.set_exception(exception)
+            else:
+                pending.future.set_result(output)
+
+    def _log_batch_stats(self) -> None:
+        stats = self.get_stats()
+        print(
+            f'[tts-batcher] Batches: {stats.batches}, Requests: {stats.requests}, '
+            f'Synthesized: {stats.synthesized}, Fill rate: {stats.fill_rate * 100:.1f}%'
+        )
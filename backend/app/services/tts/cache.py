@@ -1,10 +1,16 @@
-import pickle
+import io
 import numpy as np
-from typing import Tuple, Self
+from typing import BinaryIO, Callable, Optional, Tuple, Self, Union
 from dataclasses import dataclass
+from config import TTS_CACHE_STORAGE_DTYPE, TTS_CACHE_MEMORY_MB
 from services.cache.diskcache_service import DiskCacheService
+from services.tts.audio_record import StorageDType, encode_audio_record, decode_audio_record, is_audio_record
 from core.interfaces.icache_service import CacheKey
 
+def _normalize_str(value) -> str:
+    """Lower-cased string, using the value of enums (str() of a str Enum is 'Class.MEMBER')"""
+    return str(getattr(value, 'value', value)).strip().lower()
+
 @dataclass(frozen=True)
 class TTSCacheKey(CacheKey):
     """Immutable parameters for TTS generation"""
@@ -19,20 +25,43 @@ class TTSCacheKey(CacheKey):
         """Return normalized version for consistent caching"""
         return TTSCacheKey(
             text=str(self.text).strip().lower(),
-            speed=self.speed,
-            lang=str(self.lang).strip().lower(),
-            speaker=str(self.speaker).strip().lower(),
+            speed=float(self.speed),
+            lang=_normalize_str(self.lang),
+            speaker=_normalize_str(self.speaker),
             sample_rate=self.sample_rate,
             provider=str(self.provider).strip()
         )
+    
+    def with_format(self, format: str) -> 'TTSFormatKey':
+        """Key of a derived variant of this audio (e.g. resampled for a pipeline)"""
+        return TTSFormatKey(self, format)
+
+@dataclass(frozen=True)
+class TTSFormatKey:
+    """A TTSCacheKey plus the format tag of a derived variant of its audio"""
+    key: TTSCacheKey
+    format: str
         
-class TTSCacheService(DiskCacheService[TTSCacheKey, Tuple[np.ndarray, int]]):
-    """Specialized cache service for TTS audio"""
+class TTSCacheService(DiskCacheService[Union[TTSCacheKey, TTSFormatKey], Tuple[np.ndarray, int]]):
+    """Specialized cache service for TTS audio (synthesized audio and its derived variants)"""
+    
+    # Hits are served straight from a memory map of the audio record
+    _mmap_values = True
+    
+    # v2: keys normalize enum values and speed (Lang.EN_US == 'en-US', 1 == 1.0)
+    _schema_version = 'tts-v2'
     
-    def __init__(self, directory: str = 'tts_cache', size_limit_gb: int = 10) -> None:
+    def __init__(
+        self, 
+        directory: str = 'tts_cache', 
+        size_limit_gb: int = 10, 
+        storage_dtype: StorageDType = TTS_CACHE_STORAGE_DTYPE,
+        memory_limit_mb: int = TTS_CACHE_MEMORY_MB
+    ) -> None:
         super().__init__(
             namespace='tts',
             directory=directory,
+            memory_limit_bytes=memory_limit_mb * 1024 * 1024,
             size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
             eviction_policy='least-recently-used',
             disk_min_file_size=4096,  # Audio optimization
@@ -40,9 +69,12 @@ class TTSCacheService(DiskCacheService[TTSCacheKey, Tuple[np.ndarray, int]]):
             sqlite_journal_mode='WAL'  # Write-ahead logging
         )
         self._hash_version = 'tts-v1'
+        self._storage_dtype = storage_dtype
     
-    def _serialize_key(self, key: TTSCacheKey) -> str:
-        """Generate deterministic cache key from TTSCacheKey"""
+    def _serialize_key(self, key: Union[TTSCacheKey, TTSFormatKey]) -> str:
+        """Generate deterministic cache key from TTSCacheKey (variants append their format tag)"""
+        if isinstance(key, TTSFormatKey):
+            return f'{key.key.to_cache_key(prefix="tts")}:{key.format}'
         return key.to_cache_key(prefix='tts')
     
     def _serialize_value(self, value: Tuple[np.ndarray, int]) -> bytes:
@@ -52,9 +84,75 @@ class TTSCacheService(DiskCacheService[TTSCacheKey, Tuple[np.ndarray, int]]):
         assert isinstance(audio, np.ndarray), 'audio must be a numpy array'
         assert isinstance(sr, int), 'sample_rate must be an integer'
         
-        return pickle.dumps({'audio': audio, 'sample_rate': sr})
+        return encode_audio_record(audio, sr, self._storage_dtype)
     
     def _deserialize_value(self, data: bytes) -> Tuple[np.ndarray, int]:
         """Deserialize audio data and sample rate"""
-        loaded = pickle.loads(data)
-        return loaded['audio'], loaded['sample_rate']
+        # Entries written before the audio record format are cleared by the schema migration
+        if not is_audio_record(data):
+            raise ValueError('TTS cache entry is not an audio record')
+        return decode_audio_record(data)
+
+class EncodedAudioCacheService(DiskCacheService[TTSFormatKey, bytes]):
+    """
+    Encoded responses (WAV, FLAC, Ogg/Opus) of TTS audio, one per cache key and format.
+    Every entry is its own file (disk_min_file_size=0), so hits are served from the open
+    file by the web server instead of being read into Python.
+    """
+    
+    def __init__(self, directory: str = 'tts_cache', size_limit_gb: int = 2) -> None:
+        super().__init__(
+            namespace='tts_encoded',
+            directory=directory,
+            size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
+            eviction_policy='least-recently-used',
+            disk_min_file_size=0,  # Every value is a file
+            sqlite_journal_mode='WAL'  # Write-ahead logging
+        )
+        self._hash_version = 'tts-encoded-v1'
+    
+    def open(self, key: TTSFormatKey) -> Optional[BinaryIO]:
+        """
+        Open file of the encoded audio, None on a miss (the lookup refreshes its LRU position).
+        The handle stays readable when the entry is culled afterwards; the caller closes it.
+        """
+        handle = self._open(self._serialize_key(key))
+        if handle is None:
+            self._count('_misses')
+            self._on_cache_miss()
+            return None
+        self._count('_l2_hits')
+        self._on_cache_hit()
+        return handle
+    
+    def open_or_compute(self, key: TTSFormatKey, compute: Callable[[], bytes]) -> BinaryIO:
+        """
+        Open file of the encoded audio, encoding it once (per process) when it is missing.
+        Meant to follow an open miss, so it does not count as another lookup. When the new
+        entry is culled before it could be opened, the encoded bytes are served from memory.
+        """
+        cache_key = self._serialize_key(key)
+        handle = self._open(cache_key)
+        if handle is not None:
+            return handle
+        data = self._single_flight.do(cache_key, lambda: self._store(key, compute))
+        return self._open(cache_key) or io.BytesIO(data)
+    
+    def _store(self, key: TTSFormatKey, compute: Callable[[], bytes]) -> bytes:
+        data = compute()
+        self.set(key, data)
+        return data
+    
+    def _open(self, cache_key: str) -> Optional[BinaryIO]:
+        # diskcache hands file values out as open files
+        with self._cache as cache:
+            return cache.get(cache_key, read=True)
+    
+    def _serialize_key(self, key: TTSFormatKey) -> str:
+        return f'{key.key.to_cache_key(prefix="tts")}:{key.format}'
+    
+    def _serialize_value(self, value: bytes) -> bytes:
+        return value
+    
+    def _deserialize_value(self, data: bytes) -> bytes:
+        return data
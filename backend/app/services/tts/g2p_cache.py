@@ -0,0 +1,45 @@
+import json
+from typing import Tuple
+from dataclasses import dataclass
+from services.cache.diskcache_service import DiskCacheService
+from core.interfaces.icache_service import CacheKey
+
+def normalize_text(text: str) -> str:
+    """
+    Text as the G2P front-end sees it: runs of spaces collapsed, blank lines dropped.
+    Case and punctuation are kept, they change the phonemes (stress, acronyms, pauses).
+    """
+    return '\n'.join(' '.join(line.split()) for line in text.strip().splitlines() if line.strip())
+
+@dataclass(frozen=True)
+class G2PCacheKey(CacheKey):
+    """Normalized text of one language, phonemized by one front-end version"""
+    lang: str
+    text: str
+    frontend: str
+
+class G2PCacheService(DiskCacheService[G2PCacheKey, Tuple[str, ...]]):
+    """
+    Phoneme sequences (one per synthesis chunk) of already phonemized texts.
+    Shared by every voice and speed, and by the workers of a node through the disk.
+    """
+
+    def __init__(self, directory: str = 'tts_cache', size_limit_gb: int = 1, memory_limit_mb: int = 0) -> None:
+        super().__init__(
+            namespace='g2p',
+            directory=directory,
+            memory_limit_bytes=memory_limit_mb * 1024 * 1024,
+            size_limit=size_limit_gb * 1024 * 1024 * 1024,  # GB to bytes
+            eviction_policy='least-recently-used',
+            sqlite_journal_mode='WAL'  # Write-ahead logging
+        )
+        self._hash_version = 'g2p-v1'
+
+    def _serialize_key(self, key: G2PCacheKey) -> str:
+        return key.to_cache_key(prefix='g2p')
+
+    def _serialize_value(self, value: Tuple[str, ...]) -> bytes:
+        return json.dumps(list(value), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _deserialize_value(self, data: bytes) -> Tuple[str, ...]:
+        return tuple(json.loads(data))
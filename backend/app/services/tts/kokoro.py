@@ -1,32 +1,17 @@
+import torch
+import kokoro
+import threading
 import numpy as np
-from typing import Tuple, Dict
-from kokoro import KPipeline
 from enum import Enum
+from functools import lru_cache
+from typing import Tuple, Dict, Iterable, Iterator, List, Optional, Union
+from kokoro import KModel, KPipeline
+from huggingface_hub import hf_hub_download
+from config import G2P_CACHE_SIZE
 from core.enums.lang import Lang
-from core.interfaces.itts_service import ITTSService
-
-class KokoroVoice(str, Enum):
-    """Available voices in Kokoro TTS"""
-    
-    # Portuguese Voices
-    PORTUGUESE_FEMALE_DORA = 'pf_dora'
-    PORTUGUESE_MALE_ALEX = 'pm_alex'
-    PORTUGUESE_MALE_SANTA = 'pm_santa'
-    
-    # American English Voices
-    AMERICAN_FEMALE_HEART = 'af_heart'
-    AMERICAN_FEMALE_BELLA = 'af_bella'
-    AMERICAN_FEMALE_NICOLE = 'af_nicole'
-    AMERICAN_MALE_MICHAEL = 'am_michael'
-    
-    # British English Voices
-    BRITISH_FEMALE_EMMA = 'bf_emma'
-    BRITISH_MALE_GEORGE = 'bm_george'
-
-class KokoroLang(str, Enum):
-    """Kokoro-specific language codes"""
-    ENGLISH = 'a'
-    PORTUGUESE = 'p'
+from core.interfaces.itts_service import ITTSService, TTSRequest
+from services.tts.voices import KokoroVoice, KokoroLang
+from services.tts.g2p_cache import G2PCacheService, G2PCacheKey, normalize_text
 
 class KokoroTTSService(ITTSService):
     """
@@ -52,21 +37,75 @@ class KokoroTTSService(ITTSService):
         Lang.PT_PT: KokoroLang.PORTUGUESE,
     }
     
-    def __init__(self, device: str = 'cuda') -> None:
+    REPO_ID = 'hexgrad/Kokoro-82M'
+    
+    def __init__(self, device: str = 'cuda', g2p_cache: Optional[G2PCacheService] = None) -> None:
         """Initialize Kokoro TTS service
         
+        Loads the acoustic model once: the per-language pipelines are G2P front-ends only
+        and every synthesis runs on this shared model.
+        
         Args:
             device: Device to run model on ('cuda' or 'cpu')
+            g2p_cache: Disk cache of phonemized texts behind the in-memory LRU (optional)
         """
         self.device = device
+        self.model = KModel(repo_id=self.REPO_ID).to(device).eval()
         self.cache: Dict[str, KPipeline] = {}
+        # Voice packs (style embeddings) by name, resident on the model device
+        self.voices: Dict[str, torch.FloatTensor] = {}
+        self._lock = threading.Lock()
+        
+        # G2P does not depend on the voice or speed: every variant of a text reuses its phonemes
+        self.g2p_cache = g2p_cache
+        self._frontend = f'kokoro-{getattr(kokoro, "__version__", "")}'
+        self._phonemes = lru_cache(maxsize=G2P_CACHE_SIZE)(self._phonemize)
         
     def load_model(self, lang: str) -> KPipeline: 
-        """Load or get cached Kokoro pipeline for specific language"""
+        """Load or get cached Kokoro G2P pipeline for specific language"""
+        lang = lang.value if isinstance(lang, Enum) else lang
         if lang not in self.cache:
-            model = KPipeline(lang_code=lang, device=self.device)
-            self.cache[lang] = model
+            with self._lock:
+                if lang not in self.cache:
+                    self.cache[lang] = KPipeline(lang_code=lang, repo_id=self.REPO_ID, model=False)
         return self.cache[lang]
+    
+    def load_voice(self, voice: Union[str, KokoroVoice]) -> torch.FloatTensor:
+        """Load or get a resident voice pack"""
+        voice = voice.value if isinstance(voice, Enum) else voice
+        pack = self.voices.get(voice)
+        if pack is None:
+            # Packs are style embeddings of the shared model, read the way KPipeline reads
+            # them but without building the G2P pipeline of their language
+            path = hf_hub_download(repo_id=self.REPO_ID, filename=f'voices/{voice}.pt')
+            pack = torch.load(path, weights_only=True).to(self.device)
+            self.voices[voice] = pack
+        return pack
+    
+    def load_voices(self, voices: Iterable[Union[str, KokoroVoice]]) -> None:
+        """Preload voice packs so that no request waits for one"""
+        for voice in voices:
+            self.load_voice(voice)
+    
+    def _voice(self, speaker: Union[str, KokoroVoice]) -> torch.FloatTensor:
+        speaker = speaker.value if isinstance(speaker, Enum) else speaker
+        if ',' in speaker:
+            # Voice blends ('af_heart,af_bella') average resident packs, the blend is not kept
+            return torch.mean(torch.stack([self.load_voice(voice) for voice in speaker.split(',')]), dim=0)
+        return self.load_voice(speaker)
+    
+    def phonemize(self, text: str, lang: KokoroLang) -> Tuple[str, ...]:
+        """Phonemes of every synthesis chunk of text (Kokoro splits long texts)"""
+        return self._phonemes(normalize_text(text), lang.value if isinstance(lang, Enum) else lang)
+    
+    def _phonemize(self, text: str, lang: str) -> Tuple[str, ...]:
+        if self.g2p_cache is None:
+            return self._g2p(text, lang)
+        return self.g2p_cache.get_or_compute(G2PCacheKey(lang, text, self._frontend), lambda: self._g2p(text, lang))
+    
+    def _g2p(self, text: str, lang: str) -> Tuple[str, ...]:
+        # Without a model the pipeline only runs G2P and chunking
+        return tuple(result.phonemes for result in self.load_model(lang)(text) if result.phonemes)
 
     def tts(
         self, 
@@ -94,18 +133,70 @@ class KokoroTTSService(ITTSService):
             ValueError: If language is not supported
         """
         
-        # Convert BCP47 to Kokoro language code
-        kokoro_lang = self.BCP47_TO_KOKORO.get(lang)
-        if kokoro_lang is None:
-            raise ValueError(f'Kokoro does not support language: {lang}')
+        return self._synthesize(text, self.to_kokoro_lang(lang), speaker, speed), sample_rate
+    
+    def tts_stream(
+        self, 
+        text: str, 
+        lang: Lang = Lang.EN_US,
+        speaker: str = KokoroVoice.AMERICAN_FEMALE_HEART,
+        speed: float = 1.0,
+        *,
+        sample_rate: int = 24000,
+    ) -> Tuple[Iterator[np.ndarray], int]:
+        """
+        Convert text to speech, yielding each audio chunk as soon as Kokoro produces it
+        
+        Returns:
+            Tuple of (audio_chunk_iterator, sample_rate)
+        """
+        # Kokoro splits the text and synthesizes it chunk by chunk
+        return self._synthesize_chunks(text, self.to_kokoro_lang(lang), speaker, speed), sample_rate
+    
+    def tts_batch(self, requests: List[TTSRequest]) -> List[Tuple[np.ndarray, int]]:
+        """
+        Synthesize several requests back to back in one inference context
+        
+        The Kokoro model runs one utterance per forward pass (durations are predicted
+        for a single sequence), so requests are grouped by language pipeline instead of
+        being padded into one tensor.
+        """
+        results: List[Tuple[np.ndarray, int]] = [None] * len(requests)
         
-        # Load pipeline for language
-        pipeline = self.load_model(kokoro_lang)
+        by_lang: Dict[KokoroLang, List[int]] = {}
+        for i, request in enumerate(requests):
+            by_lang.setdefault(self.to_kokoro_lang(request.lang), []).append(i)
         
-        # Generate audio
-        generator = pipeline(text, voice=speaker, speed=speed)
+        with torch.inference_mode():
+            for kokoro_lang, indices in by_lang.items():
+                for i in indices:
+                    request = requests[i]
+                    speaker = request.speaker or KokoroVoice.AMERICAN_FEMALE_HEART
+                    audio = self._synthesize(request.text, kokoro_lang, speaker, request.speed)
+                    results[i] = (audio, request.kargs.get('sample_rate', 24000))
         
+        return results
+    
+    def to_kokoro_lang(self, lang: Lang) -> KokoroLang:
+        """
+        Convert BCP47 to Kokoro language code
+        
+        Raises:
+            ValueError: If language is not supported
+        """
+        kokoro_lang = self.BCP47_TO_KOKORO.get(lang)
+        if kokoro_lang is None:
+            raise ValueError(f'Kokoro does not support language: {lang}')
+        return kokoro_lang
+    
+    def _synthesize_chunks(self, text: str, lang: KokoroLang, speaker: str, speed: float) -> Iterator[np.ndarray]:
+        # Cached phonemes go straight into the model, the front-end only runs on a G2P miss
+        pack = self._voice(speaker)
+        for phonemes in self.phonemize(text, lang):
+            output = KPipeline.infer(self.model, phonemes, pack, speed)
+            yield np.asarray(output.audio, dtype=np.float32)
+    
+    def _synthesize(self, text: str, lang: KokoroLang, speaker: str, speed: float) -> np.ndarray:
         # Concatenate all audio chunks
-        full_audio = np.concatenate([audio for _, _, audio in generator])
-        return full_audio, sample_rate
+        return np.concatenate(list(self._synthesize_chunks(text, lang, speaker, speed)))
     
\ No newline at end of file
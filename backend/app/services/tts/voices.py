@@ -0,0 +1,24 @@
+from enum import Enum
+
+class KokoroVoice(str, Enum):
+    """Available voices in Kokoro TTS"""
+    
+    # Portuguese Voices
+    PORTUGUESE_FEMALE_DORA = 'pf_dora'
+    PORTUGUESE_MALE_ALEX = 'pm_alex'
+    PORTUGUESE_MALE_SANTA = 'pm_santa'
+    
+    # American English Voices
+    AMERICAN_FEMALE_HEART = 'af_heart'
+    AMERICAN_FEMALE_BELLA = 'af_bella'
+    AMERICAN_FEMALE_NICOLE = 'af_nicole'
+    AMERICAN_MALE_MICHAEL = 'am_michael'
+    
+    # British English Voices
+    BRITISH_FEMALE_EMMA = 'bf_emma'
+    BRITISH_MALE_GEORGE = 'bm_george'
+
+class KokoroLang(str, Enum):
+    """Kokoro-specific language codes"""
+    ENGLISH = 'a'
+    PORTUGUESE = 'p'
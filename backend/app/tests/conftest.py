@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Tests import the app modules the way main does (from the app directory)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# No model weights or Kaldi install needed (see bench/fakes.py)
+os.environ.setdefault('TTS_BACKEND', 'fake')
+os.environ.setdefault('GOP_BACKEND', 'fake')
+os.environ.setdefault('ASR_BACKEND', 'fake')
+os.environ.setdefault('PRELOAD_MODELS', 'false')
+
+# Caches and Kaldi workspaces are created relative to the working directory
+WORK_DIR = tempfile.mkdtemp(prefix='app_tests_')
+os.environ.setdefault('WORKSPACE_DIR', os.path.join(WORK_DIR, 'workspaces'))
+os.chdir(WORK_DIR)
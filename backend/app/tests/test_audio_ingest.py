@@ -0,0 +1,50 @@
+import numpy as np
+from fastapi import FastAPI, UploadFile, File
+from fastapi.testclient import TestClient
+from api.middleware import UploadLimitMiddleware
+from utils.audio_ingest import prepare_for_whisper
+
+def limited_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=1024, batch_max_bytes=4096)
+
+    @app.post('/upload')
+    async def upload(audio: UploadFile = File(...)):
+        return {'size': len(await audio.read())}
+
+    @app.post('/upload/batch')
+    async def upload_batch(audio: UploadFile = File(...)):
+        return {'size': len(await audio.read())}
+
+    return app
+
+def test_upload_over_content_length_limit_is_rejected():
+    client = TestClient(limited_app())
+    body = b'x' * (UploadLimitMiddleware.FORM_OVERHEAD + 2048)
+
+    assert client.post('/upload', files={'audio': ('a.wav', body)}).status_code == 413
+    assert client.post('/upload/batch', files={'audio': ('a.wav', body)}).status_code == 200
+    assert client.post('/upload', files={'audio': ('a.wav', b'x' * 512)}).json() == {'size': 512}
+
+def test_upload_without_content_length_is_cut_at_the_limit():
+    client = TestClient(limited_app())
+    head = b'--b\r\nContent-Disposition: form-data; name="audio"; filename="a.wav"\r\n\r\n'
+
+    def chunked_body():
+        # A generator body is sent with chunked transfer encoding (no Content-Length)
+        yield head
+        for _ in range(8):
+            yield b'x' * 16 * 1024
+        yield b'\r\n--b--\r\n'
+
+    response = client.post('/upload', content=chunked_body(), headers={'Content-Type': 'multipart/form-data; boundary=b'})
+    assert response.status_code == 413
+
+def test_prepare_for_whisper_leaves_its_input_untouched():
+    audio = np.linspace(-0.25, 0.25, 16000, dtype=np.float32)
+    original = audio.copy()
+
+    prepared = prepare_for_whisper(audio, 16000)
+
+    assert np.array_equal(audio, original)
+    assert np.isclose(np.abs(prepared).max(), 1.0)
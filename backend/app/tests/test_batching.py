@@ -0,0 +1,77 @@
+import threading
+import numpy as np
+import pytest
+from typing import Iterator, List, Tuple
+from core.enums.lang import Lang
+from core.interfaces.itts_service import ITTSService, TTSRequest
+from services.tts.batching import BatchingTTSService
+
+class RecordingTTSService(ITTSService):
+    """Audio of one sample holding the text length, fails on texts starting with 'bad'"""
+
+    def __init__(self) -> None:
+        self.batches: List[List[TTSRequest]] = []
+
+    def tts(self, text: str, lang: Lang = Lang.EN_US, speaker=None, speed: float = 1, **kargs) -> Tuple[np.ndarray, int]:
+        if text.startswith('bad'):
+            raise ValueError(f'Cannot synthesize {text}')
+        return np.array([len(text)], dtype=np.float32), 24000
+
+    def tts_stream(self, text: str, lang: Lang = Lang.EN_US, speaker=None, speed: float = 1, **kargs) -> Tuple[Iterator[np.ndarray], int]:
+        return iter([np.zeros(2, dtype=np.float32), np.ones(2, dtype=np.float32)]), 24000
+
+    def tts_batch(self, requests: List[TTSRequest]) -> List[Tuple[np.ndarray, int]]:
+        self.batches.append(requests)
+        return super().tts_batch(requests)
+
+def run_concurrently(service: BatchingTTSService, texts: List[str]) -> List[object]:
+    """tts() of every text from its own thread, all queued before the batch window closes"""
+    results: List[object] = [None] * len(texts)
+    barrier = threading.Barrier(len(texts))
+
+    def call(i: int) -> None:
+        barrier.wait()
+        try:
+            results[i] = service.tts(texts[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_identical_requests_are_synthesized_once():
+    backend = RecordingTTSService()
+    service = BatchingTTSService(backend, window_ms=200, max_batch_size=8)
+
+    results = run_concurrently(service, ['hello', 'hello', 'good morning', 'hello'])
+
+    assert len(backend.batches) == 1
+    assert sorted(request.text for request in backend.batches[0]) == ['good morning', 'hello']
+    assert [int(audio[0]) for audio, _ in results] == [5, 5, 12, 5]
+    assert service.get_stats().synthesized == 2
+
+def test_failed_request_does_not_fail_its_batch():
+    backend = RecordingTTSService()
+    service = BatchingTTSService(backend, window_ms=200, max_batch_size=8)
+
+    results = run_concurrently(service, ['hello', 'bad voice', 'good morning', 'bad voice'])
+
+    assert len(backend.batches) == 1
+    assert int(results[0][0][0]) == 5
+    assert int(results[2][0][0]) == 12
+    assert isinstance(results[1], ValueError) and isinstance(results[3], ValueError)
+
+def test_single_failure_is_raised():
+    service = BatchingTTSService(RecordingTTSService(), window_ms=1)
+    with pytest.raises(ValueError):
+        service.tts('bad text')
+
+def test_stream_is_delegated():
+    service = BatchingTTSService(RecordingTTSService(), window_ms=1)
+    chunks, sr = service.tts_stream('hello')
+    assert sr == 24000
+    assert len(list(chunks)) == 2
@@ -0,0 +1,43 @@
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+from api.endpoints.speech import file_response
+from services.tts.cache import EncodedAudioCacheService, TTSCacheKey
+
+def synthesize(client: TestClient, text: str):
+    return client.post('/api/speech/kokoro/synthesize', data={'text': text}, headers={'Accept': 'audio/wav'})
+
+def test_open_file_survives_culling(tmp_path):
+    cache = EncodedAudioCacheService(directory=str(tmp_path))
+    key = TTSCacheKey('culled', 1, 'en-US', 'af_heart', 24000, 'kokoro').with_format('WAV')
+    cache.set(key, b'encoded')
+
+    handle = cache.open(key)
+    # Culled (its file deleted) while the response is still being sent
+    cache._cache.clear()
+
+    response = file_response(handle, 'audio/wav', {})
+    assert isinstance(response, FileResponse)
+    with open(response.path, 'rb') as file:
+        assert file.read() == b'encoded'
+    handle.close()
+    assert cache.open(key) is None
+
+def test_culled_entry_is_served_from_memory(tmp_path, monkeypatch):
+    cache = EncodedAudioCacheService(directory=str(tmp_path))
+    key = TTSCacheKey('evicted', 1, 'en-US', 'af_heart', 24000, 'kokoro').with_format('WAV')
+    # The entry is culled right after it is stored
+    monkeypatch.setattr(cache, 'set', lambda key, value: None)
+
+    with cache.open_or_compute(key, lambda: b'encoded') as handle:
+        assert handle.read() == b'encoded'
+
+def test_repeat_synthesis_is_served_from_the_encoded_file():
+    import main
+
+    client = TestClient(main.app)
+    first = synthesize(client, 'encoded audio test')
+    second = synthesize(client, 'encoded audio test')
+
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content
+    assert second.headers['content-length'] == str(len(first.content))
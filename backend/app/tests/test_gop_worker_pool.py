@@ -0,0 +1,36 @@
+from services.pronunciation import gop_worker_pool
+from services.pronunciation.gop_worker_pool import GOPWorkerPool
+
+# Answers every job with its kind, like gop_worker.sh without Kaldi
+WORKER_SCRIPT = '''
+echo "__GOP_READY__ 0"
+while IFS=$'\\t' read -r kind timing args; do
+    echo "$kind"
+    echo "__GOP_DONE__ 0"
+done
+'''
+
+def test_slot_lost_to_a_failed_respawn_is_recovered(tmp_path, monkeypatch):
+    script = tmp_path / 'worker.sh'
+    script.write_text(WORKER_SCRIPT)
+    pool = GOPWorkerPool(size=1, timeout=5.0, script_path=str(script))
+    pool.start()
+
+    # The worker crashes and cannot be replaced right away
+    worker = pool._idle.get_nowait()
+    worker._process.kill()
+    worker._process.wait()
+    spawn = gop_worker_pool.GOPWorker
+
+    def fail(*args, **kwargs):
+        raise OSError('fork failed')
+
+    monkeypatch.setattr(gop_worker_pool, 'GOPWorker', fail)
+    pool._release(worker)
+    assert pool._live == 0
+
+    # The next job spawns the missing worker instead of waiting for an idle one
+    monkeypatch.setattr(gop_worker_pool, 'GOPWorker', spawn)
+    assert pool.run('align', ['x']).strip() == 'align'
+    assert pool._live == 1
+    pool.close()
@@ -0,0 +1,42 @@
+import io
+import numpy as np
+import soundfile as sf
+from fastapi.testclient import TestClient
+
+TARGET_TEXT = 'idempotency test sentence'
+
+def recording(frequency: float) -> bytes:
+    upload = io.BytesIO()
+    tone = 0.1 * np.sin(2 * np.pi * frequency * np.arange(16000) / 16000)
+    sf.write(upload, tone.astype(np.float32), 16000, format='WAV')
+    return upload.getvalue()
+
+def evaluate(client: TestClient, audio: bytes, key: str):
+    return client.post(
+        '/api/speech/evaluate-pronunciation',
+        files={'audio': ('a.wav', audio)},
+        data={'target_text': TARGET_TEXT},
+        headers={'Idempotency-Key': key}
+    )
+
+def test_idempotency_key_is_bound_to_its_recording():
+    import main
+
+    client = TestClient(main.app)
+    first, second = recording(220.0), recording(330.0)
+
+    response = evaluate(client, first, 'key-1')
+    assert response.status_code == 200
+    assert evaluate(client, first, 'key-1').json() == response.json()
+    assert evaluate(client, second, 'key-1').status_code == 422
+
+def test_idempotency_key_is_stored_on_a_fingerprint_hit():
+    import main
+
+    client = TestClient(main.app)
+    first, second = recording(440.0), recording(550.0)
+
+    assert evaluate(client, first, 'key-2').status_code == 200
+    # Same recording under a new key: answered from the fingerprint cache, the key is still recorded
+    assert evaluate(client, first, 'key-3').status_code == 200
+    assert evaluate(client, second, 'key-3').status_code == 422
@@ -0,0 +1,40 @@
+from services.models.registry import ModelRegistry
+
+def flaky(failures: int):
+    """Factory failing its first calls"""
+    calls = []
+
+    def factory() -> str:
+        calls.append(None)
+        if len(calls) <= failures:
+            raise RuntimeError('not yet')
+        return 'model'
+
+    return factory
+
+def test_optional_models_do_not_gate_readiness():
+    models = ModelRegistry()
+    models.register('tts', lambda: 'tts')
+    models.register('asr', flaky(failures=100), required=False)
+
+    models.preload()
+
+    assert models.ready
+    assert models.status()['asr']['state'] == 'failed'
+
+def test_failed_preloads_are_retried():
+    models = ModelRegistry(retry_s=0.01, retry_max_s=0.02)
+    models.register('gop', flaky(failures=2))
+
+    models.preload_in_background().join(timeout=5)
+
+    assert models.ready
+    assert models.get_if_ready('gop') == 'model'
+
+def test_get_if_ready_never_builds_the_model():
+    models = ModelRegistry()
+    models.register('evaluator', lambda: 'evaluator')
+
+    assert models.get_if_ready('evaluator') is None
+    assert models.get('evaluator') == 'evaluator'
+    assert models.get_if_ready('evaluator') == 'evaluator'
@@ -0,0 +1,89 @@
+import gc
+import time
+import asyncio
+import threading
+import pytest
+from typing import Iterator
+from fastapi.testclient import TestClient
+from services.scheduling.stage_scheduler import StageExecutor, SchedulerBusyError, scheduler
+
+def numbers(count: int) -> Iterator[int]:
+    yield from range(count)
+
+def test_full_stage_rejects_jobs():
+    stage = StageExecutor('test', concurrency=1, queue_size=1, retry_after=3)
+    release = threading.Event()
+
+    async def main() -> None:
+        running = [asyncio.ensure_future(stage.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert stage.pending == 2
+        with pytest.raises(SchedulerBusyError) as busy:
+            await stage.run(time.sleep, 0)
+        assert busy.value.retry_after == 3
+
+        release.set()
+        await asyncio.gather(*running)
+        assert stage.pending == 0
+
+    asyncio.run(main())
+
+def test_busy_stage_answers_503_with_retry_after(monkeypatch):
+    import main
+
+    monkeypatch.setitem(scheduler._stages, 'tts', StageExecutor('tts', concurrency=0, queue_size=0, retry_after=7))
+    response = TestClient(main.app).post('/api/speech/kokoro/synthesize', data={'text': 'scheduler busy test'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+def test_stream_releases_its_slot():
+    stage = StageExecutor('test', concurrency=1, queue_size=0, retry_after=1)
+
+    async def main() -> None:
+        # Exhausted
+        assert [item async for item in stage.stream(numbers, 3)] == [0, 1, 2]
+        assert stage.pending == 0
+
+        # Closed before it was iterated (e.g. the client left after the WAV header)
+        stream = stage.stream(numbers, 3)
+        with pytest.raises(SchedulerBusyError):
+            stage.stream(numbers, 3)
+        await stream.aclose()
+        assert stage.pending == 0
+
+        # Closed mid-stream
+        stream = stage.stream(numbers, 3)
+        assert await stream.__anext__() == 0
+        await stream.aclose()
+        assert stage.pending == 0
+
+        # Never iterated nor closed
+        stage.stream(numbers, 3)
+        gc.collect()
+        assert stage.pending == 0
+
+    asyncio.run(main())
+
+def test_cancelled_stream_releases_its_slot():
+    stage = StageExecutor('test', concurrency=1, queue_size=0, retry_after=1)
+    started = threading.Event()
+
+    def slow() -> Iterator[int]:
+        started.set()
+        time.sleep(0.2)
+        yield 1
+
+    async def consume() -> None:
+        async for _ in stage.stream(slow):
+            pass
+
+    async def main() -> None:
+        task = asyncio.ensure_future(consume())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert stage.pending == 0
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import io
+import os
+import numpy as np
+import soundfile as sf
+from fastapi.testclient import TestClient
+from services.pronunciation.workspace import WorkspaceManager, WorkspaceBudgetError
+
+MB = 1024 * 1024
+
+def write_file(directory: str, size: int) -> None:
+    with open(os.path.join(directory, 'data'), 'wb') as file:
+        file.write(b'\0' * size)
+
+def test_budget_is_split_over_the_worker_processes(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path), budget_mb=64, processes=4)
+    assert workspace._budget == 16 * MB
+
+def test_large_batch_does_not_serialize_later_workspaces(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path), budget_mb=16, wait_s=0.0)
+
+    # 20 utterances of 1 MB: the estimate per utterance stays about the same
+    with workspace.allocate('batch_', items=20) as path:
+        write_file(path, 20 * MB)
+    assert workspace._estimate < 2 * WorkspaceManager.DEFAULT_ESTIMATE
+
+    # Several single utterance workspaces still fit the budget side by side
+    with workspace.allocate('usr_') as first, workspace.allocate('usr_') as second:
+        assert first != second
+
+def test_exhausted_budget_raises_after_waiting(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path), budget_mb=4, wait_s=0.05)
+
+    with workspace.allocate('usr_'):
+        try:
+            with workspace.allocate('usr_'):
+                raise AssertionError('second workspace admitted over the budget')
+        except WorkspaceBudgetError:
+            pass
+    assert workspace._reserved == 0
+
+def test_exhausted_budget_answers_503_with_retry_after(monkeypatch):
+    import main
+
+    def exhausted(self, items: int) -> int:
+        raise WorkspaceBudgetError('Kaldi workspace budget (0 MB) exhausted')
+
+    monkeypatch.setattr(WorkspaceManager, '_reserve', exhausted)
+    upload = io.BytesIO()
+    sf.write(upload, np.zeros(16000, dtype=np.float32), 16000, format='WAV')
+    response = TestClient(main.app).post(
+        '/api/speech/evaluate-pronunciation',
+        files={'audio': ('a.wav', upload.getvalue())},
+        data={'target_text': 'workspace budget test'}
+    )
+
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+def test_evicting_a_retained_workspace_keeps_the_reservation(tmp_path):
+    workspace = WorkspaceManager(root=str(tmp_path), budget_mb=16, keep='always', wait_s=0.0)
+
+    with workspace.allocate('usr_') as path:
+        write_file(path, 14 * MB)
+    assert workspace._retained_bytes > 0
+
+    # The retained copy is evicted to make room, the new workspace still reserves its estimate
+    estimate = workspace._estimate
+    assert workspace._reserve(1) == estimate
+    assert not workspace._retained
+    assert not os.path.exists(path)
@@ -0,0 +1,148 @@
+"""
+Pre-populate the TTS cache (and the reference artifacts used by pronunciation evaluation)
+from a lesson corpus, so a fresh node serves cache hits from the first request.
+
+Usage (from the app directory):
+    python -m tools.warm_cache corpus.txt
+    python -m tools.warm_cache corpus.jsonl --workers 4 --no-reference
+
+Corpus formats:
+    .txt          one sentence per line
+    .json         list of {"text": ..., "voice": ..., "lang": ..., "speed": ...}
+    .jsonl        one such object per line
+"""
+import os
+
+# Each warm-up process runs its own Kaldi jobs, resident GOP workers would only add idle processes
+os.environ.setdefault('GOP_WORKERS', '1')
+
+import json
+import time
+import argparse
+import multiprocessing
+from dataclasses import dataclass, fields
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+from core.enums.lang import Lang
+from services.tts.voices import KokoroVoice
+from services.tts.cache import TTSCacheService, TTSCacheKey
+from services.pronunciation.cache import ReferencePhonesCacheService
+from services.pronunciation.pronunciation_evaluator import reference_cache_key
+
+@dataclass(frozen=True)
+class CorpusEntry:
+    text: str
+    voice: str = KokoroVoice.AMERICAN_FEMALE_HEART.value
+    lang: str = Lang.EN_US.value
+    speed: float = 1.0
+
+    def tts_cache_key(self) -> TTSCacheKey:
+        """Same key as /kokoro/synthesize builds for this entry"""
+        return TTSCacheKey(self.text, speed=self.speed, lang=self.lang, speaker=self.voice, sample_rate=24000, provider='kokoro')
+
+def load_corpus(path: str) -> List[CorpusEntry]:
+    with open(path, 'rt', encoding='utf-8') as file:
+        if path.endswith('.json'):
+            records = json.load(file)
+        elif path.endswith('.jsonl'):
+            records = [json.loads(line) for line in file if line.strip()]
+        else:
+            records = [{'text': line.strip()} for line in file if line.strip()]
+
+    # Keep the corpus order but drop duplicates. Records may carry other fields (id,
+    # translation...), only the ones that select the audio are read
+    known = [field.name for field in fields(CorpusEntry)]
+    entries = [CorpusEntry(**{name: record[name] for name in known if name in record}) for record in records]
+    return list(dict.fromkeys(entries))
+
+# Per-process services, built once by the pool initializer
+_tts_service = None
+_tts_cache: Optional[TTSCacheService] = None
+_evaluator = None
+
+def _init_worker(device: str, threads: int) -> None:
+    global _tts_service, _tts_cache, _evaluator
+
+    import torch
+    from services.tts.kokoro import KokoroTTSService
+    from services.tts.g2p_cache import G2PCacheService
+    from services.pronunciation.pronunciation_evaluator import PronunciationEvaluator
+
+    # Split the cores between the pool processes instead of oversubscribing them
+    torch.set_num_threads(threads)
+
+    # Phonemes are warmed too, for the voices and speeds that are not in the corpus
+    _tts_service = KokoroTTSService(device, G2PCacheService())
+    _tts_cache = TTSCacheService()
+    _evaluator = PronunciationEvaluator(_tts_service, _tts_cache)
+
+def _warm_entry(entry: CorpusEntry, audio: bool, reference: bool) -> CorpusEntry:
+    if audio:
+        wav, sr = _tts_service.tts(entry.text, entry.lang, entry.voice, entry.speed, sample_rate=24000)
+        _tts_cache.set(entry.tts_cache_key(), (wav, sr))
+    if reference:
+        _evaluator.prepare_reference(entry.text)
+    return entry
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Warm the TTS and reference caches from a lesson corpus')
+    parser.add_argument('corpus', help='Corpus file (.txt, .json or .jsonl)')
+    parser.add_argument('--workers', type=int, default=0, help='Worker processes (default: one per 2 cores)')
+    parser.add_argument('--device', default=None, help='Torch device (default: cuda if available)')
+    parser.add_argument('--no-reference', action='store_true', help='Only cache synthesized audio')
+    parser.add_argument('--report-every', type=int, default=10, help='Progress report interval (entries)')
+    args = parser.parse_args()
+
+    entries = load_corpus(args.corpus)
+
+    # Skip everything that is already cached
+    tts_cache = TTSCacheService()
+    ref_phones_cache = None if args.no_reference else ReferencePhonesCacheService()
+    jobs = []
+    for entry in entries:
+        audio = not tts_cache.contains(entry.tts_cache_key())
+        reference = ref_phones_cache is not None and not ref_phones_cache.contains(reference_cache_key(entry.text))
+        if audio or reference:
+            jobs.append((entry, audio, reference))
+
+    print(f'Corpus: {len(entries)} entries, {len(entries) - len(jobs)} already cached, {len(jobs)} to warm')
+    if not jobs:
+        return
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or max(1, cores // 2)
+    workers = min(workers, len(jobs))
+    device = args.device or _default_device()
+
+    start = time.monotonic()
+    done = failed = 0
+    # Spawned (not forked) workers: no inherited SQLite connections or CUDA context
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(device, max(1, cores // workers))
+    ) as pool:
+        futures = {pool.submit(_warm_entry, entry, audio, reference): entry for entry, audio, reference in jobs}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f'Failed to warm {futures[future].text!r}:', str(e))
+            done += 1
+
+            if done % args.report_every == 0 or done == len(jobs):
+                elapsed = time.monotonic() - start
+                rate = done / elapsed if elapsed > 0 else 0.0
+                eta = (len(jobs) - done) / rate if rate > 0 else 0.0
+                print(f'[{done}/{len(jobs)}] {rate:.2f} entries/s, {failed} failed, ETA {eta:.0f}s')
+
+    print(f'Warmed {done - failed} entries with {workers} workers in {time.monotonic() - start:.1f}s')
+
+def _default_device() -> str:
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import math
+import hashlib
+import functools
+import numpy as np
+import soundfile as sf
+from typing import BinaryIO, Literal, Optional, Tuple
+
+DecodeDType = Literal['float32', 'int16']
+
+class AudioTooLargeError(ValueError):
+    """Upload over the size or duration limit"""
+
+class InvalidAudioError(ValueError):
+    """Upload that libsndfile cannot decode"""
+
+def upload_size(file: BinaryIO) -> int:
+    """Size of a seekable upload, leaving it positioned at the start"""
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+def decode_upload(
+    file: BinaryIO,
+    max_bytes: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    dtype: DecodeDType = 'float32'
+) -> Tuple[np.ndarray, int]:
+    """
+    Decode an uploaded file straight from its (spooled) file object to dtype samples,
+    without reading it into bytes first. Limits are checked before decoding.
+    """
+    if max_bytes is not None and upload_size(file) > max_bytes:
+        raise AudioTooLargeError(f'Upload larger than {max_bytes // (1024 * 1024)} MB')
+
+    try:
+        with sf.SoundFile(file) as sound:
+            if max_seconds is not None and sound.frames > max_seconds * sound.samplerate:
+                raise AudioTooLargeError(f'Audio longer than {max_seconds:g} seconds')
+            # libsndfile converts to dtype while decoding (no float64 intermediate)
+            audio = sound.read(dtype=dtype)
+            return audio, sound.samplerate
+    except sf.LibsndfileError as e:
+        raise InvalidAudioError(f'Unsupported or corrupt audio: {e}') from e
+
+def upload_fingerprint(file: BinaryIO, digest_size: int = 16) -> str:
+    """Fingerprint of the bytes of an upload (read in chunks from its spooled file), leaving it at the start"""
+    file.seek(0)
+    digest = hashlib.blake2b(digest_size=digest_size)
+    for chunk in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+def audio_content_hash(audio: np.ndarray, digest_size: int = 16) -> str:
+    """Fingerprint of decoded PCM samples (hashed as float32), so re-encoded uploads of the same audio share it"""
+    pcm = np.ascontiguousarray(audio, dtype=np.float32)
+    return hashlib.blake2b(memoryview(pcm).cast('B'), digest_size=digest_size).hexdigest()
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """Downmix (frames, channels) audio, mono input is returned as is"""
+    if audio.ndim == 1:
+        return audio
+    if audio.shape[1] == 1:
+        return audio[:, 0]
+    return audio.mean(axis=1, dtype=np.float32)
+
+def writable(audio: np.ndarray) -> np.ndarray:
+    """float32 array that can be modified in place (copies read-only views, e.g. of a cache mmap)"""
+    if audio.dtype == np.float32 and audio.flags.writeable:
+        return audio
+    return np.array(audio, dtype=np.float32)
+
+def normalize_peak(audio: np.ndarray) -> np.ndarray:
+    """Scale float audio to a peak of 1, in place"""
+    if audio.size == 0:
+        return audio
+    # max/min instead of np.abs: no temporary of the signal size
+    peak = max(float(audio.max()), -float(audio.min()))
+    if peak > 0:
+        audio *= np.float32(1.0 / peak)
+    return audio
+
+@functools.lru_cache(maxsize=32)
+def _polyphase_filter(up: int, down: int) -> np.ndarray:
+    """Anti-aliasing FIR of resample_poly for an up/down pair (designed once per rate pair)"""
+    from scipy.signal import firwin
+
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)).astype(np.float32)
+    # Shared between calls, resample_poly only reads it
+    taps.setflags(write=False)
+    return taps
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Polyphase resampling of mono float32 audio"""
+    if orig_sr == target_sr:
+        return audio
+    from scipy.signal import resample_poly
+
+    g = math.gcd(orig_sr, target_sr)
+    up, down = target_sr // g, orig_sr // g
+    return resample_poly(audio, up, down, window=_polyphase_filter(up, down)).astype(np.float32, copy=False)
+
+def prepare_for_whisper(audio: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Converts any input audio to Whisper-compatible format:
+    - mono
+    - float32 in [-1, 1]
+    - 16 kHz sample rate
+    The input is never modified.
+    """
+    prepared = resample(to_mono(audio).astype(np.float32, copy=False), sr, 16000)
+
+    # Mono float32 16 kHz input comes back as is (or as a view), copy it before normalizing
+    if np.may_share_memory(prepared, audio):
+        prepared = prepared.copy()
+    return normalize_peak(writable(prepared))
@@ -0,0 +1,90 @@
+import io
+import struct
+import numpy as np
+import soundfile as sf
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+# Placeholder RIFF/data size for streams whose final length is unknown
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+
+def wav_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16, data_size: Optional[int] = None) -> bytes:
+    """Builds a PCM WAV header, with unknown sizes when data_size is None (streaming)"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    
+    if data_size is None:
+        riff_size = data_size = WAV_UNKNOWN_SIZE
+    else:
+        riff_size = 36 + data_size
+    
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+def to_pcm16(audio: np.ndarray) -> bytes:
+    """Converts float audio in [-1, 1] to little-endian 16-bit PCM bytes"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def iter_chunks(audio: np.ndarray, sample_rate: int, chunk_s: float = 0.5) -> Iterator[np.ndarray]:
+    """Splits audio into chunks of chunk_s seconds (views, no copies)"""
+    chunk_size = max(int(sample_rate * chunk_s), 1)
+    for start in range(0, len(audio), chunk_size):
+        yield audio[start:start + chunk_size]
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """An encoded audio response format"""
+    name: str
+    media_type: str
+    container: str
+    subtype: str
+
+WAV = AudioFormat('wav', 'audio/wav', 'WAV', 'PCM_16')
+FLAC = AudioFormat('flac', 'audio/flac', 'FLAC', 'PCM_16')
+OPUS = AudioFormat('opus', 'audio/ogg; codecs=opus', 'OGG', 'OPUS')
+
+# Preferred first when the client accepts several equally; Opus needs libsndfile >= 1.0.29
+AUDIO_FORMATS: List[AudioFormat] = [fmt for fmt in (OPUS, FLAC, WAV) if fmt.subtype in sf.available_subtypes(fmt.container)]
+
+# Media types (and common aliases) clients send in Accept
+_MEDIA_TYPES: Dict[str, AudioFormat] = {
+    'audio/wav': WAV, 'audio/wave': WAV, 'audio/x-wav': WAV, 'audio/vnd.wave': WAV,
+    'audio/flac': FLAC, 'audio/x-flac': FLAC,
+    'audio/ogg': OPUS, 'audio/opus': OPUS,
+}
+
+def encode_audio(audio: np.ndarray, sample_rate: int, audio_format: AudioFormat = WAV) -> bytes:
+    """Encodes float audio into a complete file of the given format"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format=audio_format.container, subtype=audio_format.subtype)
+    return buffer.getvalue()
+
+def negotiate_audio_format(accept: Optional[str]) -> AudioFormat:
+    """
+    Best format of an Accept header ('audio/ogg;q=0.9, audio/wav'): highest q first, then
+    the smallest encoding. Missing, wildcard or unsupported-only headers get WAV.
+    """
+    if not accept:
+        return WAV
+
+    best: Dict[AudioFormat, float] = {}
+    for item in accept.split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        audio_format = _MEDIA_TYPES.get(media_type.lower())
+        if audio_format is not None and audio_format in AUDIO_FORMATS and q > 0:
+            best[audio_format] = max(q, best.get(audio_format, 0.0))
+
+    if not best:
+        return WAV
+    return max(best, key=lambda fmt: (best[fmt], -AUDIO_FORMATS.index(fmt)))
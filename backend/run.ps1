@@ -1,3 +1,3 @@
-docker run -it --name app_english_backend --gpus all -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 app-english-backend:latest /bin/bash # BASE
-docker run -it --name app_english_backend --gpus all -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 kaldi-base:latest /bin/bash # KALDI BASE
-docker run -it --name app_english_backend --gpus all -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 backend-base /bin/bash # BACKEND BASE
\ No newline at end of file
+docker run -it --name app_english_backend --gpus all --shm-size=1g -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 app-english-backend:latest /bin/bash # BASE
+docker run -it --name app_english_backend --gpus all --shm-size=1g -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 kaldi-base:latest /bin/bash # KALDI BASE
+docker run -it --name app_english_backend --gpus all --shm-size=1g -v ${PWD}\backend\app:/usr/src/app -p 8080:8080 backend-base /bin/bash # BACKEND BASE
\ No newline at end of file